@@ -0,0 +1,103 @@
+"""Micro-benchmark for function calls in the tree evaluator.
+
+Run with ``python benchmarks/calls.py``.  The first table counts the memory
+blocks a call allocates that stay alive while it is pending: a tail call that
+has been returned to the trampoline but not yet run, and a non-tail call
+waiting for the call it made to return.  The second times a few kinds of call.
+"""
+
+import sys
+import timeit
+from typing import Any, Callable
+
+from lambdora.builtinsmodule import lambMakeTopEnv
+from lambdora.evaluator import lambCompile, lambEval, trampoline
+from lambdora.macro import lambMacroExpand
+from lambdora.parser import lambParse
+from lambdora.tokenizer import lambTokenize
+from lambdora.values import Builtin, Value
+
+DEPTH = 400
+COUNT = 1000
+
+
+def compile_expr(src: str, env: dict[str, Value]) -> Callable[..., Value]:
+    expr = lambMacroExpand(lambParse(lambTokenize(src)), env)
+    assert expr is not None
+    return lambCompile(expr)
+
+
+def run(src: str, env: dict[str, Value]) -> Value:
+    return trampoline(compile_expr(src, env)(env, True))
+
+
+def make_env() -> dict[str, Value]:
+    env = lambMakeTopEnv()
+    for src in [
+        "(define pick (lambda x y. y))",
+        "(define down (lambda n. (if (= n 0) (probe 0) (+ 1 (down (- n 1))))))",
+        "(define loop (lambda n. (if (= n 0) 0 (hop (- n 1)))))",
+        "(define hop (lambda n. (loop n)))",
+    ]:
+        lambEval(lambParse(lambTokenize(src)), env)
+    return env
+
+
+def pending_tail_call_blocks(env: dict[str, Value]) -> float:
+    """Blocks held by a tail call returned to the trampoline."""
+    code = compile_expr("(pick 1 2)", env)
+    held: list[Any] = [None] * COUNT
+    code(env, True)
+    before = sys.getallocatedblocks()
+    for idx in range(COUNT):
+        held[idx] = code(env, True)
+    return (sys.getallocatedblocks() - before) / COUNT
+
+
+def pending_call_blocks(env: dict[str, Value]) -> float:
+    """Blocks held by each non-tail call while the call it made runs."""
+    seen: list[int] = []
+
+    def probe(_: Value) -> Value:
+        seen.append(sys.getallocatedblocks())
+        return 0
+
+    env["probe"] = Builtin(probe)
+    run("(down 0)", env)
+    run(f"(down {DEPTH})", env)
+    shallow, deep = seen[-2:]
+    return (deep - shallow) / DEPTH
+
+
+def per_call_ns(func: Callable[[], Any], count: int) -> float:
+    best = min(timeit.repeat(func, number=1, repeat=7))
+    return best / count * 1e9
+
+
+def main() -> None:
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 20 * DEPTH))
+    env = make_env()
+    print("Memory blocks held per pending call:")
+    print(f"  {'tail call':<26}{pending_tail_call_blocks(env):>8.1f}")
+    print(f"  {'non-tail call':<26}{pending_call_blocks(env):>8.1f}")
+
+    print("\nTime per call (ns):")
+    cases = [
+        ("closure, two arguments", "(pick 1 2)", 1),
+        ("builtin, two arguments", "(+ 1 2)", 1),
+        ("mutual tail calls", "(loop 2000)", 4000),
+        (f"non-tail recursion {DEPTH}", f"(down {DEPTH})", DEPTH),
+    ]
+    for name, src, calls in cases:
+        code = compile_expr(src, env)
+        repeat = max(1, COUNT // calls)
+
+        def call(code: Callable[..., Value] = code) -> None:
+            for _ in range(repeat):
+                trampoline(code(env, True))
+
+        print(f"  {name:<26}{per_call_ns(call, repeat * calls):>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""Micro-benchmark for per-node dispatch in the tree walkers.
+
+Run with ``python benchmarks/dispatch.py``.  The first table compares the cost
+of picking a handler for one node with an ``isinstance`` chain (in the order
+the walkers used to test types) and with a ``type(node)`` table lookup.  The
+second times the real walkers over every node of the standard library.
+"""
+
+import timeit
+from pathlib import Path
+from typing import Any, Callable
+
+from lambdora.astmodule import (
+    Abstraction,
+    Application,
+    DefineExpr,
+    DefMacroExpr,
+    Expr,
+    IfExpr,
+    LetRec,
+    Literal,
+    QuasiQuoteExpr,
+    QuoteExpr,
+    UnquoteExpr,
+    Variable,
+)
+from lambdora.builtinsmodule import lambMakeTopEnv
+from lambdora.evaluator import lambCompile
+from lambdora.macro import lambMacroExpand, lambMacroSubstitute
+from lambdora.parser import lambParseAll
+from lambdora.printer import lambPrint
+from lambdora.tokenizer import lambTokenize
+
+STD = Path(__file__).parent.parent / "src" / "lambdora" / "stdlib" / "std.lamb"
+
+# Node types in the order lambPrint used to test them
+ORDER = [
+    Variable,
+    Literal,
+    Abstraction,
+    Application,
+    QuasiQuoteExpr,
+    UnquoteExpr,
+    QuoteExpr,
+    LetRec,
+    IfExpr,
+    DefineExpr,
+    DefMacroExpr,
+]
+
+
+def isinstance_chain(node: Expr) -> int:
+    if isinstance(node, Variable):
+        return 0
+    elif isinstance(node, Literal):
+        return 1
+    elif isinstance(node, Abstraction):
+        return 2
+    elif isinstance(node, Application):
+        return 3
+    elif isinstance(node, QuasiQuoteExpr):
+        return 4
+    elif isinstance(node, UnquoteExpr):
+        return 5
+    elif isinstance(node, QuoteExpr):
+        return 6
+    elif isinstance(node, LetRec):
+        return 7
+    elif isinstance(node, IfExpr):
+        return 8
+    elif isinstance(node, DefineExpr):
+        return 9
+    elif isinstance(node, DefMacroExpr):
+        return 10
+    return -1
+
+
+TABLE: dict[type, Callable[[Expr], int]] = {
+    cls: (lambda idx: lambda node: idx)(idx) for idx, cls in enumerate(ORDER)
+}
+
+
+def table_lookup(node: Expr) -> int:
+    return TABLE[type(node)](node)
+
+
+def sample(cls: type) -> Expr:
+    args: dict[type, Any] = {
+        Variable: ("x",),
+        Literal: ("1",),
+        Abstraction: ("x", Variable("x")),
+        Application: (Variable("f"), []),
+        QuasiQuoteExpr: (Variable("x"),),
+        UnquoteExpr: (Variable("x"),),
+        QuoteExpr: (Variable("x"),),
+        LetRec: ([], []),
+        IfExpr: (Variable("c"), Variable("a"), Variable("b")),
+        DefineExpr: ("x", Variable("x")),
+        DefMacroExpr: ("m", [], Variable("x")),
+    }
+    return cls(*args[cls])  # type: ignore[no-any-return]
+
+
+def nodes(expr: Expr) -> list[Expr]:
+    found = [expr]
+    for value in vars(expr).values():
+        children = value if isinstance(value, list) else [value]
+        for child in children:
+            if isinstance(child, tuple):
+                child = child[1]
+            if isinstance(child, Expr):
+                found.extend(nodes(child))
+    return found
+
+
+def per_call_ns(func: Callable[[], Any], count: int) -> float:
+    best = min(timeit.repeat(func, number=1, repeat=7))
+    return best / count * 1e9
+
+
+def main() -> None:
+    print("Choosing a handler for one node (ns):")
+    print(f"  {'node type':<16}{'isinstance':>12}{'type table':>12}")
+    for cls in (Variable, Application, DefineExpr, DefMacroExpr):
+        node = sample(cls)
+        chain = timeit.repeat(lambda: isinstance_chain(node), number=200_000)
+        table = timeit.repeat(lambda: table_lookup(node), number=200_000)
+        print(
+            f"  {cls.__name__:<16}{min(chain) / 200_000 * 1e9:>12.1f}"
+            f"{min(table) / 200_000 * 1e9:>12.1f}"
+        )
+
+    env = lambMakeTopEnv()
+    program = lambParseAll(lambTokenize(STD.read_text(encoding="utf-8")))
+    expanded = [e for e in (lambMacroExpand(e, env) for e in program) if e]
+    count = sum(len(nodes(e)) for e in expanded)
+
+    print(f"\nWalking the standard library ({count} nodes, ns per node):")
+    walkers: list[tuple[str, Callable[[], Any]]] = [
+        ("lambPrint", lambda: [lambPrint(e) for e in expanded]),
+        ("lambMacroSubstitute", lambda: [lambMacroSubstitute(e, {}) for e in expanded]),
+        ("lambMacroExpand", lambda: [lambMacroExpand(e, env) for e in expanded]),
+        ("lambCompile", lambda: [lambCompile(e) for e in expanded]),
+    ]
+    for name, walk in walkers:
+        print(f"  {name:<22}{per_call_ns(walk, count):>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Benchmark for the start-up time of the ``lambdora`` command.
+
+Run with ``python benchmarks/startup.py``.  For each command the first table
+gives the best wall-clock time of a fresh interpreter running it, and the
+least time Python reported spending on imports with ``-X importtime``.  The second
+lists the modules that take longest to import for ``lambdora run``, the
+command started most often, with the time of each including its own imports.
+"""
+
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+REPEAT = 7
+TOP = 12
+
+
+def command(args: list[str], importtime: bool = False) -> list[str]:
+    flags = ["-X", "importtime"] if importtime else []
+    return [sys.executable, *flags, "-m", "lambdora", *args]
+
+
+def wall_ms(args: list[str]) -> float:
+    best = float("inf")
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        subprocess.run(command(args), check=True, capture_output=True)
+        best = min(best, time.perf_counter() - start)
+    return best * 1e3
+
+
+def import_times(args: list[str]) -> list[tuple[str, int, bool]]:
+    """Each module imported, the microseconds its import took including its
+    own imports, and whether it was imported directly rather than by another.
+    """
+    err = subprocess.run(
+        command(args, importtime=True), check=True, capture_output=True, text=True
+    ).stderr
+    times = []
+    for line in err.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        times.append((name.strip(), int(cumulative), not name.startswith("  ")))
+    return times
+
+
+def main() -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        script = Path(tmp) / "hello.lamb"
+        script.write_text('(print "hello")\n')
+        commands = {
+            "--version": ["--version"],
+            "--help": ["--help"],
+            "run": ["run", str(script)],
+            "run --engine vm": ["run", "--engine", "vm", str(script)],
+        }
+        print(f"Best of {REPEAT} runs (ms):")
+        print(f"  {'command':<20}{'wall':>8}{'imports':>10}")
+        for name, args in commands.items():
+            imports = min(
+                sum(us for _, us, top in import_times(args) if top)
+                for _ in range(REPEAT)
+            )
+            print(f"  {name:<20}{wall_ms(args):>8.1f}{imports / 1e3:>10.1f}")
+
+        print("\nSlowest imports for 'run' (ms):")
+        times = import_times(commands["run"])
+        for module, us, _ in sorted(times, key=lambda item: -item[1])[:TOP]:
+            print(f"  {module:<34}{us / 1e3:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
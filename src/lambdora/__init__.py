@@ -1,9 +1,17 @@
 """Lambdora - A minimalist Lisp-inspired functional language."""
 
-import importlib.metadata
 
-try:
-    __version__ = importlib.metadata.version("lambdora")
-except importlib.metadata.PackageNotFoundError:
-    # Fallback for development/testing
-    __version__ = "dev"
+def __getattr__(name: str) -> str:
+    # ``__version__`` is read from the installed metadata on first use, since
+    # importing ``importlib.metadata`` takes longer than starting a program
+    if name == "__version__":
+        import importlib.metadata
+
+        try:
+            version = importlib.metadata.version("lambdora")
+        except importlib.metadata.PackageNotFoundError:
+            # Fallback for development/testing
+            version = "dev"
+        globals()["__version__"] = version
+        return version
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,13 +1,56 @@
-"""Main CLI entry point for Lambdora."""
+"""Main CLI entry point for Lambdora.
+
+Only what every command needs is imported here.  Each subcommand imports its
+own modules when it runs, through the small wrappers below, so that
+``lambdora run`` loads neither the REPL nor the builder and ``lambdora
+--version`` loads no part of the interpreter.
+"""
 
 import argparse
 import sys
 from pathlib import Path
-from typing import Optional
+from typing import Any, NoReturn, Optional
+
+from .options import ENGINES, JIT_MODES, OPT_LEVELS
+
+OPT_HELP = (
+    "Optimization level: 1 folds constants and dead branches, 2 also "
+    "eta-reduces wrapper functions and inlines small ones (default: 0)"
+)
+
+
+def repl(**kwargs: Any) -> None:
+    """Start the REPL with :func:`lambdora.repl.repl`."""
+    from .repl import repl
+
+    repl(**kwargs)
+
+
+def run_file(path: Path, **kwargs: Any) -> None:
+    """Run a script with :func:`lambdora.runner.run_file`."""
+    from .runner import run_file
+
+    run_file(path, **kwargs)
+
+
+def lambBuild(path: Path, output: Optional[Path] = None, **kwargs: Any) -> Path:
+    """Compile a script with :func:`lambdora.build.lambBuild`."""
+    from .build import lambBuild
+
+    return lambBuild(path, output, **kwargs)
+
+
+class _VersionAction(argparse.Action):
+    """``--version``, which reads the installed version only when given."""
 
-from . import __version__
-from .repl import repl
-from .runner import run_file
+    def __init__(self, option_strings: list[str], dest: str, help: str) -> None:
+        super().__init__(option_strings, dest, nargs=0, help=help)
+
+    def __call__(self, parser: argparse.ArgumentParser, *args: Any) -> NoReturn:
+        from . import __version__
+
+        print(f"Lambdora {__version__}")
+        parser.exit()
 
 
 def create_parser() -> argparse.ArgumentParser:
@@ -20,13 +63,19 @@ def create_parser() -> argparse.ArgumentParser:
 Examples:
   lambdora repl                    # Start interactive REPL
   lambdora run script.lamb         # Execute a Lambdora script
+  lambdora run --engine=vm script.lamb  # Execute on the bytecode VM
+  lambdora run -O2 script.lamb     # Optimize before running
+  lambdora build script.lamb -o script_lamb.py  # Compile to a Python module
+  lambdora run --image prelude.img script.lamb  # Start from a saved image
   lambdora --version               # Show version information
   lambdora repl --stdlib-path /path/to/std.lamb  # Use custom stdlib
         """,
     )
 
     parser.add_argument(
-        "--version", action="version", version=f"Lambdora {__version__}"
+        "--version",
+        action=_VersionAction,
+        help="show program's version number and exit",
     )
 
     subparsers = parser.add_subparsers(dest="command", help="Available commands")
@@ -38,6 +87,24 @@ Examples:
         type=Path,
         help="Path to custom standard library file (default: built-in std.lamb)",
     )
+    repl_parser.add_argument(
+        "-O",
+        dest="opt_level",
+        type=int,
+        choices=OPT_LEVELS,
+        default=0,
+        help=OPT_HELP,
+    )
+    repl_parser.add_argument(
+        "--image",
+        type=Path,
+        help="Load the environment from an image instead of the standard library",
+    )
+    repl_parser.add_argument(
+        "--save-image",
+        type=Path,
+        help="Save the environment to an image when the session ends",
+    )
 
     # Run subcommand
     run_parser = subparsers.add_parser("run", help="Execute a Lambdora script")
@@ -47,6 +114,68 @@ Examples:
         type=Path,
         help="Path to custom standard library file (default: built-in std.lamb)",
     )
+    run_parser.add_argument(
+        "--engine",
+        choices=ENGINES,
+        default="tree",
+        help="Evaluation engine: compiled tree walker or bytecode VM "
+        "(default: tree)",
+    )
+    run_parser.add_argument(
+        "-O",
+        dest="opt_level",
+        type=int,
+        choices=OPT_LEVELS,
+        default=0,
+        help=OPT_HELP,
+    )
+    run_parser.add_argument(
+        "--opt-report",
+        action="store_true",
+        help="Print how many rewrites the optimizer made",
+    )
+    run_parser.add_argument(
+        "--jit",
+        choices=JIT_MODES,
+        default="auto",
+        help="Translate hot functions into Python on the tree engine: after "
+        "repeated calls, on the first call, or never (default: auto)",
+    )
+    run_parser.add_argument(
+        "--image",
+        type=Path,
+        help="Load the environment from an image instead of the standard library",
+    )
+    run_parser.add_argument(
+        "--save-image",
+        type=Path,
+        help="Save the environment to an image after the script has run",
+    )
+
+    # Build subcommand
+    build_parser = subparsers.add_parser(
+        "build", help="Compile a Lambdora script into a Python module"
+    )
+    build_parser.add_argument("file", help="Path to the .lamb file to compile")
+    build_parser.add_argument(
+        "-o",
+        dest="output",
+        type=Path,
+        help="Path of the module to write (default: <name>_lamb.py beside the file)",
+    )
+    build_parser.add_argument(
+        "--stdlib-path",
+        type=Path,
+        help="Path to custom standard library file (default: built-in std.lamb)",
+    )
+    build_parser.add_argument(
+        "-O",
+        dest="opt_level",
+        type=int,
+        choices=OPT_LEVELS,
+        default=0,
+        help=OPT_HELP,
+    )
 
     return parser
 
@@ -58,7 +187,12 @@ def main(args: Optional[list[str]] = None) -> int:
 
     try:
         if parsed_args.command == "repl":
-            repl(stdlib_path=parsed_args.stdlib_path)
+            repl(
+                stdlib_path=parsed_args.stdlib_path,
+                opt_level=parsed_args.opt_level,
+                image=parsed_args.image,
+                save_image=parsed_args.save_image,
+            )
             return 0
         elif parsed_args.command == "run":
             file_path = Path(parsed_args.file)
@@ -78,7 +212,34 @@ def main(args: Optional[list[str]] = None) -> int:
                     f"Tip: Consider renaming to '{file_path.with_suffix('.lamb')}'",
                     file=sys.stderr,
                 )
-            run_file(file_path, stdlib_path=parsed_args.stdlib_path)
+            run_file(
+                file_path,
+                stdlib_path=parsed_args.stdlib_path,
+                engine=parsed_args.engine,
+                opt_level=parsed_args.opt_level,
+                opt_report=parsed_args.opt_report,
+                jit=parsed_args.jit,
+                image=parsed_args.image,
+                save_image=parsed_args.save_image,
+            )
+            return 0
+        elif parsed_args.command == "build":
+            file_path = Path(parsed_args.file)
+            if not file_path.exists():
+                print(f"Error: File '{file_path}' not found.", file=sys.stderr)
+                return 1
+            from .errors import LambError, format_lamb_error
+
+            try:
+                lambBuild(
+                    file_path,
+                    parsed_args.output,
+                    stdlib_path=parsed_args.stdlib_path,
+                    opt_level=parsed_args.opt_level,
+                )
+            except LambError as err:
+                print(format_lamb_error(err), file=sys.stderr)
+                return 1
             return 0
         else:
             # No subcommand provided, show help
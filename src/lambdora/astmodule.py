@@ -1,7 +1,7 @@
 """AST node definitions for the Lambdora language."""
 
-from dataclasses import dataclass
-from typing import List
+from dataclasses import dataclass, field
+from typing import Any, List, Optional, Union
 
 
 @dataclass
@@ -17,12 +17,30 @@ class Variable(Expr):
 @dataclass
 class Literal(Expr):
     value: str
+    # Runtime value, converted once when the node is built: an int for a
+    # string of digits, otherwise ``value`` itself.  The parser passes it
+    # explicitly for string literals so that "123" stays a string.
+    const: Optional[Union[int, str]] = field(default=None, repr=False)
+
+    def __post_init__(self) -> None:
+        if self.const is None:
+            value = self.value
+            if isinstance(value, str) and value.isdecimal():
+                self.const = int(value)
+            else:
+                self.const = value
 
 
 @dataclass
 class Abstraction(Expr):
     param: str
     body: Expr
+    # Parameters after the first, for ``(lambda x y z. body)``
+    rest_params: List[str] = field(default_factory=list)
+
+    @property
+    def params(self) -> List[str]:
+        return [self.param, *self.rest_params]
 
 
 @dataclass
@@ -44,6 +62,13 @@ class IfExpr(Expr):
     else_branch: Expr
 
 
+@dataclass
+class LetExpr(Expr):
+    name: str
+    value: Expr
+    body: List[Expr]
+
+
 @dataclass
 class DefMacroExpr(Expr):
     name: str
@@ -70,3 +95,15 @@ class UnquoteExpr(Expr):
 class LetRec(Expr):
     bindings: List[tuple[str, Expr]]
     body: List[Expr]
+
+
+@dataclass
+class GlobalIs(Expr):
+    """True while the global ``name`` holds ``value`` itself.
+
+    The optimizer guards the body of a function it inlined with this test, so
+    the call is made as usual once the global is rebound.
+    """
+
+    name: str
+    value: Any = field(compare=False)
@@ -0,0 +1,175 @@
+"""Ahead-of-time compilation of .lamb programs into Python modules.
+
+``lambdora build script.lamb -o script_lamb.py`` tokenizes, parses, macro
+expands and optimizes a program and the standard library once, and writes a
+Python module holding the resulting forms as AST constructor calls.  Running
+the module, or calling its ``main()``, evaluates them with
+``runner.run_forms()``, and Python caches its compiled bytecode like that of
+any other module.
+
+Only the standard library definitions the program refers to, directly or
+through other definitions, are included.  Macros are expanded at build time,
+so ``defmacro`` forms are left out.
+
+Nothing is evaluated while building, so the optimizer knows only builtins:
+constants are folded and dead branches removed, but ``-O2`` makes no
+rewrites that depend on user-defined functions.  Once a form defines a name,
+later forms are optimized without assuming anything about it.
+"""
+
+from __future__ import annotations
+
+import dataclasses
+from pathlib import Path
+from typing import Iterator, Optional
+
+from .astmodule import DefineExpr, Expr, GlobalIs, QuoteExpr, Variable
+from .builtinsmodule import lambMakeTopEnv
+from .macro import lambMacroExpand
+from .optimize import lambOptimize
+from .parser import lambParseAll
+from .runner import std_path
+from .tokenizer import lambTokenize
+from .values import Pair, Value, nil
+
+
+def lambBuild(
+    path: Path,
+    output: Optional[Path] = None,
+    stdlib_path: Optional[Path] = None,
+    opt_level: int = 0,
+) -> Path:
+    """Compile the program at ``path`` into a Python module, and return its path.
+
+    The module is written to ``output``, by default ``<name>_lamb.py`` beside
+    the program.  Errors in the program are raised as they would be by
+    ``lambdora run``.
+    """
+    if output is None:
+        output = path.with_name(f"{path.stem}_lamb.py")
+    env = lambMakeTopEnv()
+    std_forms: list[Expr] = []
+    std = std_path(stdlib_path)
+    if std is not None:
+        std_forms = _expand(std.read_text(encoding="utf-8"), env, opt_level)
+    forms = _expand(path.read_text(encoding="utf-8"), env, opt_level)
+    source = _module(path.name, _usedDefinitions(std_forms, forms) + forms)
+    # Fails here, rather than on import, for forms nested too deeply for Python
+    compile(source, str(output), "exec")
+    output.write_text(source, encoding="utf-8")
+    return output
+
+
+def _expand(text: str, env: dict[str, Value], opt_level: int) -> list[Expr]:
+    """The top-level forms of ``text``, expanded and optimized in turn."""
+    forms = []
+    for expr in lambParseAll(lambTokenize(text)):
+        expanded = lambMacroExpand(expr, env)
+        if expanded is None:
+            continue
+        form = lambOptimize(expanded, env, opt_level)
+        # The value it will have at run time is not known here
+        for node in _walk(form):
+            if isinstance(node, DefineExpr):
+                env.pop(node.name, None)
+        forms.append(form)
+    return forms
+
+
+def _walk(expr: Expr) -> Iterator[Expr]:
+    """``expr`` and the nodes inside it, except quoted data."""
+    yield expr
+    if isinstance(expr, QuoteExpr):
+        return
+    for item in _fieldValues(expr):
+        if isinstance(item, Expr):
+            yield from _walk(item)
+
+
+def _fieldValues(expr: Expr) -> Iterator[object]:
+    for field in dataclasses.fields(expr):
+        value = getattr(expr, field.name)
+        if isinstance(value, list):
+            for item in value:
+                # ``LetRec`` bindings are (name, value) pairs
+                yield from item if isinstance(item, tuple) else (item,)
+        else:
+            yield value
+
+
+def _usedDefinitions(std_forms: list[Expr], forms: list[Expr]) -> list[Expr]:
+    """The forms of ``std_forms`` that ``forms`` need, in their order."""
+    definitions: dict[str, list[int]] = {}
+    for index, form in enumerate(std_forms):
+        if isinstance(form, DefineExpr):
+            definitions.setdefault(form.name, []).append(index)
+    # Forms other than definitions are always kept
+    needed = {
+        index
+        for index, form in enumerate(std_forms)
+        if not isinstance(form, DefineExpr)
+    }
+    pending = [form for index, form in enumerate(std_forms) if index in needed]
+    pending += forms
+    seen: set[str] = set()
+    while pending:
+        for node in _walk(pending.pop()):
+            if isinstance(node, Variable) and node.name not in seen:
+                seen.add(node.name)
+                for index in definitions.get(node.name, ()):
+                    needed.add(index)
+                    pending.append(std_forms[index])
+    return [form for index, form in enumerate(std_forms) if index in needed]
+
+
+def _module(name: str, forms: list[Expr]) -> str:
+    """The source of a Python module running ``forms``."""
+    used: set[str] = set()
+    lines = [f'"""Built from {name} by lambdora build."""', ""]
+    body = [f"    {_emit(form, used)}," for form in forms]
+    ast_names = sorted(used - {"Pair", "nil"})
+    if ast_names:
+        lines.append(f"from lambdora.astmodule import {', '.join(ast_names)}")
+    lines.append("from lambdora.runner import run_forms")
+    value_names = sorted(used & {"Pair", "nil"})
+    if value_names:
+        lines.append(f"from lambdora.values import {', '.join(value_names)}")
+    lines += ["", "FORMS = [", *body, "]", "", ""]
+    lines += [
+        'def main(engine: str = "tree") -> None:',
+        "    run_forms(FORMS, engine)",
+        "",
+        "",
+        'if __name__ == "__main__":',
+        "    main()",
+    ]
+    return "\n".join(lines) + "\n"
+
+
+def _emit(value: object, used: set[str]) -> str:
+    """Python source that builds ``value``, noting the names it needs."""
+    if isinstance(value, (bool, int, str)) or value is None:
+        return repr(value)
+    if value is nil:
+        used.add("nil")
+        return "nil"
+    if isinstance(value, list):
+        return f"[{', '.join(_emit(item, used) for item in value)}]"
+    if isinstance(value, tuple):
+        return f"({', '.join(_emit(item, used) for item in value)},)"
+    if isinstance(value, Pair):
+        used.add("Pair")
+        return f"Pair({_emit(value.head, used)}, {_emit(value.tail, used)})"
+    if isinstance(value, GlobalIs):
+        # Made only from values the optimizer saw while the program ran
+        raise TypeError("cannot build a guard on a run-time value")
+    if isinstance(value, Expr):
+        name = type(value).__name__
+        used.add(name)
+        # A ``Literal`` passes its ``const``, so that "123" stays a string
+        args = [
+            _emit(getattr(value, field.name), used)
+            for field in dataclasses.fields(value)
+        ]
+        return f"{name}({', '.join(args)})"
+    raise TypeError(f"cannot build {type(value).__name__} values")
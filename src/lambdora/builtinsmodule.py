@@ -1,10 +1,12 @@
 """Built-in functions and the initial environment."""
 
+import operator
 from itertools import count
-from typing import Dict, cast
+from typing import Callable, Dict, Optional, cast
 
 from .errors import BuiltinError as TypeError
-from .values import Builtin, Pair, Value, nil, valueToString
+from .memo import DEFAULT_MAXSIZE, lambMemoize, memoStats
+from .values import Builtin, Globals, Pair, Value, nil, valueToString
 
 
 # Helper to differentiate ints from bools (bool is a subclass of int in Python)
@@ -19,129 +21,71 @@ def _to_int(val: Value) -> int:
     return cast(int, val)
 
 
-def lambMakeTopEnv() -> dict[str, Value]:
-    """Create the top-level environment with Lambdora built-ins."""
-    env: Dict[str, Value] = {}
+def _to_bool(val: Value) -> bool:
+    if not isinstance(val, bool):
+        raise TypeError("Expected boolean")
+    return val
 
-    # Booleans
-    env["true"] = True
-    env["false"] = False
 
-    # Arithmetic (curried)
-    def add(x: Value) -> Value:
-        xi = _to_int(x)
+def _to_str(val: Value) -> str:
+    if not isinstance(val, str):
+        raise TypeError("Expected string")
+    return val
 
-        def add_inner(y: Value) -> Value:
-            yi = _to_int(y)
-            return xi + yi
 
-        return Builtin(add_inner)
+def _int_op(op: Callable[[int, int], Value], variadic: bool = False) -> Builtin:
+    """A two-argument builtin on integers."""
 
-    def sub(x: Value) -> Value:
-        xi = _to_int(x)
+    def call(x: Value, y: Value) -> Value:
+        # ``type() is int`` also rejects booleans
+        if type(x) is int and type(y) is int:
+            return op(x, y)
+        raise TypeError("Expected integer")
 
-        def sub_inner(y: Value) -> Value:
-            yi = _to_int(y)
-            return xi - yi
+    return Builtin(call, 2, check=_to_int, variadic=variadic, pure=True, int_op=op)
 
-        return Builtin(sub_inner)
 
-    def mul(x: Value) -> Value:
-        xi = _to_int(x)
+def lambMakeTopEnv(env: Optional[Dict[str, Value]] = None) -> dict[str, Value]:
+    """Create the top-level environment with Lambdora built-ins.
 
-        def mul_inner(y: Value) -> Value:
-            yi = _to_int(y)
-            return xi * yi
+    Builtins take all their arguments at once; a call with fewer arguments
+    returns a partial application (see ``Builtin``).  They are added to
+    ``env`` when it is given.
+    """
+    if env is None:
+        env = Globals()
 
-        return Builtin(mul_inner)
+    # Booleans
+    env["true"] = True
+    env["false"] = False
 
+    # Arithmetic; + - * also accept more than two arguments
+    env["+"] = _int_op(operator.add, variadic=True)
+    env["-"] = _int_op(operator.sub, variadic=True)
+    env["*"] = _int_op(operator.mul, variadic=True)
     # Integer division (floored)
-    def div(x: Value) -> Value:
-        xi = _to_int(x)
-
-        def div_inner(y: Value) -> Value:
-            yi = _to_int(y)
-            return xi // yi
-
-        return Builtin(div_inner)
-
-    env["+"] = Builtin(add)
-    env["-"] = Builtin(sub)
-    env["*"] = Builtin(mul)
-    env["/"] = Builtin(div)
+    env["/"] = _int_op(operator.floordiv)
 
-    def mod(x: Value) -> Value:
-        xi = _to_int(x)
-
-        def mod_inner(y: Value) -> Value:
-            yi = _to_int(y)
-            return xi % yi
-
-        return Builtin(mod_inner)
-
-    env["%"] = Builtin(mod)
-    env["mod"] = Builtin(mod)  # Alias for consistency
+    env["%"] = _int_op(operator.mod)
+    env["mod"] = env["%"]  # Alias for consistency
 
     # Additional comparison operators
-    def le(x: Value) -> Value:
-        xi = _to_int(x)
-
-        def le_inner(y: Value) -> Value:
-            yi = _to_int(y)
-            return xi <= yi
-
-        return Builtin(le_inner)
-
-    def gt(x: Value) -> Value:
-        xi = _to_int(x)
-
-        def gt_inner(y: Value) -> Value:
-            yi = _to_int(y)
-            return xi > yi
-
-        return Builtin(gt_inner)
-
-    def ge(x: Value) -> Value:
-        xi = _to_int(x)
-
-        def ge_inner(y: Value) -> Value:
-            yi = _to_int(y)
-            return xi >= yi
-
-        return Builtin(ge_inner)
-
-    def ne(x: Value) -> Value:
-        xi = _to_int(x)
-
-        def ne_inner(y: Value) -> Value:
-            yi = _to_int(y)
-            return xi != yi
-
-        return Builtin(ne_inner)
-
-    env["<="] = Builtin(le)
-    env[">"] = Builtin(gt)
-    env[">="] = Builtin(ge)
-    env["!="] = Builtin(ne)
+    env["<="] = _int_op(operator.le)
+    env[">"] = _int_op(operator.gt)
+    env[">="] = _int_op(operator.ge)
+    env["!="] = _int_op(operator.ne)
 
     # String conversion
     def str_fn(x: Value) -> Value:
         return valueToString(x)
 
     # String concatenation
-    def concat(x: Value) -> Value:
-        if not isinstance(x, str):
-            raise TypeError("Expected string")
+    def concat(x: Value, y: Value) -> Value:
+        return _to_str(x) + _to_str(y)
 
-        def concat_inner(y: Value) -> Value:
-            if not isinstance(y, str):
-                raise TypeError("Expected string")
-            return x + y
-
-        return Builtin(concat_inner)
-
-    env["str"] = Builtin(str_fn)
-    env["++"] = Builtin(concat)  # String concatenation operator
+    env["str"] = Builtin(str_fn, pure=True)
+    # String concatenation operator
+    env["++"] = Builtin(concat, 2, check=_to_str, variadic=True, pure=True)
 
     # Type checking functions
     def is_number(x: Value) -> Value:
@@ -159,69 +103,35 @@ def lambMakeTopEnv() -> dict[str, Value]:
     def is_function(x: Value) -> Value:
         return isinstance(x, Builtin)
 
-    env["isNumber"] = Builtin(is_number)
-    env["isBoolean"] = Builtin(is_boolean)
-    env["isString"] = Builtin(is_string)
-    env["isList"] = Builtin(is_list)
-    env["isFunction"] = Builtin(is_function)
+    env["isNumber"] = Builtin(is_number, pure=True)
+    env["isBoolean"] = Builtin(is_boolean, pure=True)
+    env["isString"] = Builtin(is_string, pure=True)
+    env["isList"] = Builtin(is_list, pure=True)
+    env["isFunction"] = Builtin(is_function, pure=True)
 
     # Equality
-    def eq(x: Value) -> Value:
-        xi = _to_int(x)
-
-        def eq_inner(y: Value) -> Value:
-            yi = _to_int(y)
-            return xi == yi
-
-        return Builtin(eq_inner)
-
-    env["="] = Builtin(eq)
+    env["="] = _int_op(operator.eq)
 
     # Less-than
-    def lt(x: Value) -> Value:
-        xi = _to_int(x)
-
-        def lt_inner(y: Value) -> Value:
-            yi = _to_int(y)
-            return xi < yi
-
-        return Builtin(lt_inner)
-
-    env["<"] = Builtin(lt)
+    env["<"] = _int_op(operator.lt)
 
     # Logical negation
     def not_fn(x: Value) -> Value:
-        if not isinstance(x, bool):
-            raise TypeError("Expected boolean")
-        return not x
+        return not _to_bool(x)
 
-    env["not"] = Builtin(not_fn)
+    env["not"] = Builtin(not_fn, pure=True)
 
     # Conjunction / disjunction
-    def and_fn(x: Value) -> Value:
-        if not isinstance(x, bool):
-            raise TypeError("Expected boolean")
-
-        def inner(y: Value) -> Value:
-            if not isinstance(y, bool):
-                raise TypeError("Expected boolean")
-            return x and y
-
-        return Builtin(inner)
+    def and_fn(x: Value, y: Value) -> Value:
+        xb, yb = _to_bool(x), _to_bool(y)
+        return xb and yb
 
-    def or_fn(x: Value) -> Value:
-        if not isinstance(x, bool):
-            raise TypeError("Expected boolean")
+    def or_fn(x: Value, y: Value) -> Value:
+        xb, yb = _to_bool(x), _to_bool(y)
+        return xb or yb
 
-        def inner(y: Value) -> Value:
-            if not isinstance(y, bool):
-                raise TypeError("Expected boolean")
-            return x or y
-
-        return Builtin(inner)
-
-    env["and"] = Builtin(and_fn)
-    env["or"] = Builtin(or_fn)
+    env["and"] = Builtin(and_fn, 2, check=_to_bool, pure=True)
+    env["or"] = Builtin(or_fn, 2, check=_to_bool, pure=True)
 
     # Printing (returns nil)
     def pr(x: Value) -> Value:
@@ -231,8 +141,8 @@ def lambMakeTopEnv() -> dict[str, Value]:
     env["print"] = Builtin(pr)
 
     # Lists
-    def cons(x: Value) -> Value:
-        return Builtin(lambda y: Pair(x, y))
+    def cons(x: Value, y: Value) -> Value:
+        return Pair(x, y)
 
     def head_fn(p: Value) -> Value:
         if not isinstance(p, Pair):
@@ -247,7 +157,7 @@ def lambMakeTopEnv() -> dict[str, Value]:
     def is_nil(p: Value) -> Value:
         return p is nil
 
-    env["cons"] = Builtin(cons)
+    env["cons"] = Builtin(cons, 2)
     env["head"] = Builtin(head_fn)
     env["tail"] = Builtin(tail_fn)
     env["isNil"] = Builtin(is_nil)
@@ -261,4 +171,18 @@ def lambMakeTopEnv() -> dict[str, Value]:
 
     env["gensym"] = Builtin(gensym_fn)
 
+    # Memoization; see ``memo.py``
+    def memoize(f: Value) -> Value:
+        return lambMemoize(f, DEFAULT_MAXSIZE, env)
+
+    def memoize_with(size: Value, f: Value) -> Value:
+        return lambMemoize(f, _to_int(size), env)
+
+    env["memoize"] = Builtin(memoize)
+    env["memoizeWith"] = Builtin(memoize_with, 2, check=_to_int)
+    env["memoStats"] = Builtin(memoStats)
+
+    for name, value in env.items():
+        if isinstance(value, Builtin) and not value.name:
+            value.name = name
     return env
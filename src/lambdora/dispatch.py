@@ -0,0 +1,42 @@
+"""Type-indexed dispatch shared by the AST and value walkers."""
+
+from typing import Any, Callable, Dict, Generic, TypeVar
+
+R = TypeVar("R")
+
+
+class TypeDispatch(Dict[type, Callable[..., R]], Generic[R]):
+    """A table from the exact type of a node to the function handling it.
+
+    ``table(node, *args)`` calls the handler for ``type(node)`` with one dict
+    lookup, however many types are registered; hot paths can index the table
+    directly as ``table[type(node)]``.  A type without its own handler uses
+    the handler of its nearest registered base class, or ``default``, and the
+    choice is cached on first use.  Register handlers before dispatching.
+    """
+
+    def __init__(self, default: Callable[..., R]) -> None:
+        super().__init__()
+        self.default = default
+
+    def register(self, *types: type) -> Callable[[Callable[..., R]], Callable[..., R]]:
+        """Decorator registering a handler for each of ``types``."""
+
+        def decorator(func: Callable[..., R]) -> Callable[..., R]:
+            for cls in types:
+                self[cls] = func
+            return func
+
+        return decorator
+
+    def __missing__(self, cls: type) -> Callable[..., R]:
+        handler = self.default
+        for base in cls.__mro__[1:]:
+            if base in self:
+                handler = dict.__getitem__(self, base)
+                break
+        self[cls] = handler
+        return handler
+
+    def __call__(self, node: Any, *args: Any) -> R:
+        return self[type(node)](node, *args)
@@ -2,13 +2,10 @@
 
 from __future__ import annotations
 
-import traceback
 from typing import Optional
 
-from colorama import Fore, Style
-from colorama import init as _colorama_init
-
-_colorama_init(autoreset=True)
+# Whether colorama has been set up, which happens when an error is first shown
+_colour_ready = False
 
 
 class LambError(Exception):
@@ -80,8 +77,23 @@ __all__ = [
 ]
 
 
+def _init_colour() -> None:
+    """Set up coloured output once; colorama is not imported before then."""
+    global _colour_ready
+    if not _colour_ready:
+        from colorama import init
+
+        init(autoreset=True)
+        _colour_ready = True
+
+
 def format_lamb_error(err: LambError) -> str:
     """Return a colourised traceback + message for *err*."""
+    import traceback
+
+    from colorama import Fore, Style
+
+    _init_colour()
 
     # Grey/dim stack frames, excluding the very last (the user-facing one)
     grey = Style.DIM + Fore.WHITE
@@ -1,6 +1,8 @@
 """Expression evaluation for Lambdora."""
 
-from typing import cast
+from dataclasses import replace
+from typing import Any, Callable, Optional, cast
+from weakref import WeakKeyDictionary
 
 from .astmodule import (
     Abstraction,
@@ -9,15 +11,43 @@ from .astmodule import (
     DefMacroExpr,
     Expr,
     IfExpr,
-    LetRec,
     Literal,
     QuasiQuoteExpr,
     QuoteExpr,
     UnquoteExpr,
     Variable,
 )
-from .errors import EvalError, ParseError, RecursionInitError
-from .values import Builtin, Closure, Macro, Thunk, Value, nil
+from .dispatch import TypeDispatch
+from .errors import EvalError, LambError, RecursionInitError
+from .parser import lambLower
+from .resolver import (
+    Fail,
+    FrameRef,
+    GlobalRef,
+    LocalRef,
+    Ref,
+    ResolvedDefine,
+    ResolvedDefMacro,
+    ResolvedGlobalIs,
+    ResolvedLambda,
+    ResolvedLet,
+    ResolvedLetRec,
+    ResolvedQuasiquote,
+    SelfTailCall,
+    lambResolve,
+    lambResolveFunction,
+)
+from .values import (
+    Builtin,
+    Closure,
+    Code,
+    Env,
+    Macro,
+    TailCall,
+    Thunk,
+    Value,
+    nil,
+)
 
 
 class _RecPlaceholder:  # noqa: D401 – sentinel class
@@ -28,355 +58,933 @@ class _RecPlaceholder:  # noqa: D401 – sentinel class
 _REC_PLACEHOLDER: Value = cast(Value, _RecPlaceholder())
 
 
-def lambEval(expr: Expr, env: dict[str, Value], is_tail: bool = False) -> Value:
-    """Evaluate ``expr`` in ``env``."""
-    # Variables
-    if isinstance(expr, Variable):
-        if expr.name in env:
-            val = env[expr.name]
+class _Unbound:  # noqa: D401 – sentinel class
+    def __repr__(self) -> str:  # pragma: no cover
+        return "<unbound>"
+
+
+# Contents of a frame slot whose ``define`` has not run yet
+_UNBOUND: Value = cast(Value, _Unbound())
+
+# Bumped whenever a global is rebound, invalidating every ``_CallCache``
+_GLOBALS_VERSION = [0]
+
+
+def _storeGlobal(env: dict[str, Value], name: str, value: Value) -> None:
+    """Bind a global, invalidating the call-site caches if it was bound."""
+    if name in env:
+        _GLOBALS_VERSION[0] += 1
+    env[name] = value
+
+
+def lambEval(expr: Expr, env: Env, is_tail: bool = False) -> Value:
+    """Evaluate ``expr`` in the global environment ``env``."""
+    return lambCompile(expr)(env, is_tail)
+
+
+def lambCompile(expr: Expr) -> Code:
+    """Compile ``expr`` into a Python closure ``code(env, is_tail)``.
+
+    The expression is lowered (``parser.lambLower``) and resolved
+    (``resolver.py``) and then walked once here; running the returned code
+    performs no further dispatch on node types or variable names.  Malformed
+    special forms are reported while compiling.
+    """
+    return _compile(lambResolve(lambLower(expr)))
+
+
+def _compileUnknown(node: Expr) -> Code:
+    return _compileError(EvalError, f"Unknown expression type: {node}")
+
+
+# Compilers for resolved expressions, keyed on node type
+_compile: TypeDispatch[Code] = TypeDispatch(_compileUnknown)
+
+
+def _compileError(error: type[LambError], message: str) -> Code:
+    def fail(env: Env, is_tail: bool) -> Value:
+        raise error(message)
+
+    return fail
+
+
+def _compileConstant(value: Value) -> Code:
+    def constant(env: Env, is_tail: bool) -> Value:
+        return value
+
+    return constant
+
+
+@_compile.register(Literal)
+def _compileLiteral(node: Literal) -> Code:
+    return _compileConstant(node.const)  # type: ignore[arg-type]
+
+
+@_compile.register(QuoteExpr)
+def _compileQuote(node: QuoteExpr) -> Code:
+    return _compileConstant(node.value)
+
+
+@_compile.register(Fail)
+def _compileFail(node: Fail) -> Code:
+    return _compileError(node.error, node.message)
+
+
+def _globals(env: Env, depth: int) -> dict[str, Value]:
+    """The global environment at the end of a chain of ``depth`` frames."""
+    while depth:
+        env = env[0]  # type: ignore[assignment, index]
+        depth -= 1
+    return env  # type: ignore[return-value]
+
+
+def _frameGetter(depth: int) -> Callable[[Any], Any]:
+    """A function walking ``depth`` frames up from its argument.
+
+    Nearly every reference is at most a few frames away, so those depths are
+    unrolled instead of looping.
+    """
+    if depth == 0:
+        return lambda env: env
+    if depth == 1:
+        return lambda env: env[0]
+    if depth == 2:
+        return lambda env: env[0][0]
+    if depth == 3:
+        return lambda env: env[0][0][0]
+    return lambda env: _globals(env, depth)
+
+
+@_compile.register(LocalRef)
+def _compileLocal(ref: LocalRef) -> Code:
+    name, depth, slot = ref.name, ref.depth, ref.slot
+    if ref.cell:
+        return _compileCell(ref)
+    if ref.checked:
+        frame = _frameGetter(depth)
+
+        def checked_local(env: Env, is_tail: bool) -> Value:
+            val: Value = frame(env)[slot]
             if val is _REC_PLACEHOLDER:
                 raise RecursionInitError(
-                    f"recursive binding '{expr.name}' accessed before initialisation"
+                    f"recursive binding '{name}' accessed before initialisation"
                 )
+            if val is _UNBOUND:
+                raise EvalError(f"unbound variable: {name}")
             return val
-        else:
-            raise EvalError(f"unbound variable: {expr.name}")
-
-    # Literals
-    if isinstance(expr, Literal):
-        if expr.value.isdigit():
-            return int(expr.value)
-        return expr.value
-
-    # Abstraction
-    if isinstance(expr, Abstraction):
-        return Closure(expr.param, expr.body, env.copy())
-
-    # Application
-    if isinstance(expr, Application):
-        if isinstance(expr.func, Variable):
-            fname = expr.func.name
-            if fname == "lambda":
-                if (
-                    len(expr.args) != 3
-                    or not isinstance(expr.args[1], Literal)
-                    or expr.args[1].value != "."
-                ):
-                    raise EvalError("lambda syntax: (lambda param . body)")
-                param_ast = expr.args[0]
-                if isinstance(param_ast, Variable):
-                    param = param_ast.name
-                elif isinstance(param_ast, Literal) and isinstance(
-                    param_ast.value, str
-                ):
-                    param = param_ast.value
-                else:
-                    param_val = lambEval(param_ast, env, False)
-                    if not isinstance(param_val, str):
-                        raise EvalError("lambda param must be string identifier")
-                    param = param_val
-                body = expr.args[2]
-                return Closure(param, body, env.copy())
-            elif fname == "quasiquote":
-                if len(expr.args) != 1:
-                    raise EvalError("quasiquote requires exactly one argument")
-                return evalQuasiquote(expr.args[0], env)
-            elif fname == "quote":
-                if len(expr.args) != 1:
-                    raise EvalError("quote requires exactly one argument")
-                return expr.args[0]
-            elif fname == "unquote":
-                if len(expr.args) != 1:
-                    raise EvalError("unquote requires exactly one argument")
-                # Unquote should only be used inside quasiquote
-                raise EvalError("unquote can only be used inside quasiquote")
-            elif fname == "if":
-                if len(expr.args) != 3:
-                    raise ParseError("if requires condition, then, else")
-                cond = lambEval(expr.args[0], env, False)
-                if not isinstance(cond, bool):
-                    raise EvalError("if condition must be boolean")
-                branch = expr.args[1] if cond else expr.args[2]
-                return lambEval(branch, env, is_tail)
-            elif fname == "define":
-                if len(expr.args) != 2:
-                    raise EvalError("define requires name and value")
-                name_ast = expr.args[0]
-                if isinstance(name_ast, Variable):
-                    name = name_ast.name
-                elif isinstance(name_ast, Literal) and isinstance(name_ast.value, str):
-                    name = name_ast.value
-                else:
-                    name_val = lambEval(name_ast, env, False)
-                    if not isinstance(name_val, str):
-                        raise EvalError("define name must be string identifier")
-                    name = name_val
-                value = lambEval(expr.args[1], env, False)
-                env[name] = value
-                if isinstance(value, Closure):
-                    value.env[name] = value
-                return f"<defined {name}>"
-            elif fname == "let":
-                if len(expr.args) < 3 or not isinstance(expr.args[0], Variable):
-                    raise EvalError("let syntax: (let var val body...)")
-                var = expr.args[0].name
-                val = lambEval(expr.args[1], env, False)
-                new_env = env.copy()
-                new_env[var] = val
-                bodies = expr.args[2:]
-                if not bodies:
-                    raise EvalError("let requires at least one body")
-                let_result: Value = nil
-                for idx, b in enumerate(bodies):
-                    is_last = idx == len(bodies) - 1
-                    let_result = lambEval(b, new_env, is_tail and is_last)
-                return let_result
-            elif fname == "defmacro":
-                if len(expr.args) != 3:
-                    raise EvalError("defmacro requires name, params, body")
-                name_ast = expr.args[0]
-                if not isinstance(name_ast, Variable):
-                    raise EvalError("defmacro name must be identifier")
-                name = name_ast.name
-                params_ast = expr.args[1]
-                body = expr.args[2]
-                params = []
-                if isinstance(params_ast, Application) and isinstance(
-                    params_ast.func, Variable
-                ):
-                    params.append(params_ast.func.name)
-                    for p in params_ast.args:
-                        if not isinstance(p, Variable):
-                            raise EvalError("defmacro params must be identifiers")
-                        params.append(p.name)
-                elif isinstance(params_ast, Variable):
-                    params = [params_ast.name]
-                else:
-                    raise EvalError("defmacro params must be list of identifiers")
-                env[name] = Macro(params, body)
-                return "<macro defined>"
-
-            # Add letrec if needed
-        # General case
-        def retire() -> Value:
-            func_val = lambEval(expr.func, env, False)
-            args = [lambEval(a, env, False) for a in expr.args]
-            return applyFunc(func_val, args, is_tail)
-
-        if is_tail:
-            return Thunk(retire)
-        else:
-            return retire()
-
-    # If-expression
-    if isinstance(expr, IfExpr):
-        cond = lambEval(expr.cond, env)
-        if not isinstance(cond, bool):
-            raise EvalError("condition in 'if' must be a boolean")
-        branch = expr.then_branch if cond else expr.else_branch
-        return lambEval(branch, env, is_tail)
-
-    # Define-expression
-    if isinstance(expr, DefineExpr):
-        env[expr.name] = None  # type: ignore
-        value = lambEval(expr.value, env)
-        if isinstance(value, Closure):
-            value.env[expr.name] = value
-        env[expr.name] = value
-        return f"<defined {expr.name}>"
-
-    # LetRec-expression
-    if isinstance(expr, LetRec):
-        new_env = env.copy()
-
-        # Pre-bind names to placeholder
-        for name, _ in expr.bindings:
-            new_env[name] = _REC_PLACEHOLDER
-
-        # Evaluate each binding RHS in the same env
-        for name, rhs in expr.bindings:
-            val = lambEval(rhs, new_env)
-            new_env[name] = val
-            if isinstance(val, Closure):
-                val.env[name] = val
-
-        # Patch mutually recursive closure envs
-        for item in new_env.values():
-            if isinstance(item, Closure):
-                for bind_name, _ in expr.bindings:
-                    item.env[bind_name] = new_env[bind_name]
-
-        result: Value = nil
-        for idx, body_expr in enumerate(expr.body):
-            is_last = idx == len(expr.body) - 1
-            result = lambEval(body_expr, new_env, is_tail and is_last)
+
+        return checked_local
+
+    # Most references are to the innermost frame or the ones just outside it
+    if depth == 0:
+
+        def local(env: Env, is_tail: bool) -> Value:
+            return env[slot]  # type: ignore[index]
+
+    elif depth == 1:
+
+        def local(env: Env, is_tail: bool) -> Value:
+            return env[0][slot]  # type: ignore[index]
+
+    elif depth == 2:
+
+        def local(env: Env, is_tail: bool) -> Value:
+            return env[0][0][slot]  # type: ignore[index]
+
+    else:
+        frame = _frameGetter(depth)
+
+        def local(env: Env, is_tail: bool) -> Value:
+            val: Value = frame(env)[slot]
+            return val
+
+    return local
+
+
+def _compileCell(ref: LocalRef) -> Code:
+    """Compile a reference to a variable held in a cell shared with closures."""
+    name, slot = ref.name, ref.slot
+    frame = _frameGetter(ref.depth)
+    if ref.checked:
+
+        def checked_cell(env: Env, is_tail: bool) -> Value:
+            val: Value = frame(env)[slot][0]
+            if val is _REC_PLACEHOLDER:
+                raise RecursionInitError(
+                    f"recursive binding '{name}' accessed before initialisation"
+                )
+            if val is _UNBOUND:
+                raise EvalError(f"unbound variable: {name}")
+            return val
+
+        return checked_cell
+
+    def cell(env: Env, is_tail: bool) -> Value:
+        val: Value = frame(env)[slot][0]
+        return val
+
+    return cell
+
+
+@_compile.register(FrameRef)
+def _compileFrame(ref: FrameRef) -> Code:
+    frame = _frameGetter(ref.depth)
+
+    def frame_ref(env: Env, is_tail: bool) -> Value:
+        return cast(Value, frame(env))
+
+    return frame_ref
+
+
+@_compile.register(ResolvedGlobalIs)
+def _compileGlobalIs(node: ResolvedGlobalIs) -> Code:
+    name, value = node.name, node.value
+    globals_of = _frameGetter(node.depth)
+
+    def global_is(env: Env, is_tail: bool) -> Value:
+        return globals_of(env).get(name) is value
+
+    return global_is
+
+
+@_compile.register(GlobalRef)
+def _compileGlobal(ref: GlobalRef) -> Code:
+    name, depth = ref.name, ref.depth
+    if depth == 0:
+
+        def global_(env: Env, is_tail: bool) -> Value:
+            try:
+                return env[name]  # type: ignore[call-overload]
+            except KeyError:
+                raise EvalError(f"unbound variable: {name}") from None
+
+    elif depth == 1:
+
+        def global_(env: Env, is_tail: bool) -> Value:
+            try:
+                return env[0][name]  # type: ignore[index]
+            except KeyError:
+                raise EvalError(f"unbound variable: {name}") from None
+
+    elif depth == 2:
+
+        def global_(env: Env, is_tail: bool) -> Value:
+            try:
+                return env[0][0][name]  # type: ignore[index]
+            except KeyError:
+                raise EvalError(f"unbound variable: {name}") from None
+
+    else:
+        frame = _frameGetter(depth)
+
+        def global_(env: Env, is_tail: bool) -> Value:
+            try:
+                val: Value = frame(env)[name]
+                return val
+            except KeyError:
+                raise EvalError(f"unbound variable: {name}") from None
+
+    return global_
+
+
+def _compileStore(ref: Ref) -> Callable[[Env, Value], None]:
+    if isinstance(ref, GlobalRef):
+        name, depth = ref.name, ref.depth
+
+        def store_global(env: Env, value: Value) -> None:
+            _storeGlobal(_globals(env, depth), name, value)
+
+        return store_global
+
+    depth, slot = ref.depth, ref.slot
+    frame = _frameGetter(depth)
+    if ref.cell:
+
+        def store_cell(env: Env, value: Value) -> None:
+            frame(env)[slot][0] = value
+
+        return store_cell
+
+    def store_local(env: Env, value: Value) -> None:
+        frame(env)[slot] = value
+
+    return store_local
+
+
+def _boxCells(cells: list[int], frame: list[Any]) -> None:
+    """Move the variables in ``cells`` into cells shared with closures."""
+    for slot in cells:
+        frame[slot] = [frame[slot]]
+
+
+class _Restart:  # noqa: D401 – sentinel class
+    def __repr__(self) -> str:  # pragma: no cover
+        return "<restart>"
+
+
+# Returned by a ``SelfTailCall`` that has rebound the parameters of its frame
+_RESTART: Value = cast(Value, _Restart())
+
+# The code of each looping function whose body is being compiled, innermost last
+_loopTargets: list[Code] = []
+
+
+# The function each body was compiled from, so that ``image.py`` can save
+# closures and compile their bodies again when they are loaded
+_functionSources: WeakKeyDictionary[Code, ResolvedLambda] = WeakKeyDictionary()
+
+
+def _compileFunctionBody(fn: ResolvedLambda) -> Code:
+    """Compile the code run on a fresh ``[env, *args]`` frame for ``fn``.
+
+    Hot functions are translated into Python source by ``jit.py``.
+    """
+    from .jit import lambJitFunction
+
+    code = lambJitFunction(fn, _compileInterpretedBody)
+    _functionSources[code] = fn
+    return code
+
+
+def _compileInterpretedBody(fn: ResolvedLambda, entry: Optional[Code]) -> Code:
+    """Compile the body of ``fn`` into nested closures.
+
+    ``entry`` is the code closures of ``fn`` hold, which self tail calls look
+    for, when it is not the code returned here.
+    """
+    if fn.loops:
+        return _compileLoop(fn, entry)
+    body_code = _compile(fn.body)
+    cells = fn.cells
+    if not fn.nlocals and not cells:
+        return body_code
+    padding = [_UNBOUND] * fn.nlocals
+
+    if not cells:
+
+        def function_body(env: Env, is_tail: bool) -> Value:
+            env.extend(padding)  # type: ignore[union-attr]
+            return body_code(env, is_tail)
+
+    else:
+
+        def function_body(env: Env, is_tail: bool) -> Value:
+            env.extend(padding)  # type: ignore[union-attr]
+            _boxCells(cells, env)  # type: ignore[arg-type]
+            return body_code(env, is_tail)
+
+    return function_body
+
+
+def _compileLoop(fn: ResolvedLambda, entry: Optional[Code]) -> Code:
+    """Compile a function body that restarts itself for each ``SelfTailCall``.
+
+    Such a body creates no closures, so its frame holds no cells.
+    """
+    padding = [_UNBOUND] * fn.nlocals
+    first_local = len(fn.params) + 1
+
+    def function_body(env: Env, is_tail: bool) -> Value:
+        if padding:
+            env.extend(padding)  # type: ignore[union-attr]
+        result = body_code(env, True)
+        while result is _RESTART:
+            if padding:
+                env[first_local:] = padding  # type: ignore[assignment, index]
+            result = body_code(env, True)
         return result
 
-    # Quasiquote
-    if isinstance(expr, QuasiQuoteExpr):
-        return evalQuasiquote(expr.expr, env)
+    _loopTargets.append(function_body if entry is None else entry)
+    try:
+        body_code = _compile(fn.body)
+    finally:
+        _loopTargets.pop()
+    return function_body
+
+
+@_compile.register(SelfTailCall)
+def _compileSelfTailCall(node: SelfTailCall) -> Code:
+    loop = _loopTargets[-1]
+    func_code = _compile(node.func)
+    arg_codes = [_compile(a) for a in node.args]
+    # Used when the name no longer holds the running closure
+    call = _compileApplication(Application(node.func, node.args))
+
+    if len(arg_codes) == 1:
+        (arg0,) = arg_codes
+
+        def self_call(env: Env, is_tail: bool) -> Value:
+            f = func_code(env, False)
+            if (
+                type(f) is Closure
+                and f.code is loop
+                and f.env is env[0]  # type: ignore[index]
+                and not f.args
+            ):
+                env[1] = arg0(env, False)  # type: ignore[index]
+                return _RESTART
+            return call(env, is_tail)
+
+    elif len(arg_codes) == 2:
+        arg0, arg1 = arg_codes
+
+        def self_call(env: Env, is_tail: bool) -> Value:
+            f = func_code(env, False)
+            if (
+                type(f) is Closure
+                and f.code is loop
+                and f.env is env[0]  # type: ignore[index]
+                and not f.args
+            ):
+                val0 = arg0(env, False)
+                env[2] = arg1(env, False)  # type: ignore[index]
+                env[1] = val0  # type: ignore[index]
+                return _RESTART
+            return call(env, is_tail)
+
+    else:
+        end = len(arg_codes) + 1
+
+        def self_call(env: Env, is_tail: bool) -> Value:
+            f = func_code(env, False)
+            if (
+                type(f) is Closure
+                and f.code is loop
+                and f.env is env[0]  # type: ignore[index]
+                and not f.args
+            ):
+                env[1:end] = [a(env, False) for a in arg_codes]  # type: ignore[assignment, index]
+                return _RESTART
+            return call(env, is_tail)
+
+    return self_call
+
+
+@_compile.register(ResolvedLambda)
+def _compileLambda(fn: ResolvedLambda) -> Code:
+    param, source = fn.params[0], fn.source
+    rest_params = fn.params[1:]
+    body_code = _compileFunctionBody(fn)
+    globals_code, *capture_codes = [_compile(c) for c in fn.captures]
+
+    # The closure keeps only the globals and the variables its body uses
+    if not capture_codes:
+        closure_env = globals_code
+    elif len(capture_codes) == 1:
+        (capture0,) = capture_codes
+
+        def closure_env(env: Env, is_tail: bool) -> Value:
+            return cast(Value, [globals_code(env, False), capture0(env, False)])
+
+    else:
+
+        def closure_env(env: Env, is_tail: bool) -> Value:
+            captured = [globals_code(env, False)]
+            captured += [c(env, False) for c in capture_codes]
+            return cast(Value, captured)
+
+    if not rest_params:
+
+        def abstraction(env: Env, is_tail: bool) -> Value:
+            env = closure_env(env, False)  # type: ignore[assignment]
+            return Closure(param, source, env, body_code)
+
+    else:
+
+        def abstraction(env: Env, is_tail: bool) -> Value:
+            env = closure_env(env, False)  # type: ignore[assignment]
+            return Closure(param, source, env, body_code, rest_params)
+
+    return abstraction
+
+
+@_compile.register(IfExpr)
+def _compileIf(node: IfExpr) -> Code:
+    cond_code = _compile(node.cond)
+    then_code = _compile(node.then_branch)
+    else_code = _compile(node.else_branch)
+
+    def if_expr(env: Env, is_tail: bool) -> Value:
+        cond_val = cond_code(env, False)
+        if cond_val is True:
+            return then_code(env, is_tail)
+        if cond_val is False:
+            return else_code(env, is_tail)
+        raise EvalError("if condition must be boolean")
+
+    return if_expr
+
+
+@_compile.register(ResolvedDefine)
+def _compileDefine(node: ResolvedDefine) -> Code:
+    store = _compileStore(node.target)
+    value_code = _compile(node.value)
+    message = f"<defined {node.name}>"
+
+    def define(env: Env, is_tail: bool) -> Value:
+        store(env, value_code(env, False))
+        return message
+
+    return define
+
+
+@_compile.register(ResolvedLet)
+def _compileLet(node: ResolvedLet) -> Code:
+    value_codes = [_compile(v) for v in node.values]
+    body_codes = [_compile(b) for b in node.body]
+    padding = [_UNBOUND] * (node.nslots - len(value_codes))
+    cells = node.cells
+
+    if len(value_codes) == 1:
+        (value_code,) = value_codes
+
+        def let_form(env: Env, is_tail: bool) -> Value:
+            frame = [env, value_code(env, False), *padding]
+            if cells:
+                _boxCells(cells, frame)
+            return _runBody(body_codes, frame, is_tail)
+
+    else:
+
+        def let_form(env: Env, is_tail: bool) -> Value:
+            frame = [env, *[code(env, False) for code in value_codes], *padding]
+            if cells:
+                _boxCells(cells, frame)
+            return _runBody(body_codes, frame, is_tail)
+
+    return let_form
+
+
+@_compile.register(ResolvedLetRec)
+def _compileLetRec(node: ResolvedLetRec) -> Code:
+    rhs_codes = [
+        (slot, slot in node.cells, _compile(rhs)) for slot, rhs in node.bindings
+    ]
+    body_codes = [_compile(b) for b in node.body]
+    # Names start out bound to the placeholder, defines to ``_UNBOUND``
+    initial = [_REC_PLACEHOLDER] * node.nrec
+    initial += [_UNBOUND] * (node.nslots - node.nrec)
+    cells = node.cells
+
+    def letrec(env: Env, is_tail: bool) -> Value:
+        frame = [env, *initial]
+        # Closures share the cells of the bindings they use, so they see each
+        # one once it is initialised.
+        _boxCells(cells, frame)
+        for slot, in_cell, rhs_code in rhs_codes:
+            if in_cell:
+                frame[slot][0] = rhs_code(frame, False)  # type: ignore[index]
+            else:
+                frame[slot] = rhs_code(frame, False)
+        return _runBody(body_codes, frame, is_tail)
+
+    return letrec
+
+
+@_compile.register(ResolvedQuasiquote)
+def _compileQuasiquote(node: ResolvedQuasiquote) -> Code:
+    template = node.template
+    hole_codes = [_compile(h) for h in node.holes]
+
+    def quasiquote(env: Env, is_tail: bool) -> Value:
+        values = iter([code(env, False) for code in hole_codes])
+        return expandQuasiquote(template, lambda _: next(values))
+
+    return quasiquote
 
-    # Quote (do not evaluate)
-    if isinstance(expr, QuoteExpr):
-        return expr.value
 
-    # DefMacro-expression
-    if isinstance(expr, DefMacroExpr):
-        env[expr.name] = Macro(expr.params, expr.body)
+@_compile.register(ResolvedDefMacro)
+def _compileDefMacro(node: ResolvedDefMacro) -> Code:
+    name, params, body, depth = node.name, node.params, node.body, node.depth
+
+    def defmacro(env: Env, is_tail: bool) -> Value:
+        _storeGlobal(_globals(env, depth), name, Macro(params, body))
         return "<macro defined>"
 
-    raise EvalError(f"Unknown expression type: {expr}")
+    return defmacro
 
 
-def trampoline(result: Value) -> Value:
-    while isinstance(result, Thunk):
-        result = result.func()
+def _runBody(body_codes: list[Code], env: Env, is_tail: bool) -> Value:
+    result: Value = nil
+    last = len(body_codes) - 1
+    for idx, code in enumerate(body_codes):
+        result = code(env, is_tail and idx == last)
     return result
 
 
+class _CallCache:
+    """Inline cache for a call site whose function is a global variable.
+
+    Holds the value last found for the name and, when it is a builtin taking
+    exactly the call's arguments, the Python function to call directly.  It is
+    valid while the call runs in the same global environment and no global has
+    been rebound since (see ``_GLOBALS_VERSION``).
+    """
+
+    __slots__ = ("name", "nargs", "env", "version", "value", "direct")
+
+    def __init__(self, name: str, nargs: int) -> None:
+        self.name = name
+        self.nargs = nargs
+        self.env: Any = None
+        self.version = -1
+        self.value: Value = nil
+        self.direct: Optional[Callable[..., Value]] = None
+
+    def load(self, env: dict[str, Value]) -> None:
+        try:
+            value = env[self.name]
+        except KeyError:
+            raise EvalError(f"unbound variable: {self.name}") from None
+        self.env = env
+        self.version = _GLOBALS_VERSION[0]
+        self.value = value
+        self.direct = None
+        if type(value) is Builtin and value.arity == self.nargs and not value.args:
+            self.direct = value.func
+
+
+def _compileGlobalCall(ref: GlobalRef, arg_codes: list[Code]) -> Code:
+    """Compile a call to a global function through a ``_CallCache``.
+
+    A builtin is called directly, even in tail position: it cannot grow the
+    stack, so there is no need to hand the caller a thunk.
+    """
+    cache = _CallCache(ref.name, len(arg_codes))
+    globals_of = _frameGetter(ref.depth)
+
+    if len(arg_codes) == 1:
+        (arg0,) = arg_codes
+
+        def global_call(env: Env, is_tail: bool) -> Value:
+            globals_ = globals_of(env)
+            if globals_ is not cache.env or cache.version != _GLOBALS_VERSION[0]:
+                cache.load(globals_)
+            direct = cache.direct
+            if direct is not None:
+                return direct(arg0(env, False))
+            func_val = cache.value
+            if is_tail:
+                return TailCall(func_val, [arg0(env, False)])
+            return _apply[type(func_val)](func_val, [arg0(env, False)], False)
+
+    elif len(arg_codes) == 2:
+        arg0, arg1 = arg_codes
+
+        def global_call(env: Env, is_tail: bool) -> Value:
+            globals_ = globals_of(env)
+            if globals_ is not cache.env or cache.version != _GLOBALS_VERSION[0]:
+                cache.load(globals_)
+            direct = cache.direct
+            if direct is not None:
+                return direct(arg0(env, False), arg1(env, False))
+            func_val = cache.value
+            args = [arg0(env, False), arg1(env, False)]
+            if is_tail:
+                return TailCall(func_val, args)
+            return _apply[type(func_val)](func_val, args, False)
+
+    else:
+
+        def global_call(env: Env, is_tail: bool) -> Value:
+            globals_ = globals_of(env)
+            if globals_ is not cache.env or cache.version != _GLOBALS_VERSION[0]:
+                cache.load(globals_)
+            direct = cache.direct
+            if direct is not None:
+                return direct(*[a(env, False) for a in arg_codes])
+            func_val = cache.value
+            args = [a(env, False) for a in arg_codes]
+            if is_tail:
+                return TailCall(func_val, args)
+            return _apply[type(func_val)](func_val, args, False)
+
+    return global_call
+
+
+@_compile.register(Application)
+def _compileApplication(expr: Application) -> Code:
+    if isinstance(expr.func, GlobalRef):
+        return _compileGlobalCall(expr.func, [_compile(a) for a in expr.args])
+    func_code = _compile(expr.func)
+    arg_codes = [_compile(a) for a in expr.args]
+
+    # Specialise the common arities so the hot path avoids building the
+    # argument list with a comprehension.
+    if len(arg_codes) == 1:
+        (arg0,) = arg_codes
+
+        def application(env: Env, is_tail: bool) -> Value:
+            func_val = func_code(env, False)
+            if is_tail:
+                return TailCall(func_val, [arg0(env, False)])
+            return _apply[type(func_val)](func_val, [arg0(env, False)], False)
+
+    elif len(arg_codes) == 2:
+        arg0, arg1 = arg_codes
+
+        def application(env: Env, is_tail: bool) -> Value:
+            func_val = func_code(env, False)
+            args = [arg0(env, False), arg1(env, False)]
+            if is_tail:
+                return TailCall(func_val, args)
+            return _apply[type(func_val)](func_val, args, False)
+
+    else:
+
+        def application(env: Env, is_tail: bool) -> Value:
+            func_val = func_code(env, False)
+            args = [a(env, False) for a in arg_codes]
+            if is_tail:
+                return TailCall(func_val, args)
+            return _apply[type(func_val)](func_val, args, False)
+
+    return application
+
+
+def trampoline(result: Value) -> Value:
+    """Make pending tail calls, and force thunks, until a value results."""
+    while True:
+        if type(result) is TailCall:
+            func_val = result.func
+            result = _apply[type(func_val)](func_val, result.args, True)
+        elif isinstance(result, Thunk):
+            result = result.func()
+        else:
+            return result
+
+
 def applyFunc(func_val: Value, args: list[Value], is_tail: bool = False) -> Value:
-    if isinstance(func_val, Closure):
-        result: Value = func_val
-        for i, arg in enumerate(args):
-            if not isinstance(result, Closure):
-                return result
-            new_env = result.env.copy()
-            new_env[result.param] = arg
-            # If this is the last argument and we're in tail position,
-            # use tail call optimization
-            is_last_arg = i == len(args) - 1
-            result = lambEval(result.body, new_env, is_tail and is_last_arg)
-            if not isinstance(result, Closure):
-                return result
-        return result
-    if isinstance(func_val, Builtin):
-        builtin_result: Value = func_val
-        for arg in args:
-            if not isinstance(builtin_result, Builtin):
-                return builtin_result
-            builtin_result = builtin_result.func(arg)
-        # Handle 0-argument builtins
-        if len(args) == 0:
-            if isinstance(builtin_result, Builtin):
-                # 0-argument builtins still need a dummy argument
-                return builtin_result.func(nil)
-            return builtin_result
-        return builtin_result
-    if isinstance(func_val, Macro):
-        # This should not happen - macros should be expanded before evaluation
-        raise EvalError("tried to apply a macro as a function - macro expansion failed")
+    return _apply[type(func_val)](func_val, args, is_tail)
+
+
+def _applyNonFunction(func_val: Value, args: list[Value], is_tail: bool) -> Value:
     raise EvalError("tried to apply a non-function value")
 
 
-def evalQuasiquote(expr: Expr, env: dict[str, Value]) -> Expr:
+# Application of each kind of callable value, keyed on its type
+_apply: TypeDispatch[Value] = TypeDispatch(_applyNonFunction)
+
+
+@_apply.register(Closure)
+def _applyClosure(func_val: Closure, args: list[Value], is_tail: bool) -> Value:
+    result: Value = func_val
+    while args:
+        if not isinstance(result, Closure):
+            return result
+        bound = result.args
+        need = len(result.rest_params) + 1 - len(bound)
+        if len(args) < need:
+            # Partial application: keep the arguments until the rest arrive
+            return replace(result, args=(*bound, *args))
+        code = result.code
+        if code is None:
+            body = lambLower(result.body)
+            fn = lambResolveFunction(result.params, body)
+            code = result.code = _compileFunctionBody(fn)
+        # One frame binds every parameter: [env, *earlier args, *new args]
+        if len(args) == need and not bound:
+            new_env = [result.env, *args]
+            args = []
+        else:
+            new_env = [result.env, *bound, *args[:need]]
+            args = args[need:]
+        # The body always runs in tail position.  A call in tail position hands
+        # the resulting ``TailCall`` to the caller's trampoline; any other call
+        # runs its own, so a loop inside a non-tail call uses constant stack.
+        result = code(new_env, True)
+        if is_tail and not args:
+            return result
+        while type(result) is TailCall:
+            callee = result.func
+            result = _apply[type(callee)](callee, result.args, True)
+    return result
+
+
+def _callBuiltin(func_val: Builtin, args: list[Value]) -> Value:
+    """Call a builtin, shared with the VM."""
+    bound = func_val.args
+    if len(args) == func_val.arity and not bound:
+        # Saturated call: no partial application is built
+        return func_val.func(*args)
+    if not args:
+        # A call with no arguments passes nil, as in ``(gensym)``
+        args = [nil]
+    need = func_val.arity - len(bound)
+    if len(args) < need:
+        check = func_val.check
+        if check is not None:
+            for arg in args:
+                check(arg)
+        return replace(func_val, args=(*bound, *args))
+    result = func_val.func(*bound, *args[:need])
+    if len(args) > need:
+        if func_val.variadic:
+            # (+ a b c) is (+ (+ a b) c)
+            func = func_val.func
+            for arg in args[need:]:
+                result = func(result, arg)
+        elif isinstance(result, Builtin):
+            return _callBuiltin(result, args[need:])
+    return result
+
+
+@_apply.register(Builtin)
+def _applyBuiltin(func_val: Builtin, args: list[Value], is_tail: bool) -> Value:
+    need = func_val.arity - len(func_val.args)
+    if len(args) > need and not func_val.variadic:
+        result = _callBuiltin(func_val, args[:need])
+        # A closure result, such as a memoized function may return, takes
+        # the rest of the arguments, as a builtin result does
+        if isinstance(result, (Closure, Builtin)):
+            return _apply[type(result)](result, args[need:], is_tail)
+        return result
+    return _callBuiltin(func_val, args)
+
+
+@_apply.register(Macro)
+def _applyMacro(func_val: Macro, args: list[Value], is_tail: bool) -> Value:
+    # This should not happen - macros should be expanded before evaluation
+    raise EvalError("tried to apply a macro as a function - macro expansion failed")
+
+
+def evalQuasiquote(expr: Expr, env: Env) -> Expr:
+    """Instantiate the quasiquote template ``expr``, evaluating unquotes in ``env``."""
+    return expandQuasiquote(expr, lambda unquoted: lambEval(unquoted, env))
+
+
+def expandQuasiquote(expr: Expr, unquote: Callable[[Expr], Value]) -> Expr:
+    """Instantiate a quasiquote template, calling ``unquote`` for each hole.
+
+    Holes are visited in evaluation order, which lets other engines evaluate
+    the unquoted expressions themselves and splice in the results.
+    """
+    return _expandQQ[type(expr)](expr, unquote)
+
+
+# Literal and Variable and QuoteExpr just pass through
+# (QuoteExpr should remain as code data), as does any other node
+def _expandQQLeaf(expr: Expr, unquote: Callable[[Expr], Value]) -> Expr:
+    return expr
+
+
+_expandQQ: TypeDispatch[Expr] = TypeDispatch(_expandQQLeaf)
+
+
+@_expandQQ.register(UnquoteExpr)
+def _expandQQUnquote(expr: UnquoteExpr, unquote: Callable[[Expr], Value]) -> Expr:
     # If we see an unquote, evaluate its contents immediately and embed the value
-    if isinstance(expr, UnquoteExpr):
-        value = lambEval(expr.expr, env)
-        # Return the evaluated value directly - it will be embedded in the AST
-        return value  # type: ignore
+    value = unquote(expr.expr)
+    # Return the evaluated value directly - it will be embedded in the AST
+    return value  # type: ignore
 
+
+@_expandQQ.register(QuasiQuoteExpr)
+def _expandQQNested(expr: QuasiQuoteExpr, unquote: Callable[[Expr], Value]) -> Expr:
     # Nested quasiquotes: treat them as data
-    if isinstance(expr, QuasiQuoteExpr):
-        return QuasiQuoteExpr(evalQuasiquote(expr.expr, env))
+    return QuasiQuoteExpr(expandQuasiquote(expr.expr, unquote))
+
 
+@_expandQQ.register(Application)
+def _expandQQApplication(expr: Application, unquote: Callable[[Expr], Value]) -> Expr:
     # Applications: recursively quasiquote func and args
-    if isinstance(expr, Application):
-        # Handle quasiquote applications specially
-        if isinstance(expr.func, Variable) and expr.func.name == "quasiquote":
-            if len(expr.args) == 1:
-                return QuasiQuoteExpr(evalQuasiquote(expr.args[0], env))
-            else:
-                raise EvalError("quasiquote requires exactly one argument")
+    # Handle quasiquote applications specially
+    if isinstance(expr.func, Variable) and expr.func.name == "quasiquote":
+        if len(expr.args) == 1:
+            return QuasiQuoteExpr(expandQuasiquote(expr.args[0], unquote))
+        else:
+            raise EvalError("quasiquote requires exactly one argument")
 
-        # Handle unquote applications specially
-        if isinstance(expr.func, Variable) and expr.func.name == "unquote":
-            if len(expr.args) == 1:
-                # Evaluate the unquoted expression and return the result
-                return lambEval(expr.args[0], env)  # type: ignore
-            else:
-                raise EvalError("unquote requires exactly one argument")
-
-        # Handle if applications specially
-        if isinstance(expr.func, Variable) and expr.func.name == "if":
-            if len(expr.args) == 3:
-                return IfExpr(
-                    evalQuasiquote(expr.args[0], env),
-                    evalQuasiquote(expr.args[1], env),
-                    evalQuasiquote(expr.args[2], env),
-                )
-            else:
-                raise EvalError("if requires condition, then, else")
-
-        # Handle define applications specially
-        if isinstance(expr.func, Variable) and expr.func.name == "define":
-            if len(expr.args) == 2:
-                return DefineExpr(
-                    (
-                        expr.args[0].name
-                        if isinstance(expr.args[0], Variable)
-                        else str(expr.args[0])
-                    ),
-                    evalQuasiquote(expr.args[1], env),
-                )
-            else:
-                raise EvalError("define requires name and value")
+    # Handle unquote applications specially
+    if isinstance(expr.func, Variable) and expr.func.name == "unquote":
+        if len(expr.args) == 1:
+            # Evaluate the unquoted expression and return the result
+            return unquote(expr.args[0])  # type: ignore
+        else:
+            raise EvalError("unquote requires exactly one argument")
+
+    # Handle if applications specially
+    if isinstance(expr.func, Variable) and expr.func.name == "if":
+        if len(expr.args) == 3:
+            return IfExpr(
+                expandQuasiquote(expr.args[0], unquote),
+                expandQuasiquote(expr.args[1], unquote),
+                expandQuasiquote(expr.args[2], unquote),
+            )
+        else:
+            raise EvalError("if requires condition, then, else")
 
-        # Handle defmacro applications specially
-        if isinstance(expr.func, Variable) and expr.func.name == "defmacro":
-            if len(expr.args) >= 3:
-                # Extract name
-                name = (
+    # Handle define applications specially
+    if isinstance(expr.func, Variable) and expr.func.name == "define":
+        if len(expr.args) == 2:
+            return DefineExpr(
+                (
                     expr.args[0].name
                     if isinstance(expr.args[0], Variable)
                     else str(expr.args[0])
-                )
-                # Extract parameters - should be a list of variables
-                if (
-                    isinstance(expr.args[1], Application)
-                    and isinstance(expr.args[1].func, Variable)
-                    and expr.args[1].func.name == "list"
-                ):
-                    params = [
-                        arg.name if isinstance(arg, Variable) else str(arg)
-                        for arg in expr.args[1].args
-                    ]
-                else:
-                    params = []
-                # Extract body
-                body = evalQuasiquote(expr.args[2], env)
-                return DefMacroExpr(name, params, body)
+                ),
+                expandQuasiquote(expr.args[1], unquote),
+            )
+        else:
+            raise EvalError("define requires name and value")
+
+    # Handle defmacro applications specially
+    if isinstance(expr.func, Variable) and expr.func.name == "defmacro":
+        if len(expr.args) >= 3:
+            # Extract name
+            name = (
+                expr.args[0].name
+                if isinstance(expr.args[0], Variable)
+                else str(expr.args[0])
+            )
+            # Extract parameters - should be a list of variables
+            if (
+                isinstance(expr.args[1], Application)
+                and isinstance(expr.args[1].func, Variable)
+                and expr.args[1].func.name == "list"
+            ):
+                params = [
+                    arg.name if isinstance(arg, Variable) else str(arg)
+                    for arg in expr.args[1].args
+                ]
             else:
-                raise EvalError("defmacro requires name, params, and body")
+                params = []
+            # Extract body
+            body = expandQuasiquote(expr.args[2], unquote)
+            return DefMacroExpr(name, params, body)
+        else:
+            raise EvalError("defmacro requires name, params, and body")
+
+    return Application(
+        expandQuasiquote(expr.func, unquote),
+        [expandQuasiquote(arg, unquote) for arg in expr.args],
+    )
 
-        return Application(
-            evalQuasiquote(expr.func, env),
-            [evalQuasiquote(arg, env) for arg in expr.args],
-        )
 
+@_expandQQ.register(Abstraction)
+def _expandQQLambda(expr: Abstraction, unquote: Callable[[Expr], Value]) -> Expr:
     # Lambda bodies: quasiquote inside the body
-    if isinstance(expr, Abstraction):
-        return Abstraction(expr.param, evalQuasiquote(expr.body, env))
+    return Abstraction(
+        expr.param, expandQuasiquote(expr.body, unquote), expr.rest_params
+    )
 
-    # If-expressions: quad-tree walk
-    if isinstance(expr, IfExpr):
-        return IfExpr(
-            evalQuasiquote(expr.cond, env),
-            evalQuasiquote(expr.then_branch, env),
-            evalQuasiquote(expr.else_branch, env),
-        )
 
-    # Definitions: quasiquote the value
-    if isinstance(expr, DefineExpr):
-        return DefineExpr(expr.name, evalQuasiquote(expr.value, env))
+@_expandQQ.register(IfExpr)
+def _expandQQIf(expr: IfExpr, unquote: Callable[[Expr], Value]) -> Expr:
+    return IfExpr(
+        expandQuasiquote(expr.cond, unquote),
+        expandQuasiquote(expr.then_branch, unquote),
+        expandQuasiquote(expr.else_branch, unquote),
+    )
 
-    # Macro definitions: quasiquote the body
-    if isinstance(expr, DefMacroExpr):
-        return DefMacroExpr(expr.name, expr.params, evalQuasiquote(expr.body, env))
 
-    # Literal and Variable and QuoteExpr just pass through
-    # (QuoteExpr should remain as code data)
-    if isinstance(expr, (Literal, Variable, QuoteExpr)):
-        return expr
+@_expandQQ.register(DefineExpr)
+def _expandQQDefine(expr: DefineExpr, unquote: Callable[[Expr], Value]) -> Expr:
+    # Definitions: quasiquote the value
+    return DefineExpr(expr.name, expandQuasiquote(expr.value, unquote))
 
-    # Fallback: leave any other node unchanged
-    return expr
+
+@_expandQQ.register(DefMacroExpr)
+def _expandQQDefMacro(expr: DefMacroExpr, unquote: Callable[[Expr], Value]) -> Expr:
+    # Macro definitions: quasiquote the body
+    return DefMacroExpr(expr.name, expr.params, expandQuasiquote(expr.body, unquote))
@@ -0,0 +1,168 @@
+"""Images: a global environment saved to a file, and loaded again.
+
+``lambdora run --save-image out.img`` and ``lambdora repl --save-image``
+write the environment, with the standard library and everything the program
+or session defined, when they finish.  ``--image out.img`` loads it in place
+of the standard library, so no source is read before the program runs.
+
+An image is a pickle of the globals.  Builtins are saved by the name
+``lambMakeTopEnv()`` gave them and re-linked to the builtins of the
+environment the image is loaded into.  Closures keep the resolved function
+their body was compiled from, and are compiled again on loading; memoized
+functions start with empty caches.  An image records the engine that made
+its closures, and can only be loaded with the same one.
+
+Loading an image runs no Lambdora code, but only load images you trust: as
+with any pickle, a crafted file could construct the package's own objects
+in ways the interpreter never would.
+"""
+
+from __future__ import annotations
+
+import io
+import pickle
+import sys
+from pathlib import Path
+from typing import Any, Optional
+
+from . import __version__
+from .builtinsmodule import lambMakeTopEnv
+from .errors import LambError
+from .evaluator import (
+    _GLOBALS_VERSION,
+    _REC_PLACEHOLDER,
+    _UNBOUND,
+    _compileFunctionBody,
+    _functionSources,
+)
+from .memo import MemoCache, lambMemoize
+from .resolver import ResolvedLambda
+from .values import Builtin, Globals, Value, nil
+
+# Bumped whenever what is pickled changes
+IMAGE_VERSION = 1
+
+_MAGIC = b"LAMBDORA-IMAGE\n"
+
+# Objects that must be the same ones after loading, by persistent id
+_SINGLETONS: dict[str, Any] = {
+    "nil": nil,
+    "unbound": _UNBOUND,
+    "placeholder": _REC_PLACEHOLDER,
+}
+
+
+class ImageError(LambError, ValueError):
+    """An image that cannot be saved, or loaded into this interpreter."""
+
+
+def lambSaveImage(env: dict[str, Value], path: Path, engine: str = "tree") -> None:
+    """Save the global environment ``env``, made by ``engine``, to ``path``."""
+    if isinstance(env, Globals):
+        env.loadAll()
+    buffer = io.BytesIO()
+    try:
+        _Pickler(buffer, env).dump(dict(env))
+    except (pickle.PicklingError, TypeError, AttributeError) as err:
+        raise ImageError(f"cannot save image: {err}") from err
+    path.write_bytes(_MAGIC + pickle.dumps(_header(engine)) + buffer.getvalue())
+
+
+def lambLoadImage(path: Path, env: dict[str, Value], engine: str = "tree") -> None:
+    """Replace the contents of ``env`` with the image at ``path``."""
+    try:
+        data = path.read_bytes()
+    except OSError as err:
+        raise ImageError(f"cannot read image '{path}': {err}") from err
+    if not data.startswith(_MAGIC):
+        raise ImageError(f"'{path}' is not a Lambdora image")
+    stream = io.BytesIO(data[len(_MAGIC) :])
+    try:
+        header = pickle.load(stream)
+    except Exception as err:
+        raise ImageError(f"'{path}' is not a Lambdora image") from err
+    expected = _header(engine)
+    if header != expected:
+        if header[:3] == expected[:3]:
+            raise ImageError(
+                f"image '{path}' was saved by the {header[3]} engine, not {engine}"
+            )
+        raise ImageError(
+            f"image '{path}' was saved by another version of Lambdora or Python"
+        )
+    env.clear()
+    lambMakeTopEnv(env)
+    try:
+        globals_ = _Unpickler(stream, env).load()
+    except Exception as err:
+        raise ImageError(f"cannot load image '{path}': {err}") from err
+    env.update(globals_)
+    # Call-site caches may hold values from before
+    _GLOBALS_VERSION[0] += 1
+
+
+def _header(engine: str) -> tuple[Any, ...]:
+    return (IMAGE_VERSION, __version__, tuple(sys.version_info[:2]), engine)
+
+
+class _Pickler(pickle.Pickler):
+    def __init__(self, file: io.BytesIO, env: dict[str, Value]) -> None:
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.env = env
+        self.singletons = {id(value): name for name, value in _SINGLETONS.items()}
+
+    def persistent_id(self, obj: Any) -> Optional[tuple[Any, ...]]:
+        if obj is self.env:
+            return ("globals",)
+        name = self.singletons.get(id(obj))
+        if name is not None:
+            return ("singleton", name)
+        if type(obj) is Builtin and obj.name:
+            return ("builtin", obj.name, obj.args)
+        if type(obj) is MemoCache:
+            return ("memo", obj.func, obj.maxsize)
+        if callable(obj) and not isinstance(obj, type):
+            # The compiled body of a closure
+            fn = _functionSources.get(obj)
+            if fn is not None:
+                return ("code", fn)
+        return None
+
+
+class _Unpickler(pickle.Unpickler):
+    def __init__(self, file: io.BytesIO, env: dict[str, Value]) -> None:
+        super().__init__(file)
+        self.env = env
+        # The builtins of ``env`` before the image's globals replace any
+        self.builtins = dict(env)
+        self.codes: dict[int, Any] = {}
+
+    def persistent_load(self, pid: Any) -> Any:
+        kind = pid[0]
+        if kind == "globals":
+            return self.env
+        if kind == "singleton":
+            return _SINGLETONS[pid[1]]
+        if kind == "builtin":
+            builtin = self.builtins[pid[1]]
+            if pid[2]:
+                builtin = Builtin(**{**vars(builtin), "args": pid[2]})
+            return builtin
+        if kind == "memo":
+            return lambMemoize(pid[1], pid[2], self.env).func
+        if kind == "code":
+            fn: ResolvedLambda = pid[1]
+            # One code per function, as self tail calls compare them
+            code = self.codes.get(id(fn))
+            if code is None:
+                code = self.codes[id(fn)] = _compileFunctionBody(fn)
+            return code
+        raise pickle.UnpicklingError(f"unknown persistent id {kind!r}")
+
+    def find_class(self, module: str, name: str) -> Any:
+        # Only the interpreter's own types
+        if module.startswith("lambdora.") or module == "builtins":
+            found = super().find_class(module, name)
+            if isinstance(found, type):
+                return found
+        raise pickle.UnpicklingError(f"unexpected object {module}.{name} in image")
@@ -0,0 +1,445 @@
+"""Translation of hot functions into Python source code.
+
+The tree evaluator runs a function body as a tree of nested Python closures
+(see ``evaluator.py``).  A function called often enough is instead written
+out as the source of a single Python function and compiled with
+``compile()``:
+
+* parameters and ``let`` bindings become Python local variables;
+* a self tail call (``SelfTailCall``) becomes another turn of a ``while``
+  loop;
+* integer builtins such as ``+`` and ``<`` become Python operators, with the
+  builtin itself called for arguments that are not integers, and any other
+  builtin given exactly its arity is called without ``applyFunc()``.
+
+Builtins are looked up when a function is translated.  Whenever a global has
+been rebound since, the generated code checks that each of them is still
+bound to the same builtin and, if not, runs the closure-compiled body.
+
+Only functions that create no closures, and bind no names with ``define`` or
+``letrec``, are translated: their frames are never seen by other code, so
+they need not exist.  Nor are bodies nested more than ``JIT_MAX_DEPTH``
+expressions deep, whose source Python could not compile.  The VM is not
+affected.
+
+``setJitMode()`` (``lambdora run --jit``) chooses when to translate:
+
+* ``auto``, the default, translates a function once it has been called
+  ``JIT_THRESHOLD`` times;
+* ``on`` translates each function on its first call;
+* ``off`` never translates.
+"""
+
+from __future__ import annotations
+
+import operator
+from itertools import count
+from typing import Any, Callable, Optional
+from weakref import WeakKeyDictionary
+
+from .astmodule import Application, Expr, IfExpr, Literal, QuoteExpr
+from .errors import EvalError, RecursionInitError
+from .evaluator import (
+    _GLOBALS_VERSION,
+    _REC_PLACEHOLDER,
+    _UNBOUND,
+    applyFunc,
+    trampoline,
+)
+from .options import JIT_MODES
+from .resolver import (
+    GlobalRef,
+    LocalRef,
+    ResolvedGlobalIs,
+    ResolvedLambda,
+    ResolvedLet,
+    SelfTailCall,
+)
+from .values import Builtin, Closure, Code, Env, TailCall, Value
+
+# Calls of a function before ``auto`` mode translates it
+JIT_THRESHOLD = 50
+# Deepest nesting of expressions in a translated body.  Each level adds up to
+# three levels of brackets to the source, which Python allows 200 of.
+JIT_MAX_DEPTH = 50
+
+_mode = "auto"
+
+# Python operators for the ``int_op`` of integer builtins
+_OPERATORS: dict[Callable[..., Any], str] = {
+    operator.add: "+",
+    operator.sub: "-",
+    operator.mul: "*",
+    operator.floordiv: "//",
+    operator.mod: "%",
+    operator.lt: "<",
+    operator.le: "<=",
+    operator.gt: ">",
+    operator.ge: ">=",
+    operator.eq: "==",
+    operator.ne: "!=",
+}
+
+
+def setJitMode(mode: str) -> None:
+    """Choose when functions compiled from now on are translated."""
+    global _mode
+    if mode not in JIT_MODES:
+        raise ValueError(f"unknown JIT mode: {mode}")
+    _mode = mode
+
+
+def jitMode() -> str:
+    return _mode
+
+
+class _Function:
+    """The translation of one ``ResolvedLambda``, once it has been made."""
+
+    def __init__(self, fn: ResolvedLambda, entry: Code, interpreted: Code) -> None:
+        self.fn = fn
+        # The code closures of ``fn`` hold, which runs ``impl``
+        self.entry = entry
+        self.interpreted = interpreted
+        self.source: Optional[str] = None
+        # Builtins the generated code uses directly, by name
+        self.assumed: dict[str, Builtin] = {}
+        # The globals they were checked in, and the version of the globals then
+        self.globals: Any = None
+        self.version = -1
+
+    def check(self, globals_: dict[str, Value]) -> bool:
+        """Whether the assumed builtins are still bound in ``globals_``."""
+        for name, builtin in self.assumed.items():
+            if globals_.get(name) is not builtin:
+                return False
+        self.globals = globals_
+        self.version = _GLOBALS_VERSION[0]
+        return True
+
+    def translate(self, globals_: dict[str, Value]) -> Code:
+        """Generate and compile the Python function."""
+        source, namespace = _Translator(self, globals_).function()
+        exec(
+            compile(source, f"<jit lambda {' '.join(self.fn.params)}>", "exec"),
+            namespace,
+        )
+        self.source = source
+        self.check(globals_)
+        code: Code = namespace["jitted"]
+        return code
+
+
+# The translation behind each entry code, for ``jitSource()``
+_functions: WeakKeyDictionary[Code, _Function] = WeakKeyDictionary()
+
+
+def lambJitFunction(
+    fn: ResolvedLambda, interpret: Callable[[ResolvedLambda, Optional[Code]], Code]
+) -> Code:
+    """The code run on a fresh frame of ``fn``, translated once it is hot.
+
+    ``interpret(fn, entry)`` compiles the body into nested closures whose self
+    tail calls look for ``entry``, the code closures of ``fn`` will hold.
+    """
+    if _mode == "off" or not _translatable(fn):
+        return interpret(fn, None)
+    impl: list[Code] = []
+
+    def entry(env: Env, is_tail: bool) -> Value:
+        return impl[0](env, is_tail)
+
+    function = _Function(fn, entry, interpret(fn, entry))
+    _functions[entry] = function
+    threshold = 1 if _mode == "on" else JIT_THRESHOLD
+    calls = 0
+
+    def counting(env: Env, is_tail: bool) -> Value:
+        nonlocal calls
+        calls += 1
+        if calls < threshold:
+            return function.interpreted(env, is_tail)
+        closure_env: Any = env[0]  # type: ignore[index]
+        globals_ = closure_env if type(closure_env) is not list else closure_env[0]
+        impl[0] = function.translate(globals_)
+        return impl[0](env, is_tail)
+
+    impl.append(counting)
+    return entry
+
+
+def jitSource(func: Value) -> Optional[str]:
+    """The Python source a closure's function was translated into, if it was."""
+    if type(func) is not Closure:
+        return None
+    function = _functions.get(func.code)  # type: ignore[arg-type]
+    return None if function is None else function.source
+
+
+def _translatable(fn: ResolvedLambda) -> bool:
+    """Whether ``_Translator`` can write the body of ``fn``."""
+    if fn.nlocals or fn.cells:
+        return False
+
+    def walk(node: Expr, depth: int) -> bool:
+        if depth > JIT_MAX_DEPTH:
+            return False
+        if isinstance(node, (Literal, QuoteExpr, LocalRef, GlobalRef)):
+            return True
+        if isinstance(node, ResolvedGlobalIs):
+            return True
+        depth += 1
+        if isinstance(node, IfExpr):
+            parts = [node.cond, node.then_branch, node.else_branch]
+        elif isinstance(node, (Application, SelfTailCall)):
+            parts = [node.func, *node.args]
+        elif isinstance(node, ResolvedLet):
+            if node.cells or node.nslots != len(node.values):
+                return False
+            parts = node.values + node.body
+        else:
+            # Closures, defines, letrec, quasiquote, defmacro and errors
+            return False
+        return all(walk(part, depth) for part in parts)
+
+    return walk(fn.body, 0)
+
+
+def _unbound(globals_: dict[str, Value], name: str) -> Value:
+    try:
+        # A library definition not evaluated yet
+        return globals_[name]
+    except KeyError:
+        raise EvalError(f"unbound variable: {name}") from None
+
+
+def _badCondition() -> Value:
+    raise EvalError("if condition must be boolean")
+
+
+def _checked(value: Value, name: str) -> Value:
+    if value is _REC_PLACEHOLDER:
+        raise RecursionInitError(
+            f"recursive binding '{name}' accessed before initialisation"
+        )
+    if value is _UNBOUND:
+        raise EvalError(f"unbound variable: {name}")
+    return value
+
+
+class _Translator:
+    """Writes the Python source for one function body."""
+
+    def __init__(self, function: _Function, globals_: dict[str, Value]) -> None:
+        self.function_ = function
+        self.globals = globals_
+        self.namespace: dict[str, Any] = {
+            "Closure": Closure,
+            "TailCall": TailCall,
+            "APPLY": applyFunc,
+            "FINISH": trampoline,
+            "MISSING": _UNBOUND,
+            "UNBOUND": _unbound,
+            "BAD_CONDITION": _badCondition,
+            "CHECKED": _checked,
+            "VERSION": _GLOBALS_VERSION,
+            "STATE": function,
+            "ENTRY": function.entry,
+            "INTERPRETED": function.interpreted,
+        }
+        self.consts: dict[int, str] = {}
+        self.temps = count()
+        self.lets = count()
+        # Slots of the closure environment read once per call
+        self.captured: dict[int, str] = {}
+
+    def function(self) -> tuple[str, dict[str, Any]]:
+        fn = self.function_.fn
+        params = {slot: f"a{slot}" for slot in range(1, len(fn.params) + 1)}
+        body = self.tail(fn.body, [params], 2)
+        lines = ["def jitted(env, is_tail):", "    C = env[0]"]
+        lines.append("    G = C if type(C) is not list else C[0]")
+        lines.append(f"    _, {', '.join(params.values())}, = env")
+        for slot, name in self.captured.items():
+            lines.append(f"    {name} = C[{slot}]")
+        lines.append("    while True:")
+        lines.append(
+            "        if VERSION[0] != STATE.version or G is not STATE.globals:"
+        )
+        lines.append("            if not STATE.check(G):")
+        lines.append(f"                env[1:] = [{', '.join(params.values())}]")
+        lines.append("                return INTERPRETED(env, is_tail)")
+        lines.extend(body)
+        lines += [
+            "def CALL(frame):",
+            "    f = frame[0]",
+            "    if type(f) is Closure and f.code is ENTRY and not f.args:",
+            "        frame[0] = f.env",
+            "        result = jitted(frame, True)",
+            "        return FINISH(result) if type(result) is TailCall else result",
+            "    return APPLY(f, frame[1:])",
+        ]
+        return "\n".join(lines) + "\n", self.namespace
+
+    def const(self, value: Any) -> str:
+        name = self.consts.get(id(value))
+        if name is None:
+            name = self.consts[id(value)] = f"k{len(self.consts)}"
+            self.namespace[name] = value
+        return name
+
+    def temp(self) -> str:
+        return f"t{next(self.temps)}"
+
+    # -- statements in tail position ---------------------------------------
+
+    def tail(self, node: Expr, frames: list[dict[int, str]], depth: int) -> list[str]:
+        pad = "    " * depth
+        if isinstance(node, IfExpr):
+            cond = self.temp()
+            lines = [f"{pad}if ({cond} := {self.expr(node.cond, frames)}) is True:"]
+            lines += self.tail(node.then_branch, frames, depth + 1)
+            lines.append(f"{pad}if {cond} is not False:")
+            lines.append(f"{pad}    BAD_CONDITION()")
+            return lines + self.tail(node.else_branch, frames, depth)
+        if isinstance(node, ResolvedLet):
+            inner, lines = self.bind(node, frames)
+            lines = [f"{pad}{line}" for line in lines]
+            for body in node.body[:-1]:
+                lines.append(f"{pad}{self.expr(body, inner)}")
+            return lines + self.tail(node.body[-1], inner, depth)
+        if isinstance(node, SelfTailCall):
+            func = self.temp()
+            temps = [self.temp() for _ in node.args]
+            args = ", ".join(self.expr(a, frames) for a in node.args)
+            params = ", ".join(frames[0].values())
+            return [
+                f"{pad}{func} = {self.expr(node.func, frames)}",
+                f"{pad}{', '.join(temps)}, = {args},",
+                f"{pad}if (type({func}) is Closure and {func}.code is ENTRY"
+                f" and {func}.env is C and not {func}.args):",
+                f"{pad}    {params}, = {', '.join(temps)},",
+                f"{pad}    continue",
+                f"{pad}return TailCall({func}, [{', '.join(temps)}])",
+            ]
+        if isinstance(node, Application):
+            direct = self.builtinCall(node, frames)
+            if direct is not None:
+                return [f"{pad}return {direct}"]
+            args_src = ", ".join(self.expr(a, frames) for a in node.args)
+            return [
+                f"{pad}return TailCall({self.expr(node.func, frames)}, [{args_src}])"
+            ]
+        return [f"{pad}return {self.expr(node, frames)}"]
+
+    def bind(
+        self, node: ResolvedLet, frames: list[dict[int, str]]
+    ) -> tuple[list[dict[int, str]], list[str]]:
+        """The frames inside a ``let``, and assignments of its values."""
+        uid = next(self.lets)
+        names = {slot: f"l{uid}_{slot}" for slot in range(1, len(node.values) + 1)}
+        lines = [
+            f"{names[slot]} = {self.expr(value, frames)}"
+            for slot, value in enumerate(node.values, start=1)
+        ]
+        return [names, *frames], lines
+
+    # -- expressions -------------------------------------------------------
+
+    def expr(self, node: Expr, frames: list[dict[int, str]]) -> str:
+        if isinstance(node, Literal):
+            if type(node.const) in (int, bool):
+                return repr(node.const)
+            return self.const(node.const)
+        if isinstance(node, QuoteExpr):
+            return self.const(node.value)
+        if isinstance(node, LocalRef):
+            return self.local(node, frames)
+        if isinstance(node, GlobalRef):
+            value = self.temp()
+            name = repr(node.name)
+            return (
+                f"({value} if ({value} := G.get({name}, MISSING)) is not MISSING"
+                f" else UNBOUND(G, {name}))"
+            )
+        if isinstance(node, ResolvedGlobalIs):
+            return f"(G.get({node.name!r}) is {self.const(node.value)})"
+        if isinstance(node, IfExpr):
+            cond = self.temp()
+            return (
+                f"({self.expr(node.then_branch, frames)}"
+                f" if ({cond} := {self.expr(node.cond, frames)}) is True"
+                f" else {self.expr(node.else_branch, frames)} if {cond} is False"
+                " else BAD_CONDITION())"
+            )
+        if isinstance(node, ResolvedLet):
+            inner, lines = self.bind(node, frames)
+            parts = [f"({line.replace(' = ', ' := ', 1)})" for line in lines]
+            parts += [self.expr(b, inner) for b in node.body]
+            return f"({', '.join(parts)})[-1]"
+        if isinstance(node, (Application, SelfTailCall)):
+            return self.call(node.func, node.args, frames)
+        # ``_translatable()`` admits only the nodes above
+        raise AssertionError(type(node).__name__)  # pragma: no cover
+
+    def local(self, ref: LocalRef, frames: list[dict[int, str]]) -> str:
+        if ref.depth < len(frames):
+            return frames[ref.depth][ref.slot]
+        # The closure environment
+        if not ref.cell:
+            name = self.captured.get(ref.slot)
+            if name is None:
+                name = self.captured[ref.slot] = f"c{ref.slot}"
+            return name
+        if ref.checked:
+            return f"CHECKED(C[{ref.slot}][0], {ref.name!r})"
+        return f"C[{ref.slot}][0]"
+
+    def builtinCall(
+        self, node: Application, frames: list[dict[int, str]]
+    ) -> Optional[str]:
+        """A call of a global builtin, made without ``applyFunc()``."""
+        if not isinstance(node.func, GlobalRef):
+            return None
+        name = node.func.name
+        builtin = self.globals.get(name)
+        if not (
+            type(builtin) is Builtin
+            and not builtin.args
+            and builtin.arity == len(node.args)
+        ):
+            return None
+        self.function_.assumed[name] = builtin
+        func = self.const(builtin.func)
+        args = [self.expr(a, frames) for a in node.args]
+        symbol = _OPERATORS.get(builtin.int_op)  # type: ignore[arg-type]
+        if symbol is None:
+            return f"{func}({', '.join(args)})"
+        # Integer literals need no type check
+        operands, checks = [], []
+        for arg, src in zip(node.args, args):
+            if isinstance(arg, Literal) and type(arg.const) is int:
+                operands.append(src)
+            else:
+                operand = self.temp()
+                operands.append(operand)
+                checks.append(f"type({operand} := {src})")
+        x, y = operands
+        if not checks:
+            return f"{func}({x}, {y})"
+        # Chained so that both operands are evaluated before either is checked
+        check = " is ".join(checks)
+        return f"({x} {symbol} {y} if {check} is int else {func}({x}, {y}))"
+
+    def call(self, func: Expr, args: list[Expr], frames: list[dict[int, str]]) -> str:
+        direct = self.builtinCall(Application(func, args), frames)
+        if direct is not None:
+            return direct
+        func_src = self.expr(func, frames)
+        args_src = ", ".join(self.expr(a, frames) for a in args)
+        if isinstance(func, (GlobalRef, LocalRef)) and len(args) == len(
+            self.function_.fn.params
+        ):
+            # A call that may be recursive runs the translated body directly
+            return f"CALL([{func_src}, {args_src}])"
+        return f"APPLY({func_src}, [{args_src}])"
@@ -0,0 +1,214 @@
+"""On-disk cache of macro-expanded programs, in ``__lambcache__`` directories.
+
+Loading a file tokenizes, parses and macro-expands each of its forms.
+``lambCachedForms()`` also saves the expanded forms of a file it read through
+to the end, marshalled, in ``__lambcache__/<name>.lambc`` beside it, and
+returns those next time instead of doing the work again.
+
+A cache file records what its forms depend on: a hash of the source, the
+modification times and sizes of Lambdora's own modules, the Python version,
+and the macros defined before the file was loaded.  If any of them differs
+the file is ignored and rewritten.  Files that define macros other than at
+top level are not cached, as are files whose forms are nested too deeply to
+marshal.  The optimizer still runs on each form as it is loaded, since its
+rewrites depend on the values of globals.
+
+Setting ``LAMBDORA_NO_CACHE`` in the environment turns the cache off.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import marshal
+import os
+import sys
+from dataclasses import fields
+from pathlib import Path
+from typing import Any, Iterator, Optional
+
+from .astmodule import (
+    Abstraction,
+    Application,
+    DefineExpr,
+    DefMacroExpr,
+    Expr,
+    IfExpr,
+    LetExpr,
+    LetRec,
+    Literal,
+    QuasiQuoteExpr,
+    QuoteExpr,
+    UnquoteExpr,
+    Variable,
+)
+from .macro import lambMacroExpand
+from .parser import lambParseAll
+from .tokenizer import lambTokenize
+from .values import Macro, Pair, Value, nil
+
+CACHE_DIR = "__lambcache__"
+
+# Bumped whenever the encoding below changes
+FORMAT_VERSION = 1
+
+# ``_packageStamp()``, worked out on first use
+_PACKAGE_STAMP: list[tuple[str, int, int]] = []
+
+# Node types by the tag that encodes them
+_NODES: tuple[type[Expr], ...] = (
+    Variable,
+    Literal,
+    Abstraction,
+    Application,
+    DefineExpr,
+    IfExpr,
+    LetExpr,
+    DefMacroExpr,
+    QuoteExpr,
+    QuasiQuoteExpr,
+    UnquoteExpr,
+    LetRec,
+)
+_TAGS = {node: tag for tag, node in enumerate(_NODES)}
+_FIELDS = [[f.name for f in fields(node)] for node in _NODES]
+
+# Tags of the other values forms can hold
+_TUPLE, _PAIR, _NIL = -1, -2, -3
+
+
+def cachePath(path: Path) -> Path:
+    """Where the expanded forms of the file at ``path`` are cached."""
+    return path.parent / CACHE_DIR / f"{path.name}c"
+
+
+def lambCachedForms(path: Path, text: str, env: dict[str, Value]) -> Iterator[Expr]:
+    """The macro-expanded top-level forms of ``text``, read from ``path``.
+
+    Forms are expanded one at a time as they are asked for, so a macro that
+    an earlier form defines is used by the later ones; the ``defmacro`` forms
+    themselves define their macros in ``env`` and are not returned.
+    """
+    enabled = not os.environ.get("LAMBDORA_NO_CACHE")
+    if enabled:
+        key = _key(text, env)
+        cached = _read(path, key)
+        if cached is not None:
+            for form in cached:
+                if isinstance(form, DefMacroExpr):
+                    lambMacroExpand(form, env)
+                else:
+                    yield form
+            return
+    tokens = lambTokenize(text)
+    forms = lambParseAll(tokens)
+    # A nested defmacro defines its macro only while its form is expanded
+    enabled = enabled and tokens.count("defmacro") == sum(
+        isinstance(form, DefMacroExpr) for form in forms
+    )
+    recorded: list[Expr] = []
+    for form in forms:
+        expanded = lambMacroExpand(form, env)
+        if expanded is None:
+            recorded.append(form)
+        else:
+            recorded.append(expanded)
+            yield expanded
+    if enabled:
+        _write(path, key, recorded)
+
+
+def _key(text: str, env: dict[str, Value]) -> tuple[Any, ...]:
+    """What the expansion of ``text`` in ``env`` depends on."""
+    macros = sorted(
+        (name, tuple(value.params), _encode(value.body))
+        for name, value in env.items()
+        if type(value) is Macro
+    )
+    return (
+        FORMAT_VERSION,
+        _packageStamp(),
+        tuple(sys.version_info[:2]),
+        hashlib.sha256(text.encode("utf-8")).hexdigest(),
+        hashlib.sha256(marshal.dumps(macros)).hexdigest(),
+    )
+
+
+def _packageStamp() -> tuple[tuple[str, int, int], ...]:
+    """When and how the interpreter changed, cheaper to read than its version.
+
+    The installed version comes from ``importlib.metadata``, which is slow to
+    import, and stays the same while an editable install is being worked on.
+    """
+    if not _PACKAGE_STAMP:
+        package = Path(__file__).parent
+        _PACKAGE_STAMP.extend(
+            (entry.name, entry.stat().st_mtime_ns, entry.stat().st_size)
+            for entry in sorted(os.scandir(package), key=lambda e: e.name)
+            if entry.name.endswith(".py")
+        )
+    return tuple(_PACKAGE_STAMP)
+
+
+def _read(path: Path, key: tuple[Any, ...]) -> Optional[list[Expr]]:
+    """The forms cached for ``path`` under ``key``, if there are any."""
+    try:
+        data = cachePath(path).read_bytes()
+    except OSError:
+        return None
+    try:
+        stored_key, forms = marshal.loads(data)
+        if stored_key != key:
+            return None
+        return [_decode(form) for form in forms]
+    except Exception:
+        # Truncated or otherwise unreadable: expanded again and rewritten
+        return None
+
+
+def _write(path: Path, key: tuple[Any, ...], forms: list[Expr]) -> None:
+    cache = cachePath(path)
+    try:
+        data = marshal.dumps((key, [_encode(form) for form in forms]))
+    except (ValueError, RecursionError):
+        # Nested too deeply
+        return
+    # Written beside the final name first, so readers never see part of it
+    temp = cache.with_name(f"{cache.name}.{os.getpid()}.tmp")
+    try:
+        cache.parent.mkdir(exist_ok=True)
+        temp.write_bytes(data)
+        os.replace(temp, cache)
+    except OSError:
+        temp.unlink(missing_ok=True)
+
+
+def _encode(value: Any) -> Any:
+    """``value`` as nested tuples, lists and constants that marshal accepts."""
+    kind = type(value)
+    if kind is str or kind is int or kind is bool or value is None:
+        return value
+    if kind is list:
+        return [_encode(item) for item in value]
+    if kind is tuple:
+        return (_TUPLE, *map(_encode, value))
+    if kind is Pair:
+        return (_PAIR, _encode(value.head), _encode(value.tail))
+    if value is nil:
+        return (_NIL,)
+    tag = _TAGS[kind]
+    return (tag, *[_encode(getattr(value, f)) for f in _FIELDS[tag]])
+
+
+def _decode(data: Any) -> Any:
+    if type(data) is list:
+        return [_decode(item) for item in data]
+    if type(data) is not tuple:
+        return data
+    tag = data[0]
+    if tag == _TUPLE:
+        return tuple(map(_decode, data[1:]))
+    if tag == _PAIR:
+        return Pair(_decode(data[1]), _decode(data[2]))
+    if tag == _NIL:
+        return nil
+    return _NODES[tag](*map(_decode, data[1:]))
@@ -0,0 +1,56 @@
+"""Library definitions evaluated when their names are first looked up.
+
+Loading a library evaluates its forms in order.  ``lambLoadLazily()`` instead
+keeps each definition of a function aside in the ``Globals`` it loads into,
+under the name it defines, and evaluates it when a lookup finds that name
+unbound.  The globals the function refers to are looked up, and so loaded in
+turn, when it runs.  A program pays for the part of the library it uses, not
+for the whole of it.
+
+Only definitions whose evaluation reads no global are deferred: a lambda, or
+a ``letrec`` of lambdas returning one of them.  Evaluating such a definition
+later gives the value it would have had in order.  Other forms, and
+definitions of names already bound, are evaluated as they are read.
+"""
+
+from functools import partial
+from typing import Callable, Iterable
+
+from .astmodule import Abstraction, DefineExpr, Expr, LetRec, Variable
+from .values import Globals, Value
+
+
+def lambLoadLazily(
+    forms: Iterable[Expr],
+    env: dict[str, Value],
+    evaluate: Callable[[Expr], object],
+) -> None:
+    """Evaluate ``forms`` with ``evaluate``, deferring function definitions.
+
+    Nothing is deferred unless ``env`` is a ``Globals``.
+    """
+    for form in forms:
+        if (
+            isinstance(env, Globals)
+            and isinstance(form, DefineExpr)
+            and form.name not in env
+            and _readsNoGlobals(form.value)
+        ):
+            # A later definition of the name replaces an earlier one
+            env.pending[form.name] = partial(evaluate, form)
+        else:
+            evaluate(form)
+
+
+def _readsNoGlobals(expr: Expr) -> bool:
+    """Whether evaluating ``expr`` only makes closures."""
+    if isinstance(expr, Abstraction):
+        return True
+    if isinstance(expr, LetRec) and len(expr.body) == 1:
+        result = expr.body[0]
+        return (
+            all(isinstance(value, Abstraction) for _, value in expr.bindings)
+            and isinstance(result, Variable)
+            and any(name == result.name for name, _ in expr.bindings)
+        )
+    return False
@@ -13,68 +13,125 @@ from .astmodule import (
     UnquoteExpr,
     Variable,
 )
+from .dispatch import TypeDispatch
 from .errors import MacroExpansionError
+from .evaluator import _storeGlobal
 from .values import Macro, Value
 
 
-def _qq_sub(tmpl: Expr, mapping: dict[str, Expr]) -> Expr:
-    if isinstance(tmpl, UnquoteExpr):
-        return UnquoteExpr(lambMacroSubstitute(tmpl.expr, mapping))
-    if isinstance(tmpl, Application):
-        return Application(
-            _qq_sub(tmpl.func, mapping), [_qq_sub(a, mapping) for a in tmpl.args]
-        )
-    if isinstance(tmpl, Abstraction):
-        return Abstraction(tmpl.param, _qq_sub(tmpl.body, mapping))
-    if isinstance(tmpl, IfExpr):
-        return IfExpr(
-            _qq_sub(tmpl.cond, mapping),
-            _qq_sub(tmpl.then_branch, mapping),
-            _qq_sub(tmpl.else_branch, mapping),
-        )
-    # literals, vars, nested quasi-quotes stay untouched
-    if isinstance(tmpl, QuasiQuoteExpr):
-        return QuasiQuoteExpr(_qq_sub(tmpl.expr, mapping))
-    return tmpl
+def _unchanged(expr: Expr, *args: object) -> Expr:
+    return expr
+
+
+# literals, vars, nested quotes stay untouched
+_qq_sub: TypeDispatch[Expr] = TypeDispatch(_unchanged)
+
+
+@_qq_sub.register(UnquoteExpr)
+def _qqSubUnquote(tmpl: UnquoteExpr, mapping: dict[str, Expr]) -> Expr:
+    return UnquoteExpr(lambMacroSubstitute(tmpl.expr, mapping))
+
+
+@_qq_sub.register(Application)
+def _qqSubApplication(tmpl: Application, mapping: dict[str, Expr]) -> Expr:
+    return Application(
+        _qq_sub(tmpl.func, mapping), [_qq_sub(a, mapping) for a in tmpl.args]
+    )
+
+
+@_qq_sub.register(Abstraction)
+def _qqSubAbstraction(tmpl: Abstraction, mapping: dict[str, Expr]) -> Expr:
+    return Abstraction(tmpl.param, _qq_sub(tmpl.body, mapping), tmpl.rest_params)
+
+
+@_qq_sub.register(IfExpr)
+def _qqSubIf(tmpl: IfExpr, mapping: dict[str, Expr]) -> Expr:
+    return IfExpr(
+        _qq_sub(tmpl.cond, mapping),
+        _qq_sub(tmpl.then_branch, mapping),
+        _qq_sub(tmpl.else_branch, mapping),
+    )
+
+
+@_qq_sub.register(QuasiQuoteExpr)
+def _qqSubQuasiquote(tmpl: QuasiQuoteExpr, mapping: dict[str, Expr]) -> Expr:
+    return QuasiQuoteExpr(_qq_sub(tmpl.expr, mapping))
+
+
+_substitute: TypeDispatch[Expr] = TypeDispatch(_unchanged)
 
 
 def lambMacroSubstitute(expr: Expr, mapping: dict[str, Expr]) -> Expr:
-    if isinstance(expr, Variable):
-        return mapping.get(expr.name, expr)
-
-    if isinstance(expr, QuasiQuoteExpr):
-        return QuasiQuoteExpr(_qq_sub(expr.expr, mapping))
-
-    if isinstance(expr, UnquoteExpr):  # (still useful if ever top-level)
-        return UnquoteExpr(lambMacroSubstitute(expr.expr, mapping))
-
-    if isinstance(expr, Application):
-        return Application(
-            lambMacroSubstitute(expr.func, mapping),
-            [lambMacroSubstitute(a, mapping) for a in expr.args],
-        )
-    if isinstance(expr, Abstraction):
-        return Abstraction(expr.param, lambMacroSubstitute(expr.body, mapping))
-    if isinstance(expr, IfExpr):
-        return IfExpr(
-            lambMacroSubstitute(expr.cond, mapping),
-            lambMacroSubstitute(expr.then_branch, mapping),
-            lambMacroSubstitute(expr.else_branch, mapping),
-        )
-    if isinstance(expr, DefineExpr):
-        return DefineExpr(expr.name, lambMacroSubstitute(expr.value, mapping))
-    if isinstance(expr, DefMacroExpr):
-        return DefMacroExpr(
-            expr.name, expr.params, lambMacroSubstitute(expr.body, mapping)
-        )
-    return expr
+    return _substitute[type(expr)](expr, mapping)
+
+
+@_substitute.register(Variable)
+def _substituteVariable(expr: Variable, mapping: dict[str, Expr]) -> Expr:
+    return mapping.get(expr.name, expr)
+
+
+@_substitute.register(QuasiQuoteExpr)
+def _substituteQuasiquote(expr: QuasiQuoteExpr, mapping: dict[str, Expr]) -> Expr:
+    return QuasiQuoteExpr(_qq_sub(expr.expr, mapping))
+
+
+@_substitute.register(UnquoteExpr)
+def _substituteUnquote(expr: UnquoteExpr, mapping: dict[str, Expr]) -> Expr:
+    # (still useful if ever top-level)
+    return UnquoteExpr(lambMacroSubstitute(expr.expr, mapping))
+
+
+@_substitute.register(Application)
+def _substituteApplication(expr: Application, mapping: dict[str, Expr]) -> Expr:
+    return Application(
+        lambMacroSubstitute(expr.func, mapping),
+        [lambMacroSubstitute(a, mapping) for a in expr.args],
+    )
+
+
+@_substitute.register(Abstraction)
+def _substituteAbstraction(expr: Abstraction, mapping: dict[str, Expr]) -> Expr:
+    return Abstraction(
+        expr.param, lambMacroSubstitute(expr.body, mapping), expr.rest_params
+    )
+
+
+@_substitute.register(IfExpr)
+def _substituteIf(expr: IfExpr, mapping: dict[str, Expr]) -> Expr:
+    return IfExpr(
+        lambMacroSubstitute(expr.cond, mapping),
+        lambMacroSubstitute(expr.then_branch, mapping),
+        lambMacroSubstitute(expr.else_branch, mapping),
+    )
+
+
+@_substitute.register(DefineExpr)
+def _substituteDefine(expr: DefineExpr, mapping: dict[str, Expr]) -> Expr:
+    return DefineExpr(expr.name, lambMacroSubstitute(expr.value, mapping))
+
+
+@_substitute.register(DefMacroExpr)
+def _substituteDefMacro(expr: DefMacroExpr, mapping: dict[str, Expr]) -> Expr:
+    return DefMacroExpr(expr.name, expr.params, lambMacroSubstitute(expr.body, mapping))
+
+
+_expand: TypeDispatch[Optional[Expr]] = TypeDispatch(_unchanged)
 
 
 def lambMacroExpand(expr: Expr, env: Dict[str, Value]) -> Optional[Expr]:
     """Expand macros in ``expr`` using definitions stored in ``env``."""
+    return _expand[type(expr)](expr, env)
 
+
+def _expandChild(expr: Expr, env: Dict[str, Value]) -> Expr:
+    expanded = lambMacroExpand(expr, env)
+    return expr if expanded is None else expanded
+
+
+@_expand.register(Application)
+def _expandApplication(expr: Application, env: Dict[str, Value]) -> Optional[Expr]:
     # Expand application
-    if isinstance(expr, Application) and isinstance(expr.func, Variable):
+    if isinstance(expr.func, Variable):
         macro = env.get(expr.func.name)
         if isinstance(macro, Macro):
             args = expr.args
@@ -87,66 +144,76 @@ def lambMacroExpand(expr: Expr, env: Dict[str, Value]) -> Optional[Expr]:
             expanded = lambMacroSubstitute(macro.body, mapping)
             return lambMacroExpand(expanded, env)
     # Recursively expand children
-    if isinstance(expr, Application):
-        new_func = lambMacroExpand(expr.func, env)
-        if new_func is None:
-            new_func = expr.func
-        new_args = []
-        for arg in expr.args:
-            ea = lambMacroExpand(arg, env)
-            new_args.append(ea if ea is not None else arg)
-        return Application(new_func, new_args)
-    if isinstance(expr, Abstraction):
-        new_body = lambMacroExpand(expr.body, env)
-        if new_body is None:
-            new_body = expr.body
-        return Abstraction(expr.param, new_body)
-    if isinstance(expr, DefineExpr):
-        new_value = lambMacroExpand(expr.value, env)
-        if new_value is None:
-            new_value = expr.value
-        return DefineExpr(expr.name, new_value)
-    if isinstance(expr, IfExpr):
-        new_cond = lambMacroExpand(expr.cond, env)
-        if new_cond is None:
-            new_cond = expr.cond
-        new_then = lambMacroExpand(expr.then_branch, env)
-        if new_then is None:
-            new_then = expr.then_branch
-        new_else = lambMacroExpand(expr.else_branch, env)
-        if new_else is None:
-            new_else = expr.else_branch
-        return IfExpr(new_cond, new_then, new_else)
+    return Application(
+        _expandChild(expr.func, env), [_expandChild(arg, env) for arg in expr.args]
+    )
+
+
+@_expand.register(Abstraction)
+def _expandAbstraction(expr: Abstraction, env: Dict[str, Value]) -> Optional[Expr]:
+    return Abstraction(expr.param, _expandChild(expr.body, env), expr.rest_params)
+
+
+@_expand.register(DefineExpr)
+def _expandDefine(expr: DefineExpr, env: Dict[str, Value]) -> Optional[Expr]:
+    return DefineExpr(expr.name, _expandChild(expr.value, env))
+
+
+@_expand.register(IfExpr)
+def _expandIf(expr: IfExpr, env: Dict[str, Value]) -> Optional[Expr]:
+    return IfExpr(
+        _expandChild(expr.cond, env),
+        _expandChild(expr.then_branch, env),
+        _expandChild(expr.else_branch, env),
+    )
+
+
+@_expand.register(QuasiQuoteExpr)
+def _expandQuasiquote(expr: QuasiQuoteExpr, env: Dict[str, Value]) -> Optional[Expr]:
     # Handle quasiquote that results from macro expansion
-    if isinstance(expr, QuasiQuoteExpr):
-        return qqWalk(expr.expr, env)
+    return qqWalk(expr.expr, env)
 
+
+@_expand.register(DefMacroExpr)
+def _expandDefMacro(expr: DefMacroExpr, env: Dict[str, Value]) -> Optional[Expr]:
     # Handle macro definition
-    if isinstance(expr, DefMacroExpr):
-        macro = Macro(expr.params, expr.body)
-        env[expr.name] = macro
-        return None
+    _storeGlobal(env, expr.name, Macro(expr.params, expr.body))
+    return None
 
-    return expr
+
+_qqWalk: TypeDispatch[Expr] = TypeDispatch(_unchanged)
 
 
 def qqWalk(expr: Expr, env: Dict[str, Value]) -> Expr:
     """Process a QuasiQuoteExpr template, splicing the result of any UnquoteExprs."""
-    if isinstance(expr, UnquoteExpr):
-        expanded = lambMacroExpand(expr.expr, env)
-        return expanded if expanded is not None else expr.expr
-
-    # Recurse structurally
-    if isinstance(expr, Application):
-        return Application(qqWalk(expr.func, env), [qqWalk(a, env) for a in expr.args])
-    if isinstance(expr, Abstraction):
-        return Abstraction(expr.param, qqWalk(expr.body, env))
-    if isinstance(expr, IfExpr):
-        return IfExpr(
-            qqWalk(expr.cond, env),
-            qqWalk(expr.then_branch, env),
-            qqWalk(expr.else_branch, env),
-        )
-    if isinstance(expr, QuasiQuoteExpr):
-        return QuasiQuoteExpr(qqWalk(expr.expr, env))
-    return expr
+    return _qqWalk[type(expr)](expr, env)
+
+
+@_qqWalk.register(UnquoteExpr)
+def _qqWalkUnquote(expr: UnquoteExpr, env: Dict[str, Value]) -> Expr:
+    return _expandChild(expr.expr, env)
+
+
+# Recurse structurally
+@_qqWalk.register(Application)
+def _qqWalkApplication(expr: Application, env: Dict[str, Value]) -> Expr:
+    return Application(qqWalk(expr.func, env), [qqWalk(a, env) for a in expr.args])
+
+
+@_qqWalk.register(Abstraction)
+def _qqWalkAbstraction(expr: Abstraction, env: Dict[str, Value]) -> Expr:
+    return Abstraction(expr.param, qqWalk(expr.body, env), expr.rest_params)
+
+
+@_qqWalk.register(IfExpr)
+def _qqWalkIf(expr: IfExpr, env: Dict[str, Value]) -> Expr:
+    return IfExpr(
+        qqWalk(expr.cond, env),
+        qqWalk(expr.then_branch, env),
+        qqWalk(expr.else_branch, env),
+    )
+
+
+@_qqWalk.register(QuasiQuoteExpr)
+def _qqWalkQuasiquote(expr: QuasiQuoteExpr, env: Dict[str, Value]) -> Expr:
+    return QuasiQuoteExpr(qqWalk(expr.expr, env))
@@ -0,0 +1,150 @@
+"""Memoized functions, made by the ``memoize`` builtins.
+
+``(memoize f)`` returns a function that remembers the results of ``f`` for the
+``DEFAULT_MAXSIZE`` most recently used argument lists, evicting the least
+recently used one first.  ``(memoizeWith n f)`` keeps ``n`` instead.  Arguments
+are compared by value when they are integers, strings, booleans, ``nil`` or
+lists of those; a call passing anything else, such as a function, runs ``f``
+without using the cache.  ``(memoStats m)`` returns ``(hits misses size
+maxsize)`` for a memoized function ``m``.
+
+``(defmemo name f)``, lowered to ``(define name (memoize f))``, defines a
+memoized function whose recursive calls go through the cache::
+
+    (defmemo fib (lambda n. (if (< n 2) n (+ (fib (- n 1)) (fib (- n 2))))))
+
+A cache belongs to the function ``memoize`` returned, and each global
+environment has ``memoize`` builtins of its own, so nothing is shared between
+interpreters.  A call that misses the cache runs ``f`` in a nested evaluation
+on the engine that created it, so memoized recursion uses Python stack on the
+VM too.
+"""
+
+from __future__ import annotations
+
+from collections import OrderedDict
+from typing import Callable, Hashable, Optional
+
+from .errors import BuiltinError
+from .evaluator import applyFunc, trampoline
+from .values import Builtin, Closure, Pair, Value, nil
+
+# Argument lists a memoized function remembers unless told otherwise
+DEFAULT_MAXSIZE = 1024
+
+
+class MemoCache:
+    """The results of one memoized function, least recently used first.
+
+    Instances are the ``func`` of the ``Builtin`` that ``lambMemoize()``
+    returns, and are called with its arguments.
+    """
+
+    def __init__(
+        self,
+        func: Value,
+        maxsize: int,
+        call: Callable[[Value, list[Value]], Value],
+    ) -> None:
+        self.func = func
+        self.maxsize = maxsize
+        # Runs ``func`` on a cache miss
+        self.call = call
+        self.results: OrderedDict[Hashable, Value] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __call__(self, *args: Value) -> Value:
+        key = _key(args[0]) if len(args) == 1 else _argsKey(args)
+        if key is None:
+            self.misses += 1
+            return self.call(self.func, list(args))
+        results = self.results
+        if key in results:
+            self.hits += 1
+            results.move_to_end(key)
+            return results[key]
+        self.misses += 1
+        value = self.call(self.func, list(args))
+        results[key] = value
+        if len(results) > self.maxsize:
+            results.popitem(last=False)
+        return value
+
+
+def lambMemoize(func: Value, maxsize: int, env: dict[str, Value]) -> Builtin:
+    """Wrap ``func`` in a cache of ``maxsize`` results.
+
+    ``env`` is the global environment, which a closure made by the VM runs in.
+    """
+    if type(func) is Closure:
+        arity = func.arity
+    elif type(func) is Builtin:
+        arity = func.arity - len(func.args)
+    else:
+        raise BuiltinError("memoize expects a function")
+    if maxsize < 1:
+        raise BuiltinError("memoize size must be positive")
+    # Not imported before a program memoizes something, so ``lambdora run``
+    # on the tree engine never loads the VM
+    from .vm import CodeObject, vmApply
+
+    if type(func) is Closure and isinstance(func.code, CodeObject):
+
+        def call(func: Value, args: list[Value]) -> Value:
+            return vmApply(func, args, env)
+
+    else:
+
+        def call(func: Value, args: list[Value]) -> Value:
+            return trampoline(applyFunc(func, args))
+
+    return Builtin(MemoCache(func, maxsize, call), arity)
+
+
+def memoStats(func: Value) -> Value:
+    """``(hits misses size maxsize)`` for a function made by ``memoize``."""
+    cache = func.func if type(func) is Builtin else None
+    if not isinstance(cache, MemoCache):
+        raise BuiltinError("memoStats expects a memoized function")
+    stats: Value = nil
+    for count in reversed(
+        (cache.hits, cache.misses, len(cache.results), cache.maxsize)
+    ):
+        stats = Pair(count, stats)
+    return stats
+
+
+def _key(value: Value) -> Optional[Hashable]:
+    """A dictionary key equal for equal values, or ``None`` if not cacheable."""
+    kind = type(value)
+    if kind is int or kind is str:
+        return value
+    if kind is bool:
+        # Kept apart from 0 and 1
+        return (bool, value)
+    if value is nil:
+        return nil
+    if kind is Pair:
+        items = []
+        while type(value) is Pair:
+            item = _key(value.head)
+            if item is None:
+                return None
+            items.append(item)
+            value = value.tail
+        rest = _key(value)
+        if rest is None:
+            return None
+        return (Pair, tuple(items), rest)
+    return None
+
+
+def _argsKey(args: tuple[Value, ...]) -> Optional[Hashable]:
+    keys = []
+    for arg in args:
+        key = _key(arg)
+        if key is None:
+            return None
+        keys.append(key)
+    return tuple(keys)
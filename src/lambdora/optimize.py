@@ -0,0 +1,475 @@
+"""Optional rewrites of expanded expressions before they are evaluated.
+
+``lambOptimize()`` runs after macro expansion.  It lowers the expression (see
+``parser.lambLower()``) and simplifies it according to an optimization level:
+
+* ``0`` leaves the expression as it is.
+* ``1`` folds calls of pure builtins on constants, such as ``(+ 1 2)`` or
+  ``(not true)``, and drops the branch of an ``if`` whose condition is a
+  constant.  Macros like ``when``, ``unless`` and ``cond`` produce many of
+  those.
+* ``2`` also eta-reduces wrappers of local functions: in the body of
+  ``(letrec ((go (lambda a b. ...))) ...)``, ``(lambda a b. (go a b))``
+  becomes ``go``.  Calls of small, non-recursive global functions such as
+  ``double`` or ``isZero`` are inlined: ``(double n)`` becomes ``(if <double
+  unchanged> (+ n n) (double n))``.  The guard is a ``GlobalIs`` node, so
+  redefining ``double`` later, say in the REPL, sends the call back to the new
+  definition.
+
+Folding uses what the global environment holds when the expression is
+optimized, and names bound by an enclosing scope are never touched.  Code that
+rebinds a builtin after code using it has been loaded should run at level 0.
+"""
+
+from __future__ import annotations
+
+from collections import Counter
+from itertools import count
+from typing import Iterable, Optional, Union
+
+from .astmodule import (
+    Abstraction,
+    Application,
+    DefineExpr,
+    Expr,
+    GlobalIs,
+    IfExpr,
+    LetExpr,
+    LetRec,
+    Literal,
+    QuoteExpr,
+    Variable,
+)
+from .dispatch import TypeDispatch
+from .evaluator import _callBuiltin
+from .parser import lambLower
+from .resolver import _scope_defines
+from .values import Builtin, Closure, Globals, Value
+
+# Names of the rewrites counted in the statistics
+CONSTANT_FOLD = "constant folds"
+DEAD_BRANCH = "dead branches"
+ETA_REDUCTION = "eta reductions"
+INLINED = "inlined calls"
+
+# Largest function body, in nodes, that is inlined into its callers
+INLINE_MAX_SIZE = 12
+# Most nodes that inlining may add to one top-level expression
+INLINE_BUDGET = 120
+# How deep calls inside inlined bodies are themselves inlined
+INLINE_MAX_DEPTH = 3
+
+
+class _Pass:
+    """What one run of the optimizer over a top-level expression shares."""
+
+    def __init__(self, env: dict[str, Value], level: int, stats: Counter[str]) -> None:
+        self.env = env
+        self.level = level
+        self.stats = stats
+        # Nodes inlining may still add to the expression
+        self.budget = INLINE_BUDGET
+
+
+class _Context:
+    """What the optimizer knows at one point of an expression."""
+
+    def __init__(
+        self,
+        run: _Pass,
+        bound: frozenset[str],
+        safe: frozenset[str] = frozenset(),
+        depth: int = 0,
+        functions: Optional[dict[str, int]] = None,
+    ) -> None:
+        self.run = run
+        self.env = run.env
+        self.level = run.level
+        self.stats = run.stats
+        # Names bound by enclosing scopes, which hide the globals, and those
+        # the top-level expression defines
+        self.bound = bound
+        # Local names that always hold the same value once bound: parameters
+        # and ``let`` names that no ``define`` in their scope changes
+        self.safe = safe
+        # Inlined bodies being optimized around this point
+        self.depth = depth
+        # Local names an enclosing ``letrec`` binds to a lambda, which nothing
+        # rebinds, with the number of parameters of each
+        self.functions = functions or {}
+
+    def inner(self, names: list[str], safe: Iterable[str] = ()) -> _Context:
+        """The context inside a scope binding ``names``, of which ``safe``
+        are never changed."""
+        return _Context(
+            self.run,
+            self.bound.union(names),
+            self.safe.difference(names).union(safe),
+            self.depth,
+            {k: n for k, n in self.functions.items() if k not in names},
+        )
+
+    def global_(self, name: str) -> Optional[Value]:
+        """The global value ``name`` refers to here, if it is bound."""
+        if name in self.bound:
+            return None
+        value = self.env.get(name)
+        if value is None and isinstance(self.env, Globals) and not self.env.loading:
+            # A library function the program uses, not evaluated yet.  While
+            # one is being evaluated the functions it uses are left alone, or
+            # each would load the next.
+            try:
+                value = self.env[name]
+            except KeyError:
+                pass
+        return value
+
+
+def lambOptimize(
+    expr: Expr,
+    env: dict[str, Value],
+    level: int = 1,
+    stats: Optional[Counter[str]] = None,
+) -> Expr:
+    """Optimize a macro-expanded top-level expression at ``level``.
+
+    The number of times each rewrite fired is added to ``stats`` when given.
+    """
+    if level <= 0:
+        return expr
+    lowered = lambLower(expr)
+    # A global the expression itself defines may change while it runs
+    bound = frozenset(_scope_defines([lowered]))
+    ctx = _Context(_Pass(env, level, Counter() if stats is None else stats), bound)
+    return _optimize(lowered, ctx)
+
+
+def formatOptStats(stats: Counter[str]) -> str:
+    """Describe the rewrites counted in ``stats``, one per line."""
+    lines = ["Optimizer rewrites:"]
+    for name in (CONSTANT_FOLD, DEAD_BRANCH, ETA_REDUCTION, INLINED):
+        lines.append(f"  {name}: {stats[name]}")
+    return "\n".join(lines)
+
+
+def _optimize(expr: Expr, ctx: _Context) -> Expr:
+    return _optimizers[type(expr)](expr, ctx)
+
+
+def _optimizeLeaf(expr: Expr, ctx: _Context) -> Expr:
+    return expr
+
+
+_optimizers: TypeDispatch[Expr] = TypeDispatch(_optimizeLeaf)
+
+
+def _constant(expr: Expr, ctx: _Context) -> Optional[Union[int, str, bool]]:
+    """The value of ``expr`` if it is a constant, else ``None``."""
+    if isinstance(expr, Literal):
+        return expr.const
+    if isinstance(expr, Variable):
+        value = ctx.global_(expr.name)
+        # ``true`` and ``false``
+        if type(value) is bool:
+            return value
+    return None
+
+
+def _literal(value: Union[int, str, bool]) -> Literal:
+    if type(value) is bool:
+        return Literal("true" if value else "false", const=value)
+    return Literal(str(value), const=value)
+
+
+@_optimizers.register(Application)
+def _optimizeApplication(expr: Application, ctx: _Context) -> Expr:
+    func = _optimize(expr.func, ctx)
+    args = [_optimize(a, ctx) for a in expr.args]
+    if isinstance(func, Variable):
+        folded = _fold(func.name, args, ctx)
+        if folded is not None:
+            ctx.stats[CONSTANT_FOLD] += 1
+            return folded
+        if ctx.level >= 2:
+            inlined = _inline(func.name, args, ctx)
+            if inlined is not None:
+                ctx.stats[INLINED] += 1
+                return inlined
+    return Application(func, args)
+
+
+def _fold(name: str, args: list[Expr], ctx: _Context) -> Optional[Literal]:
+    """Make a call of a pure builtin whose arguments are all constants."""
+    builtin = ctx.global_(name)
+    if not (type(builtin) is Builtin and builtin.pure and not builtin.args):
+        return None
+    if len(args) != builtin.arity and not (
+        builtin.variadic and len(args) > builtin.arity
+    ):
+        return None
+    values = [_constant(a, ctx) for a in args]
+    if None in values:
+        return None
+    try:
+        result = _callBuiltin(builtin, values)  # type: ignore[arg-type]
+    except Exception:
+        # Leave the error, such as a division by zero, to the call if it is
+        # ever made
+        return None
+    if type(result) not in (int, str, bool):
+        return None
+    return _literal(result)  # type: ignore[arg-type]
+
+
+@_optimizers.register(IfExpr)
+def _optimizeIf(expr: IfExpr, ctx: _Context) -> Expr:
+    cond = _optimize(expr.cond, ctx)
+    value = _constant(cond, ctx)
+    # A non-boolean constant still fails when the ``if`` runs
+    if value is True or value is False:
+        ctx.stats[DEAD_BRANCH] += 1
+        return _optimize(expr.then_branch if value else expr.else_branch, ctx)
+    return IfExpr(
+        cond, _optimize(expr.then_branch, ctx), _optimize(expr.else_branch, ctx)
+    )
+
+
+@_optimizers.register(Abstraction)
+def _optimizeAbstraction(expr: Abstraction, ctx: _Context) -> Expr:
+    params = expr.params
+    # Before the body is optimized, which may inline the call it forwards to
+    if ctx.level >= 2:
+        target = _etaTarget(params, expr.body, ctx)
+        if target is not None:
+            ctx.stats[ETA_REDUCTION] += 1
+            return target
+    defines = _scope_defines([expr.body])
+    inner = ctx.inner(params + defines, [p for p in params if p not in defines])
+    return Abstraction(expr.param, _optimize(expr.body, inner), expr.rest_params)
+
+
+def _etaTarget(params: list[str], body: Expr, ctx: _Context) -> Optional[Variable]:
+    """The local function ``(lambda params. body)`` only forwards its arguments
+    to.
+
+    It must be a lambda bound by an enclosing ``letrec`` and taking exactly
+    those arguments, so that calling it directly behaves the same for any
+    number of arguments.  Globals are left alone, since the wrapper calls
+    whatever a global holds when it runs, and so are builtins:
+    ``isFunction`` tells them apart from closures.
+    """
+    if not (
+        isinstance(body, Application)
+        and isinstance(body.func, Variable)
+        and len(set(params)) == len(params)
+        and [a.name if isinstance(a, Variable) else None for a in body.args] == params
+    ):
+        return None
+    name = body.func.name
+    if name not in params and ctx.functions.get(name) == len(params):
+        return body.func
+    return None
+
+
+@_optimizers.register(DefineExpr)
+def _optimizeDefine(expr: DefineExpr, ctx: _Context) -> Expr:
+    return DefineExpr(expr.name, _optimize(expr.value, ctx))
+
+
+@_optimizers.register(LetExpr)
+def _optimizeLet(expr: LetExpr, ctx: _Context) -> Expr:
+    defines = _scope_defines(expr.body)
+    safe = [] if expr.name in defines else [expr.name]
+    inner = ctx.inner([expr.name] + defines, safe)
+    return LetExpr(
+        expr.name, _optimize(expr.value, ctx), [_optimize(b, inner) for b in expr.body]
+    )
+
+
+@_optimizers.register(LetRec)
+def _optimizeLetRec(expr: LetRec, ctx: _Context) -> Expr:
+    names = [name for name, _ in expr.bindings]
+    rhs = [value for _, value in expr.bindings]
+    defines = _scope_defines(rhs + expr.body)
+    inner = ctx.inner(names + defines)
+    # Not while the bindings are made, when the names may not hold them yet
+    body = ctx.inner(names + defines)
+    for name, value in expr.bindings:
+        if (
+            isinstance(value, Abstraction)
+            and name not in defines
+            and names.count(name) == 1
+            and len(set(value.params)) == len(value.params)
+        ):
+            body.functions[name] = len(value.params)
+    return LetRec(
+        [(name, _optimize(value, inner)) for name, value in expr.bindings],
+        [_optimize(b, body) for b in expr.body],
+    )
+
+
+# Names for the ``let`` bindings holding the arguments of inlined calls
+_fresh = count()
+
+
+def _inline(name: str, args: list[Expr], ctx: _Context) -> Optional[Expr]:
+    """Substitute the body of a small global closure for a call of it.
+
+    The inlined body runs only while the global still holds that closure; once
+    it is redefined the original call is made instead.
+    """
+    func = ctx.global_(name)
+    if not (
+        type(func) is Closure
+        and not func.args
+        and func.arity == len(args)
+        # Closed over nothing but the globals: ``env`` itself on the tree
+        # engine, ``None`` on the VM
+        and (func.env is ctx.env or func.env is None)
+        and ctx.depth < INLINE_MAX_DEPTH
+    ):
+        return None
+    params = func.params
+    body = func.body
+    size = _inlineSize(body)
+    if size is None or size > INLINE_MAX_SIZE or len(set(params)) != len(params):
+        return None
+    free = _freeNames(body, frozenset(params))
+    # Recursive, or using a global that a local hides at the call
+    if name in free or not free.isdisjoint(ctx.bound):
+        return None
+    # The guard, the fallback call and its arguments
+    cost = size + 2 + len(args)
+    if cost > ctx.run.budget:
+        return None
+    ctx.run.budget -= cost
+
+    # Constants and unchanging locals are substituted for the parameters,
+    # other arguments are evaluated once, in order, into fresh ``let`` names
+    binds = _hasBinders(body)
+    mapping: dict[str, Expr] = {}
+    lets: list[tuple[str, Expr]] = []
+    for param, arg in zip(params, args):
+        if isinstance(arg, Literal) or (
+            isinstance(arg, Variable) and arg.name in ctx.safe and not binds
+        ):
+            mapping[param] = arg
+        else:
+            fresh = f"__inline_{next(_fresh)}"
+            lets.append((fresh, arg))
+            mapping[param] = Variable(fresh)
+    fresh_names = [fresh for fresh, _ in lets]
+    inner = ctx.inner(fresh_names, fresh_names)
+    inner.depth += 1
+    inlined: Expr = IfExpr(
+        GlobalIs(name, func),
+        _optimize(_substitute(body, mapping), inner),
+        Application(Variable(name), [mapping[p] for p in params]),
+    )
+    for fresh, arg in reversed(lets):
+        inlined = LetExpr(fresh, arg, [inlined])
+    return inlined
+
+
+def _inlineSize(expr: Expr) -> Optional[int]:
+    """The number of nodes in ``expr``, or ``None`` if it cannot be inlined."""
+    if isinstance(expr, (Variable, Literal, QuoteExpr, GlobalIs)):
+        return 1
+    if isinstance(expr, Application):
+        parts = [expr.func, *expr.args]
+    elif isinstance(expr, Abstraction):
+        parts = [expr.body]
+    elif isinstance(expr, IfExpr):
+        parts = [expr.cond, expr.then_branch, expr.else_branch]
+    elif isinstance(expr, LetExpr):
+        parts = [expr.value, *expr.body]
+    elif isinstance(expr, LetRec):
+        parts = [value for _, value in expr.bindings] + expr.body
+    else:
+        # ``define`` and ``defmacro`` would run in the caller's scope
+        return None
+    total = 1
+    for part in parts:
+        size = _inlineSize(part)
+        if size is None:
+            return None
+        total += size
+    return total
+
+
+def _freeNames(expr: Expr, bound: frozenset[str]) -> set[str]:
+    """The names ``expr`` uses that are not in ``bound`` or bound inside it."""
+    if isinstance(expr, Variable):
+        return set() if expr.name in bound else {expr.name}
+    if isinstance(expr, GlobalIs):
+        return {expr.name}
+    if isinstance(expr, Application):
+        parts, inner = [expr.func, *expr.args], bound
+    elif isinstance(expr, Abstraction):
+        parts, inner = [expr.body], bound.union(expr.params)
+    elif isinstance(expr, IfExpr):
+        parts, inner = [expr.cond, expr.then_branch, expr.else_branch], bound
+    elif isinstance(expr, LetExpr):
+        free = _freeNames(expr.value, bound)
+        for b in expr.body:
+            free |= _freeNames(b, bound | {expr.name})
+        return free
+    elif isinstance(expr, LetRec):
+        parts = [value for _, value in expr.bindings] + expr.body
+        inner = bound.union(name for name, _ in expr.bindings)
+    else:
+        return set()
+    free = set()
+    for part in parts:
+        free |= _freeNames(part, inner)
+    return free
+
+
+def _hasBinders(expr: Expr) -> bool:
+    """Whether ``expr`` binds any local names."""
+    if isinstance(expr, (Abstraction, LetExpr, LetRec)):
+        return True
+    if isinstance(expr, Application):
+        return any(_hasBinders(e) for e in [expr.func, *expr.args])
+    if isinstance(expr, IfExpr):
+        return any(
+            _hasBinders(e) for e in (expr.cond, expr.then_branch, expr.else_branch)
+        )
+    return False
+
+
+def _substitute(expr: Expr, mapping: dict[str, Expr]) -> Expr:
+    """Replace the free variables of ``expr`` named in ``mapping``."""
+    if not mapping:
+        return expr
+    if isinstance(expr, Variable):
+        return mapping.get(expr.name, expr)
+    if isinstance(expr, Application):
+        return Application(
+            _substitute(expr.func, mapping),
+            [_substitute(a, mapping) for a in expr.args],
+        )
+    if isinstance(expr, Abstraction):
+        inner = {k: v for k, v in mapping.items() if k not in expr.params}
+        return Abstraction(expr.param, _substitute(expr.body, inner), expr.rest_params)
+    if isinstance(expr, IfExpr):
+        return IfExpr(
+            _substitute(expr.cond, mapping),
+            _substitute(expr.then_branch, mapping),
+            _substitute(expr.else_branch, mapping),
+        )
+    if isinstance(expr, LetExpr):
+        inner = {k: v for k, v in mapping.items() if k != expr.name}
+        return LetExpr(
+            expr.name,
+            _substitute(expr.value, mapping),
+            [_substitute(b, inner) for b in expr.body],
+        )
+    if isinstance(expr, LetRec):
+        names = {name for name, _ in expr.bindings}
+        inner = {k: v for k, v in mapping.items() if k not in names}
+        return LetRec(
+            [(name, _substitute(value, inner)) for name, value in expr.bindings],
+            [_substitute(b, inner) for b in expr.body],
+        )
+    return expr
@@ -0,0 +1,14 @@
+"""Choices offered on the command line.
+
+They live here, away from the modules that act on them, so that the CLI can
+build its argument parser without importing the interpreter.
+"""
+
+# Evaluation engines selectable with ``lambdora run --engine``
+ENGINES = ("tree", "vm")
+
+# Modes of ``lambdora run --jit``
+JIT_MODES = ("auto", "on", "off")
+
+# Levels accepted by ``lambdora run -O``
+OPT_LEVELS = (0, 1, 2)
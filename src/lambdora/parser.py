@@ -1,7 +1,7 @@
 """Parsing logic converting tokens into AST nodes."""
 
 import re
-from typing import List, Tuple
+from typing import Callable, List, Optional, Tuple, cast
 
 from .astmodule import (
     Abstraction,
@@ -9,6 +9,8 @@ from .astmodule import (
     DefineExpr,
     DefMacroExpr,
     Expr,
+    IfExpr,
+    LetExpr,
     LetRec,
     Literal,
     QuasiQuoteExpr,
@@ -16,7 +18,20 @@ from .astmodule import (
     UnquoteExpr,
     Variable,
 )
+from .dispatch import TypeDispatch
+from .errors import EvalError
 from .errors import ParseError as SyntaxError
+from .tokenizer import Tokens
+
+
+def _syntaxError(tokens: List[str], i: int, message: str) -> SyntaxError:
+    """A ``ParseError`` at token ``i``, located if ``tokens`` say where it is."""
+    if not isinstance(tokens, Tokens):
+        return SyntaxError(message)
+    line, column, text = tokens.location(i)
+    return SyntaxError(
+        message, file=tokens.filename, line=line, column=column, snippet=text
+    )
 
 
 def parseExpression(
@@ -24,7 +39,7 @@ def parseExpression(
 ) -> Tuple[Expr, int]:
     """Parse an expression from ``tokens`` starting at index ``i``."""
     if i >= len(tokens):
-        raise SyntaxError("Unexpected EOF while parsing")
+        raise _syntaxError(tokens, i, "Unexpected EOF while parsing")
     token = tokens[i]
 
     if token == "`":  # Back-quote
@@ -38,51 +53,55 @@ def parseExpression(
     if token == "(":
         i += 1
         if i >= len(tokens):
-            raise SyntaxError("Unexpected EOF after '('")
+            raise _syntaxError(tokens, i, "Unexpected EOF after '('")
 
         elif tokens[i] == "letrec":
             i += 1
             if i >= len(tokens):
-                raise SyntaxError("Unexpected EOF after letrec")
+                raise _syntaxError(tokens, i, "Unexpected EOF after letrec")
 
             # Parse bindings - expect ((name1 value1) (name2 value2) ...)
             if tokens[i] != "(":
-                raise SyntaxError("Expected '(' after letrec")
+                raise _syntaxError(tokens, i, "Expected '(' after letrec")
             i += 1
 
             bindings = []
             while i < len(tokens) and tokens[i] != ")":
                 if tokens[i] != "(":
-                    raise SyntaxError("Expected '(' for letrec binding")
+                    raise _syntaxError(tokens, i, "Expected '(' for letrec binding")
                 i += 1
 
                 if i >= len(tokens):
-                    raise SyntaxError("Unexpected EOF in letrec binding")
+                    raise _syntaxError(tokens, i, "Unexpected EOF in letrec binding")
 
                 # Parse binding name
                 name = tokens[i]
                 i += 1
 
                 if i >= len(tokens):
-                    raise SyntaxError("Unexpected EOF after letrec binding name")
+                    raise _syntaxError(
+                        tokens, i, "Unexpected EOF after letrec binding name"
+                    )
 
                 # Parse binding value
                 value, i = parseExpression(tokens, i, in_quasiquote=in_quasiquote)
 
                 if i >= len(tokens):
-                    raise SyntaxError("Unexpected EOF after letrec binding value")
+                    raise _syntaxError(
+                        tokens, i, "Unexpected EOF after letrec binding value"
+                    )
 
                 if tokens[i] != ")":
-                    raise SyntaxError("Expected ')' after letrec binding")
+                    raise _syntaxError(tokens, i, "Expected ')' after letrec binding")
                 i += 1
 
                 bindings.append((name, value))
 
             if i >= len(tokens):
-                raise SyntaxError("Unexpected EOF after letrec bindings")
+                raise _syntaxError(tokens, i, "Unexpected EOF after letrec bindings")
 
             if tokens[i] != ")":
-                raise SyntaxError("Expected ')' after letrec bindings")
+                raise _syntaxError(tokens, i, "Expected ')' after letrec bindings")
             i += 1
 
             # Parse body expressions
@@ -92,51 +111,51 @@ def parseExpression(
                 letrec_body.append(body_expr)
 
             if i >= len(tokens):
-                raise SyntaxError("Unexpected EOF after letrec body")
+                raise _syntaxError(tokens, i, "Unexpected EOF after letrec body")
 
             if tokens[i] != ")":
-                raise SyntaxError("Expected ')' after letrec body")
+                raise _syntaxError(tokens, i, "Expected ')' after letrec body")
 
             return LetRec(bindings, letrec_body), i + 1
 
         elif tokens[i] == "define":
             i += 1
             if i >= len(tokens):
-                raise SyntaxError("Unexpected EOF after define")
+                raise _syntaxError(tokens, i, "Unexpected EOF after define")
 
             # Parse name
             name = tokens[i]
             i += 1
 
             if i >= len(tokens):
-                raise SyntaxError("Unexpected EOF after define name")
+                raise _syntaxError(tokens, i, "Unexpected EOF after define name")
 
             # Parse value
             value, i = parseExpression(tokens, i, in_quasiquote=in_quasiquote)
 
             if i >= len(tokens):
-                raise SyntaxError("Unexpected EOF after define value")
+                raise _syntaxError(tokens, i, "Unexpected EOF after define value")
 
             if tokens[i] != ")":
-                raise SyntaxError("Expected ')' after define value")
+                raise _syntaxError(tokens, i, "Expected ')' after define value")
 
             return DefineExpr(name, value), i + 1
 
         elif tokens[i] == "defmacro":
             i += 1
             if i >= len(tokens):
-                raise SyntaxError("Unexpected EOF after defmacro")
+                raise _syntaxError(tokens, i, "Unexpected EOF after defmacro")
 
             # Parse name
             name = tokens[i]
             i += 1
 
             if i >= len(tokens):
-                raise SyntaxError("Unexpected EOF after defmacro name")
+                raise _syntaxError(tokens, i, "Unexpected EOF after defmacro name")
 
             # Parse parameters - expect (param1 param2 ...)
             if tokens[i] != "(":
-                raise SyntaxError("Expected '(' after defmacro name")
+                raise _syntaxError(tokens, i, "Expected '(' after defmacro name")
             i += 1
 
             params = []
@@ -145,56 +164,59 @@ def parseExpression(
                 i += 1
 
             if i >= len(tokens):
-                raise SyntaxError("Unexpected EOF after defmacro params")
+                raise _syntaxError(tokens, i, "Unexpected EOF after defmacro params")
 
             if tokens[i] != ")":
-                raise SyntaxError("Expected ')' after defmacro params")
+                raise _syntaxError(tokens, i, "Expected ')' after defmacro params")
             i += 1
 
             if i >= len(tokens):
-                raise SyntaxError("Unexpected EOF after defmacro params")
+                raise _syntaxError(tokens, i, "Unexpected EOF after defmacro params")
 
             # Parse body (should be a single Expr)
             macro_body, i = parseExpression(tokens, i, in_quasiquote=in_quasiquote)
 
             if i >= len(tokens):
-                raise SyntaxError("Unexpected EOF after defmacro body")
+                raise _syntaxError(tokens, i, "Unexpected EOF after defmacro body")
 
             if tokens[i] != ")":
-                raise SyntaxError("Expected ')' after defmacro body")
+                raise _syntaxError(tokens, i, "Expected ')' after defmacro body")
 
             return DefMacroExpr(name, params, macro_body), i + 1
 
         elif tokens[i] == "lambda" and not in_quasiquote:
             i += 1
             if i >= len(tokens):
-                raise SyntaxError("Unexpected EOF after lambda")
+                raise _syntaxError(tokens, i, "Unexpected EOF after lambda")
 
-            # Parse parameter
-            param = tokens[i]
-            i += 1
+            # Parse parameters up to the dot
+            params = []
+            while True:
+                params.append(tokens[i])
+                i += 1
 
-            if i >= len(tokens):
-                raise SyntaxError("Unexpected EOF after lambda param")
+                if i >= len(tokens):
+                    raise _syntaxError(tokens, i, "Unexpected EOF after lambda param")
 
-            # Expect dot
-            if tokens[i] != ".":
-                raise SyntaxError("Expected '.' after lambda param")
+                if tokens[i] == ".":
+                    break
+                if tokens[i] in ("(", ")"):
+                    raise _syntaxError(tokens, i, "Expected '.' after lambda param")
             i += 1
 
             if i >= len(tokens):
-                raise SyntaxError("Unexpected EOF after lambda dot")
+                raise _syntaxError(tokens, i, "Unexpected EOF after lambda dot")
 
             # Parse body (should be a single Expr)
             lambda_body, i = parseExpression(tokens, i, in_quasiquote=in_quasiquote)
 
             if i >= len(tokens):
-                raise SyntaxError("Unexpected EOF after lambda body")
+                raise _syntaxError(tokens, i, "Unexpected EOF after lambda body")
 
             if tokens[i] != ")":
-                raise SyntaxError("Expected ')' after lambda body")
+                raise _syntaxError(tokens, i, "Expected ')' after lambda body")
 
-            return Abstraction(param, lambda_body), i + 1
+            return Abstraction(params[0], lambda_body, params[1:]), i + 1
 
         func, i = parseExpression(tokens, i, in_quasiquote=in_quasiquote)
         args = []
@@ -202,7 +224,7 @@ def parseExpression(
             arg, i = parseExpression(tokens, i, in_quasiquote=in_quasiquote)
             args.append(arg)
         if i >= len(tokens):
-            raise SyntaxError("Unexpected EOF: missing ')'")
+            raise _syntaxError(tokens, i, "Unexpected EOF: missing ')'")
         return Application(func, args), i + 1
 
     elif token == "'":
@@ -213,7 +235,8 @@ def parseExpression(
         return Literal(token), i + 1
 
     elif token.startswith('"') and token.endswith('"'):
-        return Literal(token[1:-1]), i + 1
+        text = token[1:-1]
+        return Literal(text, const=text), i + 1
 
     elif token == ".":
         return Literal("."), i + 1
@@ -222,14 +245,14 @@ def parseExpression(
         return Variable(token), i + 1
 
     else:
-        raise SyntaxError(f"Unexpected token: {token}")
+        raise _syntaxError(tokens, i, f"Unexpected token: {token}")
 
 
 # Parse for a single expr
 def lambParse(tokens: List[str]) -> Expr:
     expr, final_i = parseExpression(tokens, 0, in_quasiquote=False)
     if final_i != len(tokens):
-        raise SyntaxError("Unexpected extra tokens")
+        raise _syntaxError(tokens, final_i, "Unexpected extra tokens")
     return expr
 
 
@@ -241,3 +264,194 @@ def lambParseAll(tokens: List[str]) -> List[Expr]:
         expr, i = parseExpression(tokens, i, in_quasiquote=False)
         exprs.append(expr)
     return exprs
+
+
+def lambLower(expr: Expr) -> Expr:
+    """Rewrite special forms written as applications into typed AST nodes.
+
+    Macro templates produce ``(if c a b)``, ``(lambda x . body)``, ``(let ...)``
+    and friends as plain applications.  This pass runs after macro expansion
+    and turns them into ``IfExpr``, ``Abstraction``, ``LetExpr`` and so on, so
+    the engines never inspect function names.  Malformed forms raise here,
+    when the expression is loaded, instead of when the code containing them
+    runs.  Quoted data and macro bodies are left untouched.
+    """
+    return _lower[type(expr)](expr)
+
+
+def _lowerLeaf(expr: Expr) -> Expr:
+    return expr
+
+
+_lower: TypeDispatch[Expr] = TypeDispatch(_lowerLeaf)
+
+
+@_lower.register(Application)
+def _lowerApplication(expr: Application) -> Expr:
+    if isinstance(expr.func, Variable):
+        lower = _LOWER_FORMS.get(expr.func.name)
+        if lower is not None:
+            return lower(expr)
+    return Application(lambLower(expr.func), [lambLower(a) for a in expr.args])
+
+
+@_lower.register(Abstraction)
+def _lowerAbstraction(expr: Abstraction) -> Expr:
+    return Abstraction(expr.param, lambLower(expr.body), expr.rest_params)
+
+
+@_lower.register(IfExpr)
+def _lowerIf(expr: IfExpr) -> Expr:
+    return IfExpr(
+        lambLower(expr.cond),
+        lambLower(expr.then_branch),
+        lambLower(expr.else_branch),
+    )
+
+
+@_lower.register(DefineExpr)
+def _lowerDefine(expr: DefineExpr) -> Expr:
+    return DefineExpr(expr.name, lambLower(expr.value))
+
+
+@_lower.register(LetExpr)
+def _lowerLet(expr: LetExpr) -> Expr:
+    return LetExpr(expr.name, lambLower(expr.value), [lambLower(b) for b in expr.body])
+
+
+@_lower.register(LetRec)
+def _lowerLetRec(expr: LetRec) -> Expr:
+    return LetRec(
+        [(name, lambLower(value)) for name, value in expr.bindings],
+        [lambLower(b) for b in expr.body],
+    )
+
+
+@_lower.register(QuasiQuoteExpr)
+def _lowerQuasiquoteExpr(expr: QuasiQuoteExpr) -> Expr:
+    return _lowerQuasiquote(expr.expr)
+
+
+def _lowerQuasiquote(template: Expr) -> Expr:
+    """Lower the code in the unquoted holes of a quasiquote template.
+
+    The template is normalised the way ``expandQuasiquote`` reads it, so a
+    malformed form in the template is also reported at load time.
+    """
+    from .evaluator import expandQuasiquote
+
+    def hole(unquoted: Expr) -> Expr:
+        return UnquoteExpr(lambLower(unquoted))
+
+    return QuasiQuoteExpr(expandQuasiquote(template, hole))
+
+
+def _staticName(name_ast: Expr) -> Optional[str]:
+    if isinstance(name_ast, Variable):
+        return name_ast.name
+    if isinstance(name_ast, Literal) and isinstance(name_ast.value, str):
+        return name_ast.value
+    return None
+
+
+def _lowerLambdaForm(expr: Application) -> Expr:
+    if (
+        len(expr.args) < 3
+        or not isinstance(expr.args[-2], Literal)
+        or expr.args[-2].value != "."
+    ):
+        raise EvalError("lambda syntax: (lambda param . body)")
+    params = [_staticName(p) for p in expr.args[:-2]]
+    if None in params:
+        raise EvalError("lambda param must be string identifier")
+    names = cast(List[str], params)
+    return Abstraction(names[0], lambLower(expr.args[-1]), names[1:])
+
+
+def _lowerQuasiquoteForm(expr: Application) -> Expr:
+    if len(expr.args) != 1:
+        raise EvalError("quasiquote requires exactly one argument")
+    return _lowerQuasiquote(expr.args[0])
+
+
+def _lowerQuoteForm(expr: Application) -> Expr:
+    if len(expr.args) != 1:
+        raise EvalError("quote requires exactly one argument")
+    return QuoteExpr(expr.args[0])
+
+
+def _lowerUnquoteForm(expr: Application) -> Expr:
+    if len(expr.args) != 1:
+        raise EvalError("unquote requires exactly one argument")
+    # Unquote should only be used inside quasiquote
+    raise EvalError("unquote can only be used inside quasiquote")
+
+
+def _lowerIfForm(expr: Application) -> Expr:
+    if len(expr.args) != 3:
+        raise SyntaxError("if requires condition, then, else")
+    cond, then_branch, else_branch = [lambLower(a) for a in expr.args]
+    return IfExpr(cond, then_branch, else_branch)
+
+
+def _lowerDefineForm(expr: Application) -> Expr:
+    if len(expr.args) != 2:
+        raise EvalError("define requires name and value")
+    name = _staticName(expr.args[0])
+    if name is None:
+        raise EvalError("define name must be string identifier")
+    return DefineExpr(name, lambLower(expr.args[1]))
+
+
+def _lowerDefMemoForm(expr: Application) -> Expr:
+    if len(expr.args) != 2:
+        raise EvalError("defmemo requires name and value")
+    name = _staticName(expr.args[0])
+    if name is None:
+        raise EvalError("defmemo name must be string identifier")
+    # (define name (memoize value)), see ``memo.py``
+    memoized = Application(Variable("memoize"), [lambLower(expr.args[1])])
+    return DefineExpr(name, memoized)
+
+
+def _lowerLetForm(expr: Application) -> Expr:
+    if len(expr.args) < 3 or not isinstance(expr.args[0], Variable):
+        raise EvalError("let syntax: (let var val body...)")
+    return LetExpr(
+        expr.args[0].name,
+        lambLower(expr.args[1]),
+        [lambLower(b) for b in expr.args[2:]],
+    )
+
+
+def _lowerDefMacroForm(expr: Application) -> Expr:
+    if len(expr.args) != 3:
+        raise EvalError("defmacro requires name, params, body")
+    name_ast, params_ast, body = expr.args
+    if not isinstance(name_ast, Variable):
+        raise EvalError("defmacro name must be identifier")
+    params = []
+    if isinstance(params_ast, Application) and isinstance(params_ast.func, Variable):
+        params.append(params_ast.func.name)
+        for p in params_ast.args:
+            if not isinstance(p, Variable):
+                raise EvalError("defmacro params must be identifiers")
+            params.append(p.name)
+    elif isinstance(params_ast, Variable):
+        params = [params_ast.name]
+    else:
+        raise EvalError("defmacro params must be list of identifiers")
+    return DefMacroExpr(name_ast.name, params, body)
+
+
+_LOWER_FORMS: dict[str, Callable[[Application], Expr]] = {
+    "lambda": _lowerLambdaForm,
+    "quasiquote": _lowerQuasiquoteForm,
+    "quote": _lowerQuoteForm,
+    "unquote": _lowerUnquoteForm,
+    "if": _lowerIfForm,
+    "define": _lowerDefineForm,
+    "defmemo": _lowerDefMemoForm,
+    "let": _lowerLetForm,
+    "defmacro": _lowerDefMacroForm,
+}
@@ -6,7 +6,9 @@ from .astmodule import (
     DefineExpr,
     DefMacroExpr,
     Expr,
+    GlobalIs,
     IfExpr,
+    LetExpr,
     LetRec,
     Literal,
     QuasiQuoteExpr,
@@ -14,37 +16,88 @@ from .astmodule import (
     UnquoteExpr,
     Variable,
 )
+from .dispatch import TypeDispatch
+
+
+def _printUnknown(expr: Expr) -> str:
+    raise TypeError(f"Unknown expression type: {expr}")
+
+
+_print: TypeDispatch[str] = TypeDispatch(_printUnknown)
 
 
 def lambPrint(expr: Expr) -> str:
-    if isinstance(expr, Variable):
-        return expr.name
-    elif isinstance(expr, Literal):
-        return expr.value
-    elif isinstance(expr, Abstraction):
-        return f"(lambda {expr.param}. {lambPrint(expr.body)})"
-    elif isinstance(expr, Application):
-        parts = [lambPrint(expr.func)] + [lambPrint(arg) for arg in expr.args]
-        return f"({' '.join(parts)})"
-    elif isinstance(expr, QuasiQuoteExpr):
-        return f"`({lambPrint(expr.expr)})"
-    elif isinstance(expr, UnquoteExpr):
-        return f",({lambPrint(expr.expr)})"
-    elif isinstance(expr, QuoteExpr):
-        return f"'({lambPrint(expr.value)})"
-    elif isinstance(expr, LetRec):
-        binds = " ".join([f"({name} {lambPrint(val)})" for name, val in expr.bindings])
-        bodies = " ".join([lambPrint(b) for b in expr.body])
-        return f"(letrec ({binds}) {bodies})"
-    elif isinstance(expr, IfExpr):
-        cond = lambPrint(expr.cond)
-        then_branch = lambPrint(expr.then_branch)
-        else_branch = lambPrint(expr.else_branch)
-        return f"(if {cond} {then_branch} {else_branch})"
-    elif isinstance(expr, DefineExpr):
-        return f"(define {expr.name} {lambPrint(expr.value)})"
-    elif isinstance(expr, DefMacroExpr):
-        params = " ".join(expr.params)
-        return f"(defmacro {expr.name} ({params}) {lambPrint(expr.body)})"
-    else:
-        raise TypeError(f"Unknown expression type: {expr}")
+    return _print[type(expr)](expr)
+
+
+@_print.register(Variable)
+def _printVariable(expr: Variable) -> str:
+    return expr.name
+
+
+@_print.register(Literal)
+def _printLiteral(expr: Literal) -> str:
+    return expr.value
+
+
+@_print.register(Abstraction)
+def _printAbstraction(expr: Abstraction) -> str:
+    return f"(lambda {' '.join(expr.params)}. {lambPrint(expr.body)})"
+
+
+@_print.register(Application)
+def _printApplication(expr: Application) -> str:
+    parts = [lambPrint(expr.func)] + [lambPrint(arg) for arg in expr.args]
+    return f"({' '.join(parts)})"
+
+
+@_print.register(QuasiQuoteExpr)
+def _printQuasiquote(expr: QuasiQuoteExpr) -> str:
+    return f"`({lambPrint(expr.expr)})"
+
+
+@_print.register(UnquoteExpr)
+def _printUnquote(expr: UnquoteExpr) -> str:
+    return f",({lambPrint(expr.expr)})"
+
+
+@_print.register(QuoteExpr)
+def _printQuote(expr: QuoteExpr) -> str:
+    return f"'({lambPrint(expr.value)})"
+
+
+@_print.register(LetRec)
+def _printLetRec(expr: LetRec) -> str:
+    binds = " ".join([f"({name} {lambPrint(val)})" for name, val in expr.bindings])
+    bodies = " ".join([lambPrint(b) for b in expr.body])
+    return f"(letrec ({binds}) {bodies})"
+
+
+@_print.register(LetExpr)
+def _printLet(expr: LetExpr) -> str:
+    bodies = " ".join([lambPrint(b) for b in expr.body])
+    return f"(let {expr.name} {lambPrint(expr.value)} {bodies})"
+
+
+@_print.register(IfExpr)
+def _printIf(expr: IfExpr) -> str:
+    cond = lambPrint(expr.cond)
+    then_branch = lambPrint(expr.then_branch)
+    else_branch = lambPrint(expr.else_branch)
+    return f"(if {cond} {then_branch} {else_branch})"
+
+
+@_print.register(DefineExpr)
+def _printDefine(expr: DefineExpr) -> str:
+    return f"(define {expr.name} {lambPrint(expr.value)})"
+
+
+@_print.register(GlobalIs)
+def _printGlobalIs(expr: GlobalIs) -> str:
+    return f"<{expr.name} unchanged>"
+
+
+@_print.register(DefMacroExpr)
+def _printDefMacro(expr: DefMacroExpr) -> str:
+    params = " ".join(expr.params)
+    return f"(defmacro {expr.name} ({params}) {lambPrint(expr.body)})"
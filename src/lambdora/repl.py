@@ -13,8 +13,11 @@ from .astmodule import Expr, QuasiQuoteExpr
 from .builtinsmodule import lambMakeTopEnv
 from .errors import LambError, format_lamb_error
 from .evaluator import evalQuasiquote, lambEval, trampoline
+from .lambcache import lambCachedForms
+from .lazydefs import lambLoadLazily
 from .macro import lambMacroExpand
-from .parser import lambParse, lambParseAll
+from .optimize import lambOptimize
+from .parser import lambParse
 from .printer import lambPrint
 from .tokenizer import lambTokenize
 from .values import Value, nil, valueToString
@@ -114,8 +117,11 @@ Multiline input:
     print(f"{Fore.CYAN}{help_text}{Style.RESET_ALL}")
 
 
-def load_std(stdlib_path: Optional[Path] = None) -> None:
-    """Load the standard library into the REPL environment."""
+def load_std(stdlib_path: Optional[Path] = None, opt_level: int = 0) -> None:
+    """Load the standard library into the REPL environment.
+
+    Definitions of functions are evaluated when first looked up.
+    """
     if stdlib_path is None:
         std = Path(__file__).with_suffix("").parent / "stdlib" / "std.lamb"
     else:
@@ -134,12 +140,14 @@ def load_std(stdlib_path: Optional[Path] = None) -> None:
             std = Path(__file__).with_suffix("").parent / "stdlib" / "std.lamb"
         if not std.exists():
             return
+
+    def load(exp: Expr) -> Value:
+        exp = lambOptimize(exp, ENV, opt_level)
+        return trampoline(lambEval(exp, ENV, is_tail=True))
+
     try:
-        tokens = lambTokenize(std.read_text(encoding="utf-8"))
-        for expr in lambParseAll(tokens):
-            exp = lambMacroExpand(expr, ENV)
-            if exp is not None:
-                trampoline(lambEval(exp, ENV, is_tail=True))
+        forms = lambCachedForms(std, std.read_text(encoding="utf-8"), ENV)
+        lambLoadLazily(forms, ENV, load)
     except LambError as err:
         print_error(f"Error loading standard library: {format_lamb_error(err)}")
         print(
@@ -147,7 +155,7 @@ def load_std(stdlib_path: Optional[Path] = None) -> None:
         )
 
 
-def run_expr(src: str) -> Value:
+def run_expr(src: str, opt_level: int = 0) -> Value:
     tokens = lambTokenize(src)
     expr = lambParse(tokens)
 
@@ -158,13 +166,35 @@ def run_expr(src: str) -> Value:
     exp = lambMacroExpand(expr, ENV)
     if exp is None:
         return "<macro defined>"
+    exp = lambOptimize(exp, ENV, opt_level)
     return trampoline(lambEval(exp, ENV, is_tail=True))
 
 
-def repl(stdlib_path: Optional[Path] = None) -> None:
-    """Start the interactive prompt."""
+def repl(
+    stdlib_path: Optional[Path] = None,
+    opt_level: int = 0,
+    image: Optional[Path] = None,
+    save_image: Optional[Path] = None,
+) -> None:
+    """Start the interactive prompt, optimizing input at ``opt_level``.
+
+    The environment is loaded from ``image`` instead of the standard library
+    when given, and saved to ``save_image`` when the session ends.
+    """
     setup_readline()
-    load_std(stdlib_path)
+    if image is None:
+        load_std(stdlib_path, opt_level)
+    else:
+        from .image import lambLoadImage
+
+        try:
+            lambLoadImage(image, ENV)
+        except LambError as err:
+            print_error(format_lamb_error(err))
+            print(
+                f"{Fore.YELLOW}Loading the standard library instead...{Style.RESET_ALL}"
+            )
+            load_std(stdlib_path, opt_level)
 
     print(f"{Fore.MAGENTA}Lambdora REPL{Style.RESET_ALL}")
     if stdlib_path:
@@ -240,7 +270,7 @@ def repl(stdlib_path: Optional[Path] = None) -> None:
                 continue
 
             try:
-                out = run_expr(line)
+                out = run_expr(line, opt_level)
                 if out is not nil:
                     result_str = (
                         lambPrint(out) if isinstance(out, Expr) else valueToString(out)
@@ -271,6 +301,14 @@ def repl(stdlib_path: Optional[Path] = None) -> None:
             )
             break
 
+    if save_image is not None:
+        from .image import lambSaveImage
+
+        try:
+            lambSaveImage(ENV, save_image)
+        except LambError as err:
+            print_error(format_lamb_error(err))
+
 
 def main() -> None:
     """Legacy main function for backward compatibility."""
@@ -0,0 +1,560 @@
+"""Static resolution of variable references for Lambdora.
+
+``lambResolve()`` runs after macro expansion and rewrites an expression into a
+resolved form that both the closure-compiling evaluator and the bytecode VM
+compile.  Every variable reference becomes either a ``GlobalRef`` or a
+``LocalRef`` holding a ``(depth, slot)`` lexical address, and every construct
+that opens a scope records how many slots its frame needs.
+
+At run time a frame is a list ``[parent, slot1, slot2, ...]``.  A lambda frame
+holds the parameters followed by the names bound by ``define`` directly in the
+body; ``let`` and ``letrec`` frames hold their own bindings followed by their
+defines.  The chain of parents ends in the global environment, a plain dict in
+which every other name is looked up.
+
+The parent of a lambda frame is the environment of the closure, which holds
+only what the body uses: ``[globals, captured...]``, or just the globals.
+Captured variables that can change after their frame is created live in
+cells, one-element lists shared by the frame and the closures.
+
+The input must already be lowered by ``parser.lambLower()``, so special forms
+only appear as typed nodes.
+"""
+
+from __future__ import annotations
+
+from copy import copy
+from dataclasses import dataclass, field
+from typing import Any, Iterable, List, Optional, TypeVar, Union, cast
+
+from .astmodule import (
+    Abstraction,
+    Application,
+    DefineExpr,
+    DefMacroExpr,
+    Expr,
+    GlobalIs,
+    IfExpr,
+    LetExpr,
+    LetRec,
+    Literal,
+    QuasiQuoteExpr,
+    QuoteExpr,
+    Variable,
+)
+from .dispatch import TypeDispatch
+from .errors import EvalError, LambError
+from .values import Value, nil
+
+
+@dataclass
+class GlobalRef(Expr):
+    """A global variable; the globals are ``depth`` frames up the chain."""
+
+    name: str
+    depth: int
+
+
+@dataclass
+class LocalRef(Expr):
+    """Slot ``slot`` of the frame ``depth`` levels up.
+
+    ``checked`` is set when the slot may still hold the ``letrec`` placeholder
+    or be unbound because the ``define`` that fills it has not run yet.
+    ``cell`` is set when the slot holds a cell, a one-element list shared with
+    closures, and the variable is its element.
+    """
+
+    name: str
+    depth: int
+    slot: int
+    checked: bool = False
+    cell: bool = False
+
+
+@dataclass
+class FrameRef(Expr):
+    """The frame ``depth`` levels up; at the end of the chain, the globals."""
+
+    depth: int
+
+
+Ref = Union[GlobalRef, LocalRef]
+
+
+@dataclass
+class ResolvedLambda(Expr):
+    # Bound to slots 1..n of the frame
+    params: List[str]
+    body: Expr
+    # Slots after the parameters, one per name bound by ``define`` in the body
+    nlocals: int
+    # The unresolved body, kept on the closures this lambda creates
+    source: Expr
+    # Set when the body contains a ``SelfTailCall``
+    loops: bool = False
+    # Evaluated where the lambda is created, to build the environment of the
+    # closure: the globals, then each variable the body uses from enclosing
+    # scopes.  With nothing but the globals the environment is the global
+    # dict itself, otherwise a list ``[globals, captured...]``.
+    captures: List[Expr] = field(default_factory=list)
+    # Slots of the frame holding a cell, created when the call starts
+    cells: List[int] = field(default_factory=list)
+
+
+@dataclass
+class SelfTailCall(Expr):
+    """A tail call from a function's body to the name the function is bound to.
+
+    When ``func`` still holds the running closure the call rebinds the
+    parameters in the current frame and restarts the body instead of making a
+    new call; otherwise it is an ordinary tail call.
+    """
+
+    func: Ref
+    args: List[Expr]
+
+
+@dataclass
+class ResolvedLet(Expr):
+    # Evaluated in order in the enclosing scope and stored in slots 1..n
+    values: List[Expr]
+    body: List[Expr]
+    nslots: int
+    cells: List[int] = field(default_factory=list)
+
+
+@dataclass
+class ResolvedLetRec(Expr):
+    # (slot, value) pairs, evaluated in order inside the new frame
+    bindings: List[tuple[int, Expr]]
+    body: List[Expr]
+    nslots: int
+    # Slots 1..nrec start out holding the recursion placeholder
+    nrec: int
+    cells: List[int] = field(default_factory=list)
+
+
+@dataclass
+class ResolvedDefine(Expr):
+    name: str
+    target: Ref
+    value: Expr
+
+
+@dataclass
+class ResolvedDefMacro(Expr):
+    name: str
+    params: List[str]
+    body: Expr
+    depth: int
+
+
+@dataclass
+class ResolvedGlobalIs(Expr):
+    name: str
+    value: Any = field(compare=False)
+    depth: int = 0
+
+
+@dataclass
+class ResolvedQuasiquote(Expr):
+    template: Expr
+    # The unquoted expressions in the order ``expandQuasiquote`` visits them
+    holes: List[Expr]
+
+
+@dataclass
+class Fail(Expr):
+    error: type[LambError]
+    message: str
+
+
+class _Scope:
+    """Compile-time view of one runtime frame."""
+
+    def __init__(
+        self,
+        names: list[str],
+        parent: Optional[_Scope],
+        checked: set[str],
+        mutable: Iterable[str] = (),
+        function: Optional[_Closure] = None,
+    ) -> None:
+        self.slots = {name: idx for idx, name in enumerate(names, start=1)}
+        self.parent = parent
+        self.checked = checked
+        # Set on the frame of a lambda, whose parent is the closure environment
+        self.function = function
+        # Slots that can change after the frame is created
+        self.mutable = {self.slots[name] for name in mutable}
+        # Mutable slots captured by a closure, which hold a cell
+        self.cells: set[int] = set()
+        # References to each mutable slot, marked if it becomes a cell
+        self.refs: dict[int, list[LocalRef]] = {}
+
+    def with_checked(self, checked: set[str]) -> _Scope:
+        """The same frame, with a different set of names needing checks."""
+        view = copy(self)
+        view.checked = checked
+        return view
+
+    def ref(self, name: str, depth: int, slot: int) -> LocalRef:
+        ref = LocalRef(name, depth, slot, name in self.checked, slot in self.cells)
+        if slot in self.mutable:
+            self.refs.setdefault(slot, []).append(ref)
+        return ref
+
+    def share(self, name: str, depth: int, slot: int) -> tuple[Expr, bool]:
+        """What a closure captures for ``slot``, and whether it is a cell."""
+        if slot not in self.mutable:
+            return self.ref(name, depth, slot), False
+        if slot not in self.cells:
+            self.cells.add(slot)
+            for ref in self.refs.get(slot, []):
+                ref.cell = True
+        # The slot itself holds the cell
+        return LocalRef(name, depth, slot), True
+
+
+class _Closure:
+    """Compile-time view of the environment of a lambda's closures.
+
+    Variables of enclosing scopes are captured on first use.  A variable that
+    cannot change is copied; one that can (a ``define`` or ``letrec``
+    binding) is moved into a cell that the closure shares with its scope.
+    """
+
+    def __init__(self, scope: Optional[_Scope]) -> None:
+        # Where the lambda is created
+        self.scope = scope
+        self.captures: list[Expr] = [_atGlobals(FrameRef(0), scope)]
+        self.slots: dict[str, int] = {}
+        self.cells: set[int] = set()
+        self.checked: set[str] = set()
+        # Nodes holding the distance to the globals from inside the lambda,
+        # one frame further once the environment is a list
+        self.fixups: list[
+            Union[GlobalRef, FrameRef, ResolvedDefMacro, ResolvedGlobalIs]
+        ] = []
+
+    def ref(self, name: str, depth: int, slot: int) -> LocalRef:
+        return LocalRef(name, depth, slot, name in self.checked, slot in self.cells)
+
+    def share(self, name: str, depth: int, slot: int) -> tuple[Expr, bool]:
+        if slot in self.cells:
+            return LocalRef(name, depth, slot), True
+        return self.ref(name, depth, slot), False
+
+    def capture(self, name: str) -> Optional[int]:
+        """The environment slot for ``name``, or ``None`` for a global."""
+        slot = self.slots.get(name)
+        if slot is None:
+            found = _find(name, self.scope)
+            if found is None:
+                return None
+            depth, outer_slot, owner = found
+            capture, cell = owner.share(name, depth, outer_slot)
+            slot = len(self.captures)
+            self.captures.append(capture)
+            self.slots[name] = slot
+            if cell:
+                self.cells.add(slot)
+                if name in owner.checked:
+                    self.checked.add(name)
+        return slot
+
+
+_GlobalsNode = TypeVar(
+    "_GlobalsNode", GlobalRef, FrameRef, ResolvedDefMacro, ResolvedGlobalIs
+)
+
+
+def _atGlobals(node: _GlobalsNode, scope: Optional[_Scope]) -> _GlobalsNode:
+    """Set ``node.depth`` to the distance from ``scope`` to the globals."""
+    depth = 0
+    while scope is not None:
+        if scope.function is not None:
+            scope.function.fixups.append(node)
+            depth += 1
+            break
+        scope = scope.parent
+        depth += 1
+    node.depth = depth
+    return node
+
+
+def _find(
+    name: str, scope: Optional[_Scope]
+) -> Optional[tuple[int, int, Union[_Scope, _Closure]]]:
+    """Where ``name`` is bound: ``(depth, slot, owner)``, or ``None``."""
+    depth = 0
+    while scope is not None:
+        slot = scope.slots.get(name)
+        if slot is not None:
+            return depth, slot, scope
+        if scope.function is not None:
+            slot = scope.function.capture(name)
+            return None if slot is None else (depth + 1, slot, scope.function)
+        scope = scope.parent
+        depth += 1
+    return None
+
+
+def _lookup(name: str, scope: Optional[_Scope]) -> Ref:
+    found = _find(name, scope)
+    if found is None:
+        return _atGlobals(GlobalRef(name, 0), scope)
+    depth, slot, owner = found
+    return owner.ref(name, depth, slot)
+
+
+def _scope_defines(exprs: list[Expr]) -> list[str]:
+    """Names bound by ``define`` directly within a scope (not nested lambdas)."""
+    found: list[str] = []
+
+    def walk(expr: Expr) -> None:
+        if isinstance(expr, DefineExpr):
+            found.append(expr.name)
+            walk(expr.value)
+        elif isinstance(expr, IfExpr):
+            walk(expr.cond)
+            walk(expr.then_branch)
+            walk(expr.else_branch)
+        elif isinstance(expr, Application):
+            walk(expr.func)
+            for arg in expr.args:
+                walk(arg)
+        elif isinstance(expr, LetExpr):
+            walk(expr.value)
+
+    for expr in exprs:
+        walk(expr)
+    return list(dict.fromkeys(found))
+
+
+def lambResolve(expr: Expr) -> Expr:
+    """Resolve a top-level expression, evaluated in the global environment."""
+    return _resolve(expr, None)
+
+
+def lambResolveFunction(params: List[str], body: Expr) -> ResolvedLambda:
+    """Resolve ``(lambda params... . body)`` for a closure over the globals."""
+    return _resolveLambda(params, body, None)
+
+
+def _resolve(expr: Expr, scope: Optional[_Scope]) -> Expr:
+    return _resolvers[type(expr)](expr, scope)
+
+
+def _resolveUnknown(expr: Expr, scope: Optional[_Scope]) -> Expr:
+    return Fail(EvalError, f"Unknown expression type: {expr}")
+
+
+_resolvers: TypeDispatch[Expr] = TypeDispatch(_resolveUnknown)
+
+
+@_resolvers.register(Variable)
+def _resolveVariable(expr: Variable, scope: Optional[_Scope]) -> Expr:
+    return _lookup(expr.name, scope)
+
+
+@_resolvers.register(Application)
+def _resolveApplication(expr: Application, scope: Optional[_Scope]) -> Expr:
+    func = expr.func
+    # ``((lambda x. body) value)``, which the ``let`` and ``begin`` macros
+    # expand to, binds the values in a new frame instead of calling a closure
+    if (
+        isinstance(func, Abstraction)
+        and len(expr.args) == len(func.params)
+        and len(set(func.params)) == len(func.params)
+    ):
+        return _resolveBindings(func.params, expr.args, [func.body], scope)
+    return Application(
+        _resolve(expr.func, scope), [_resolve(a, scope) for a in expr.args]
+    )
+
+
+@_resolvers.register(Literal, QuoteExpr)
+def _resolveConstant(expr: Expr, scope: Optional[_Scope]) -> Expr:
+    return expr
+
+
+@_resolvers.register(Abstraction)
+def _resolveAbstraction(expr: Abstraction, scope: Optional[_Scope]) -> Expr:
+    return _resolveLambda(expr.params, expr.body, scope)
+
+
+@_resolvers.register(IfExpr)
+def _resolveIf(expr: IfExpr, scope: Optional[_Scope]) -> Expr:
+    return IfExpr(
+        _resolve(expr.cond, scope),
+        _resolve(expr.then_branch, scope),
+        _resolve(expr.else_branch, scope),
+    )
+
+
+@_resolvers.register(DefineExpr)
+def _resolveDefine(expr: DefineExpr, scope: Optional[_Scope]) -> Expr:
+    target = _lookup(expr.name, scope)
+    value = _resolve(expr.value, scope)
+    if isinstance(value, ResolvedLambda):
+        _markSelfTailCalls(value, target)
+    return ResolvedDefine(expr.name, target, value)
+
+
+@_resolvers.register(QuasiQuoteExpr)
+def _resolveQuasiquoteExpr(expr: QuasiQuoteExpr, scope: Optional[_Scope]) -> Expr:
+    return _resolveQuasiquote(expr.expr, scope)
+
+
+@_resolvers.register(GlobalIs)
+def _resolveGlobalIs(expr: GlobalIs, scope: Optional[_Scope]) -> Expr:
+    return _atGlobals(ResolvedGlobalIs(expr.name, expr.value), scope)
+
+
+@_resolvers.register(DefMacroExpr)
+def _resolveDefMacro(expr: DefMacroExpr, scope: Optional[_Scope]) -> Expr:
+    return _atGlobals(ResolvedDefMacro(expr.name, expr.params, expr.body, 0), scope)
+
+
+def _resolveBody(bodies: list[Expr], scope: _Scope) -> list[Expr]:
+    return [_resolve(body, scope) for body in bodies]
+
+
+def _resolveLambda(
+    params: List[str], body: Expr, scope: Optional[_Scope]
+) -> ResolvedLambda:
+    assigned = _scope_defines([body])
+    defines = [n for n in assigned if n not in params]
+    closure = _Closure(scope)
+    inner = _Scope(params + defines, None, set(defines), assigned, closure)
+    resolved = _resolve(body, inner)
+    if len(closure.captures) > 1:
+        # The globals are behind the list of captured variables
+        for node in closure.fixups:
+            node.depth += 1
+    return ResolvedLambda(
+        params,
+        resolved,
+        len(defines),
+        body,
+        captures=closure.captures,
+        cells=sorted(inner.cells),
+    )
+
+
+@_resolvers.register(LetExpr)
+def _resolveLet(expr: LetExpr, scope: Optional[_Scope]) -> Expr:
+    return _resolveBindings([expr.name], [expr.value], expr.body, scope)
+
+
+def _resolveBindings(
+    names: List[str], values: List[Expr], bodies: List[Expr], scope: Optional[_Scope]
+) -> ResolvedLet:
+    """Resolve ``bodies`` in a new frame binding each of ``names`` to a value."""
+    assigned = _scope_defines(bodies)
+    defines = [n for n in assigned if n not in names]
+    inner = _Scope(names + defines, scope, set(defines), assigned)
+    resolved = [_resolve(value, scope) for value in values]
+    body = _resolveBody(bodies, inner)
+    return ResolvedLet(resolved, body, len(inner.slots), sorted(inner.cells))
+
+
+@_resolvers.register(LetRec)
+def _resolveLetRec(expr: LetRec, scope: Optional[_Scope]) -> Expr:
+    names = list(dict.fromkeys(name for name, _ in expr.bindings))
+    rhs = [value for _, value in expr.bindings]
+    defines = [n for n in _scope_defines(rhs + expr.body) if n not in names]
+    inner = _Scope(names + defines, scope, set(names) | set(defines), names + defines)
+    bindings = [
+        (inner.slots[name], _resolve(value, inner)) for name, value in expr.bindings
+    ]
+    for (slot, value), (name, _) in zip(bindings, expr.bindings):
+        if isinstance(value, ResolvedLambda):
+            _markSelfTailCalls(value, LocalRef(name, 0, slot))
+    # Every binding is initialised once the body runs
+    body = _resolveBody(expr.body, inner.with_checked(set(defines)))
+    return ResolvedLetRec(
+        bindings, body, len(inner.slots), len(names), sorted(inner.cells)
+    )
+
+
+def _markSelfTailCalls(fn: ResolvedLambda, binding: Ref) -> None:
+    """Turn tail calls in ``fn`` to ``binding`` into ``SelfTailCall`` nodes.
+
+    ``binding`` is the reference to the function's name from the scope where
+    it is bound.  Only calls passing every parameter, in tail position of the
+    body itself (not of a nested ``let``, which has a frame of its own), are
+    marked.  The loop reuses the frame, so a body that creates closures, which
+    could capture the frame, is left alone.
+    """
+    if _createsClosures(fn.body):
+        return
+    nparams = len(fn.params)
+
+    def isSelf(func: Expr) -> bool:
+        if isinstance(binding, GlobalRef):
+            return isinstance(func, GlobalRef) and func.name == binding.name
+        # A local binding is captured by the closure, in a cell
+        if not (isinstance(func, LocalRef) and func.depth == 1 and func.cell):
+            return False
+        captured = fn.captures[func.slot]
+        return (
+            isinstance(captured, LocalRef)
+            and captured.depth == binding.depth
+            and captured.slot == binding.slot
+        )
+
+    def mark(expr: Expr) -> Expr:
+        if isinstance(expr, IfExpr):
+            return IfExpr(expr.cond, mark(expr.then_branch), mark(expr.else_branch))
+        if (
+            isinstance(expr, Application)
+            and len(expr.args) == nparams
+            and isSelf(expr.func)
+        ):
+            fn.loops = True
+            return SelfTailCall(cast(Ref, expr.func), expr.args)
+        return expr
+
+    fn.body = mark(fn.body)
+
+
+def _createsClosures(expr: Expr) -> bool:
+    """Whether evaluating a resolved expression can create a closure."""
+    if isinstance(expr, ResolvedLambda):
+        return True
+    if isinstance(expr, Application):
+        return _createsClosures(expr.func) or any(map(_createsClosures, expr.args))
+    if isinstance(expr, IfExpr):
+        return any(
+            map(_createsClosures, (expr.cond, expr.then_branch, expr.else_branch))
+        )
+    if isinstance(expr, ResolvedDefine):
+        return _createsClosures(expr.value)
+    if isinstance(expr, ResolvedLet):
+        return any(map(_createsClosures, expr.values + expr.body))
+    if isinstance(expr, ResolvedLetRec):
+        return any(_createsClosures(value) for _, value in expr.bindings) or any(
+            map(_createsClosures, expr.body)
+        )
+    if isinstance(expr, ResolvedQuasiquote):
+        return any(map(_createsClosures, expr.holes))
+    return False
+
+
+def _resolveQuasiquote(template: Expr, scope: Optional[_Scope]) -> Expr:
+    from .evaluator import expandQuasiquote
+
+    holes: list[Expr] = []
+
+    def record(hole: Expr) -> Value:
+        holes.append(hole)
+        return nil
+
+    expanded = expandQuasiquote(template, record)
+    if not holes:
+        # Nothing to fill in: build the data once and share it
+        return QuoteExpr(expanded)
+    return ResolvedQuasiquote(template, [_resolve(h, scope) for h in holes])
@@ -1,22 +1,34 @@
 """Run a .lamb source file."""
 
 import sys
+from collections import Counter
 from pathlib import Path
-from typing import Optional
+from typing import NoReturn, Optional
 
+from .astmodule import Expr
 from .builtinsmodule import lambMakeTopEnv
 from .errors import LambError, format_lamb_error
 from .evaluator import lambEval, trampoline
-from .macro import lambMacroExpand
-from .parser import lambParseAll
-from .tokenizer import lambTokenize
-from .values import nil, valueToString
+from .jit import setJitMode
+from .lambcache import lambCachedForms
+from .lazydefs import lambLoadLazily
+from .optimize import formatOptStats, lambOptimize
+from .values import Value, nil, valueToString
 
 ENV = lambMakeTopEnv()
 
 
-def load_std(stdlib_path: Optional[Path] = None) -> None:
-    """Load the standard library into the environment."""
+def _evaluate(expr: Expr, engine: str, env: dict[str, Value] = ENV) -> Value:
+    """Evaluate a macro-expanded top-level expression with ``engine``."""
+    if engine == "vm":
+        from .vm import vmEval
+
+        return vmEval(expr, env)
+    return trampoline(lambEval(expr, env, is_tail=True))
+
+
+def std_path(stdlib_path: Optional[Path] = None) -> Optional[Path]:
+    """The standard library file to load, warning if ``stdlib_path`` is missing."""
     if stdlib_path is None:
         std = Path(__file__).with_suffix("").parent / "stdlib" / "std.lamb"
     else:
@@ -31,13 +43,56 @@ def load_std(stdlib_path: Optional[Path] = None) -> None:
             print("Falling back to built-in standard library...", file=sys.stderr)
             std = Path(__file__).with_suffix("").parent / "stdlib" / "std.lamb"
         if not std.exists():
-            return
+            return None
+    return std
+
+
+def _show(out: Value) -> None:
+    """Print a top-level result the user should see."""
+    # Only print user-visible results.  Definitions like `(define x …)`
+    # evaluate to a sentinel string such as "<defined x>" which we do
+    # not want to show to the end-user (and tests explicitly assert
+    # that nothing is printed in that case).  Anything that is *not*
+    # nil and does *not* start with "<defined " should be displayed.
+    if out is not nil and not (isinstance(out, str) and out.startswith("<defined ")):
+        print(valueToString(out))
+
+
+def _abort(err: Exception) -> NoReturn:
+    """Report an error raised while running a program, and exit."""
+    if isinstance(err, LambError):
+        print(format_lamb_error(err), file=sys.stderr)
+    else:
+        print(f"Unexpected error: {err}", file=sys.stderr)
+        print(
+            "Tip: This might be a bug in Lambdora. Please report it.", file=sys.stderr
+        )
+    sys.exit(1)
+
+
+def load_std(
+    stdlib_path: Optional[Path] = None,
+    engine: str = "tree",
+    opt_level: int = 0,
+    opt_stats: Optional[Counter[str]] = None,
+) -> None:
+    """Load the standard library into the environment.
+
+    Each form is optimized at ``opt_level`` (see ``optimize.lambOptimize``),
+    counting the rewrites in ``opt_stats`` when given.  Definitions of
+    functions are optimized and evaluated when their names are first looked
+    up (see ``lazydefs.lambLoadLazily``).
+    """
+    std = std_path(stdlib_path)
+    if std is None:
+        return
+
+    def load(exp: Expr) -> Value:
+        return _evaluate(lambOptimize(exp, ENV, opt_level, opt_stats), engine)
+
     try:
-        tokens = lambTokenize(std.read_text(encoding="utf-8"))
-        for e in lambParseAll(tokens):
-            exp = lambMacroExpand(e, ENV)
-            if exp is not None:
-                trampoline(lambEval(exp, ENV, is_tail=True))
+        forms = lambCachedForms(std, std.read_text(encoding="utf-8"), ENV)
+        lambLoadLazily(forms, ENV, load)
     except LambError as err:
         print(
             f"Error loading standard library: {format_lamb_error(err)}", file=sys.stderr
@@ -45,13 +100,37 @@ def load_std(stdlib_path: Optional[Path] = None) -> None:
         sys.exit(1)
 
 
-def run_file(path: Path, stdlib_path: Optional[Path] = None) -> None:
-    """Execute a Lambdora script file."""
+def run_file(
+    path: Path,
+    stdlib_path: Optional[Path] = None,
+    engine: str = "tree",
+    opt_level: int = 0,
+    opt_report: bool = False,
+    jit: str = "auto",
+    image: Optional[Path] = None,
+    save_image: Optional[Path] = None,
+) -> None:
+    """Execute a Lambdora script file with the given evaluation ``engine``.
+
+    Forms are optimized at ``opt_level``; with ``opt_report`` the number of
+    rewrites made is printed to stderr at the end.  ``jit`` is the mode given
+    to ``setJitMode()``.  The environment is loaded from ``image`` instead of
+    the standard library when given, and saved to ``save_image`` at the end.
+    """
+    setJitMode(jit)
+    opt_stats: Counter[str] = Counter()
     # Load the standard library first. We guard this call so that *any* unexpected
     # error coming from stdlib loading is reported consistently and terminates
     # the process with the same exit semantics the tests expect.
     try:
-        load_std(stdlib_path)
+        if image is not None:
+            from .image import lambLoadImage
+
+            lambLoadImage(image, ENV, engine)
+        else:
+            load_std(stdlib_path, engine, opt_level, opt_stats)
+    except LambError as err:
+        _abort(err)
     except Exception as e:  # pragma: no cover – unexpected failures should abort
         print(f"Unexpected error while loading standard library: {e}", file=sys.stderr)
         print(
@@ -68,30 +147,30 @@ def run_file(path: Path, stdlib_path: Optional[Path] = None) -> None:
         sys.exit(1)
 
     try:
-        tokens = lambTokenize(content)
-        for expr in lambParseAll(tokens):
-            exp = lambMacroExpand(expr, ENV)
-            if exp is None:
-                continue
-            out = trampoline(lambEval(exp, ENV, is_tail=True))
-            # Only print user-visible results.  Definitions like `(define x …)`
-            # evaluate to a sentinel string such as "<defined x>" which we do
-            # not want to show to the end-user (and tests explicitly assert
-            # that nothing is printed in that case).  Anything that is *not*
-            # nil and does *not* start with "<defined " should be displayed.
-            if out is not nil and not (
-                isinstance(out, str) and out.startswith("<defined ")
-            ):
-                print(valueToString(out))
-    except LambError as err:
-        print(format_lamb_error(err), file=sys.stderr)
-        sys.exit(1)
-    except Exception as e:
-        print(f"Unexpected error: {e}", file=sys.stderr)
-        print(
-            "Tip: This might be a bug in Lambdora. Please report it.", file=sys.stderr
-        )
-        sys.exit(1)
+        for exp in lambCachedForms(path, content, ENV):
+            _show(_evaluate(lambOptimize(exp, ENV, opt_level, opt_stats), engine))
+        if opt_report:
+            print(formatOptStats(opt_stats), file=sys.stderr)
+        if save_image is not None:
+            from .image import lambSaveImage
+
+            lambSaveImage(ENV, save_image, engine)
+    except Exception as err:
+        _abort(err)
+
+
+def run_forms(forms: list[Expr], engine: str = "tree") -> None:
+    """Run forms that are already macro-expanded, as ``lambdora build`` emits.
+
+    They run in a fresh global environment without the standard library: a
+    built module includes the definitions it uses among its forms.
+    """
+    env = lambMakeTopEnv()
+    try:
+        for form in forms:
+            _show(_evaluate(form, engine, env))
+    except Exception as err:
+        _abort(err)
 
 
 def main() -> None:
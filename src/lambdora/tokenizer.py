@@ -1,9 +1,75 @@
-"""Tokenizer for Lambdora source code (returns ``list[str]``)."""
+"""Tokenizer for Lambdora source code.
+
+``lambTokenize()`` returns the tokens as a ``Tokens``, a ``list[str]`` that
+also records where in the source each token starts.
+"""
 
 from __future__ import annotations
 
+import re
+from array import array
+from itertools import accumulate, compress, islice
+
 from .errors import TokenizeError
 
+# Tokens the scanners below match.  Identifiers starting with other than an
+# ASCII letter, and integers followed by a non-ASCII character, are left to
+# ``_scanOther()``, as ``str.isalpha()`` and ``str.isdigit()`` have no exact
+# regex equivalent.
+_TOKEN = r"""
+    \+\+ | != | <= | >=
+    | [().+\-*/%=<>',`]
+    | [A-Za-z_][\w-]*
+    | [0-9]+(?![0-9\x80-\U0010ffff])
+    | "[^"]*"
+"""
+
+# Splits a source into what lies between tokens and comments, and the tokens
+# and comments themselves, in turn
+_SPLITTER = re.compile(rf"( ;[^\n]* | {_TOKEN} )", re.VERBOSE)
+
+# One token with the whitespace and comments before it.  Group 1 is the
+# token; group 2 a character that starts none of them.
+_SCANNER = re.compile(
+    rf"""
+    (?: \s+ | ;[^\n]* )*
+    (?: ( {_TOKEN} ) | (.) )?
+    """,
+    re.VERBOSE,
+)
+
+# The rest of an identifier: ``str.isalnum()``, ``_`` or ``-``
+_IDENT_REST = re.compile(r"[\w-]*")
+
+
+class Tokens(list[str]):
+    """The tokens of a source, with the offset each starts at.
+
+    ``offsets[i]`` is where ``self[i]`` starts in ``source``, kept in an array
+    beside the list rather than in an object per token, so that the parser
+    can report where an error is without scanning the source again.
+    """
+
+    __slots__ = ("source", "filename", "offsets")
+
+    def __init__(self, source: str, filename: str | None = None) -> None:
+        super().__init__()
+        self.source = source
+        self.filename = filename
+        self.offsets = array("q")
+
+    def location(self, index: int) -> tuple[int, int, str]:
+        """The line, column and text of the line of token ``index``.
+
+        An index past the last token is the end of the source.
+        """
+        source = self.source
+        offset = self.offsets[index] if index < len(self) else len(source)
+        line, column = _position(source, offset)
+        end = source.find("\n", offset)
+        text = source[offset - column + 1 : len(source) if end < 0 else end]
+        return line, column, text
+
 
 def _line_at(src: str, line_no: int) -> str:
     """Return the given 1-based line from *src*."""
@@ -11,114 +77,92 @@ def _line_at(src: str, line_no: int) -> str:
     return src.splitlines()[line_no - 1]
 
 
-def lambTokenize(source: str, *, filename: str | None = None) -> list[str]:
+def _position(source: str, offset: int) -> tuple[int, int]:
+    """The 1-based line and column of ``offset``."""
+    line_start = source.rfind("\n", 0, offset) + 1
+    return source.count("\n", 0, line_start) + 1, offset - line_start + 1
+
+
+def lambTokenize(source: str, *, filename: str | None = None) -> Tokens:
     """Tokenise *source*. *filename* is used only in error messages."""
 
-    tokens: list[str] = []
-    i = 0  # absolute index into *source*
-    line_no = 1
-    col_no = 1  # 1-based column index
-
-    while i < len(source):
-        char = source[i]
-
-        # Newline
-        if char == "\n":
-            i += 1
-            line_no += 1
-            col_no = 1
-            continue
-
-        # Skip ';' comments
-        if char == ";":
-            while i < len(source) and source[i] != "\n":
-                i += 1
-                col_no += 1
-            continue  # newline (if any) handled on next loop iteration
-
-        # Whitespace
-        if char.isspace():
-            i += 1
-            col_no += 1
-            continue
-
-        # Multi-char operators (check before single-char tokens)
-        if i + 1 < len(source):
-            two_char = source[i : i + 2]
-            if two_char in ["++", "!=", "<=", ">="]:
-                tokens.append(two_char)
-                i += 2
-                col_no += 2
-                continue
-
-        # Single-char tokens
-        if char in "().+-*/%=<>',`":
-            tokens.append(char)
-            i += 1
-            col_no += 1
-            continue
-
-        # Identifiers
-        if char.isalpha() or char == "_":
-            start = i
-            while i < len(source) and (
-                source[i].isalnum() or source[i] == "_" or source[i] == "-"
-            ):
-                i += 1
-                col_no += 1
-            tokens.append(source[start:i])
-            continue
-
-        # Integers
-        if char.isdigit():
-            start = i
-            while i < len(source) and source[i].isdigit():
-                i += 1
-                col_no += 1
-            tokens.append(source[start:i])
-            continue
-
-        # Strings
-        if char == '"':
-            i += 1
-            col_no += 1
-            start_idx = i
-            str_line, str_col = line_no, col_no
-
-            while i < len(source) and source[i] != '"':
-                if source[i] == "\n":
-                    line_no += 1
-                    col_no = 0  # will be incremented at end of loop
-                i += 1
-                col_no += 1
-
-            if i >= len(source):  # reached EOF
-                snippet = _line_at(source, str_line)
-                raise TokenizeError(
-                    "Unterminated string literal",
-                    file=filename,
-                    line=str_line,
-                    column=str_col,
-                    snippet=snippet,
-                )
-
-            # Slice out the contents (excluding the quotes)
-            literal = source[start_idx:i]
-            tokens.append(f'"{literal}"')
-
-            # Skip the closing quote
-            i += 1
-            col_no += 1
-            continue
-
-        # Unknown char
-        snippet = _line_at(source, line_no)
+    tokens = Tokens(source, filename)
+    parts = _SPLITTER.split(source)
+    between = "".join(parts[0::2])
+    if between and not between.isspace():
+        # Something the pattern does not cover: scanned token by token
+        _scan(tokens, filename)
+        return tokens
+    found = parts[1::2]
+    # Each token or comment starts where the text before it ends
+    starts = islice(accumulate(map(len, parts)), 0, len(parts) - 1, 2)
+    if ";" in source:
+        keep = [part[0] != ";" for part in found]
+        tokens.extend(compress(found, keep))
+        tokens.offsets.extend(compress(starts, keep))
+    else:
+        tokens.extend(found)
+        tokens.offsets.extend(starts)
+    return tokens
+
+
+def _scan(tokens: Tokens, filename: str | None) -> None:
+    """Add the tokens of ``tokens.source`` one at a time."""
+    source = tokens.source
+    append = tokens.append
+    add_offset = tokens.offsets.append
+    pos = 0
+    while True:
+        for m in _SCANNER.finditer(source, pos):
+            kind = m.lastindex
+            if kind == 1:
+                append(m[1])
+                add_offset(m.start(1))
+            elif kind == 2:
+                pos = m.start(2)
+                break
+        else:
+            return
+        # Resume scanning after a token the pattern does not cover
+        end = _scanOther(source, pos, filename)
+        append(source[pos:end])
+        add_offset(pos)
+        pos = end
+
+
+def _scanOther(source: str, pos: int, filename: str | None) -> int:
+    """The end of the token at ``pos``, which the scanner did not match."""
+    char = source[pos]
+
+    # Identifiers
+    if char.isalpha() or char == "_":
+        return _IDENT_REST.match(source, pos + 1).end()  # type: ignore[union-attr]
+
+    # Integers
+    if char.isdigit():
+        pos += 1
+        while pos < len(source) and source[pos].isdigit():
+            pos += 1
+        return pos
+
+    # Strings
+    if char == '"':
+        # Reported at the first character of the literal
+        str_line, str_col = _position(source, pos + 1)
         raise TokenizeError(
-            f"Unexpected character: {char}",
+            "Unterminated string literal",
             file=filename,
-            line=line_no,
-            column=col_no,
-            snippet=snippet,
+            line=str_line,
+            column=str_col,
+            snippet=_line_at(source, str_line),
         )
 
-    return tokens
+    # Unknown char
+    line_no, col_no = _position(source, pos)
+    raise TokenizeError(
+        f"Unexpected character: {char}",
+        file=filename,
+        line=line_no,
+        column=col_no,
+        snippet=_line_at(source, line_no),
+    )
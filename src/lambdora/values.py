@@ -1,25 +1,120 @@
 """Runtime value representations used by the interpreter."""
 
-from dataclasses import dataclass
-from typing import Callable, List, Union
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
 
 from .astmodule import Expr
+from .dispatch import TypeDispatch
 
 Value = Union[
-    int, str, bool, "Closure", "Builtin", "Pair", "Nil", "Macro", "Thunk", Expr
+    int,
+    str,
+    bool,
+    "Closure",
+    "Builtin",
+    "Pair",
+    "Nil",
+    "Macro",
+    "Thunk",
+    "TailCall",
+    Expr,
 ]
 
 
+# A lexical scope at run time: ``[parent, slot1, slot2, ...]``.  Slots are
+# assigned by ``resolver.py``; the chain of parents ends in the global
+# environment, a ``dict`` (usually ``Globals``) shared by every closure.
+Frame = List[Any]
+
+Env = Union[Frame, Dict[str, Value]]
+
+# Compiled form of an expression: ``code(env, is_tail) -> Value``
+Code = Callable[[Env, bool], Value]
+
+
+class Globals(Dict[str, Value]):
+    """A global environment that can bind some names on first lookup.
+
+    ``pending`` maps a name that is not bound yet to a function binding it.
+    Looking the name up with ``env[name]`` pops and calls that function
+    first.  Only subscripting does: ``name in env`` and ``env.get(name)`` see
+    the names bound so far, so that macro expansion, which tries every
+    applied name, loads nothing.  ``loading`` counts the names being bound.
+    """
+
+    __slots__ = ("pending", "loading")
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.pending: Dict[str, Callable[[], object]] = {}
+        self.loading = 0
+
+    def __missing__(self, name: str) -> Value:
+        load = self.pending.pop(name, None)
+        if load is None:
+            raise KeyError(name)
+        self.loading += 1
+        try:
+            load()
+        finally:
+            self.loading -= 1
+        return dict.__getitem__(self, name)
+
+    def loadAll(self) -> None:
+        """Bind every pending name not bound since it was deferred."""
+        while self.pending:
+            name = next(iter(self.pending))
+            if name in self:
+                del self.pending[name]
+            else:
+                self[name]
+
+    def clear(self) -> None:
+        super().clear()
+        self.pending.clear()
+
+
 @dataclass
 class Closure:
     param: str
     body: Expr
-    env: dict[str, Value]
+    env: Env
+    code: Optional[Code] = field(default=None, repr=False, compare=False)
+    # Parameters after the first, for a multi-parameter lambda
+    rest_params: List[str] = field(default_factory=list)
+    # Arguments already supplied by a partial application
+    args: Tuple["Value", ...] = ()
+
+    @property
+    def params(self) -> List[str]:
+        return [self.param, *self.rest_params]
+
+    @property
+    def arity(self) -> int:
+        """Number of arguments still needed to run the body."""
+        return 1 + len(self.rest_params) - len(self.args)
 
 
 @dataclass
 class Builtin:
-    func: Callable[[Value], Value]
+    # Called with ``arity`` arguments once a call supplies them all
+    func: Callable[..., Value]
+    arity: int = 1
+    # Arguments already supplied by a partial application
+    args: Tuple["Value", ...] = ()
+    # Validates an argument when it is held for a partial application, so a
+    # bad argument is reported at once rather than when the call completes
+    check: Optional[Callable[["Value"], object]] = field(default=None, repr=False)
+    # Fold further arguments in one at a time: (+ a b c) is (+ (+ a b) c)
+    variadic: bool = False
+    # No side effects and a result that depends only on the arguments, so the
+    # optimizer may make a call on constants ahead of time
+    pure: bool = False
+    # The operator the builtin applies to two integers, which code generated
+    # by ``jit.py`` may use in its place
+    int_op: Optional[Callable[[int, int], "Value"]] = field(default=None, repr=False)
+    # The global ``lambMakeTopEnv()`` binds it to, by which ``image.py`` saves it
+    name: str = field(default="", repr=False, compare=False)
 
 
 @dataclass
@@ -39,6 +134,18 @@ class Thunk:
     func: Callable[[], Value]
 
 
+@dataclass(slots=True)
+class TailCall:
+    """A call in tail position, left for the caller's trampoline to make.
+
+    The function and its arguments are already evaluated, so the pending call
+    needs no Python closure to capture them.
+    """
+
+    func: Value
+    args: List[Value]
+
+
 class Nil:
     def __repr__(self) -> str:
         return "nil"
@@ -47,34 +154,64 @@ class Nil:
 nil = Nil()
 
 
+def _unknownToString(val: Value) -> str:
+    return f"<unknown value: {val}>"
+
+
+_toString: TypeDispatch[str] = TypeDispatch(_unknownToString)
+
+
 def valueToString(val: Value) -> str:
-    if isinstance(val, Closure):
-        return f"<closure lambda {val.param}. …>"
-    elif isinstance(val, bool):
-        return "true" if val else "false"
-    elif isinstance(val, int):
-        return str(val)
-    elif isinstance(val, str):
-        return f"{val}"
-    elif isinstance(val, Builtin):
-        return "<builtin fn>"
-    elif isinstance(val, Pair):
-        # Print as (a b c)
-        elems = []
-        p: Value = val
-        while isinstance(p, Pair):
-            elems.append(valueToString(p.head))
-            p = p.tail
-        if p is not nil:
-            elems.append(".")
-            elems.append(valueToString(p))
-        return f"({' '.join(elems)})"
-    elif val is nil:
-        return "nil"
-    elif isinstance(val, Expr):
-        # Handle AST nodes as values (code as data)
-        from .printer import lambPrint
+    return _toString[type(val)](val)
+
+
+@_toString.register(Closure)
+def _closureToString(val: Closure) -> str:
+    return f"<closure lambda {' '.join(val.params[len(val.args):])}. …>"
+
+
+@_toString.register(bool)
+def _boolToString(val: bool) -> str:
+    return "true" if val else "false"
+
+
+@_toString.register(int)
+def _intToString(val: int) -> str:
+    return str(val)
+
+
+@_toString.register(str)
+def _strToString(val: str) -> str:
+    return f"{val}"
+
+
+@_toString.register(Builtin)
+def _builtinToString(val: Builtin) -> str:
+    return "<builtin fn>"
+
+
+@_toString.register(Pair)
+def _pairToString(val: Pair) -> str:
+    # Print as (a b c)
+    elems = []
+    p: Value = val
+    while isinstance(p, Pair):
+        elems.append(valueToString(p.head))
+        p = p.tail
+    if p is not nil:
+        elems.append(".")
+        elems.append(valueToString(p))
+    return f"({' '.join(elems)})"
+
+
+@_toString.register(Nil)
+def _nilToString(val: Nil) -> str:
+    return "nil"
+
+
+@_toString.register(Expr)
+def _exprToString(val: Expr) -> str:
+    # Handle AST nodes as values (code as data)
+    from .printer import lambPrint
 
-        return lambPrint(val)
-    else:
-        return f"<unknown value: {val}>"
+    return lambPrint(val)
@@ -0,0 +1,599 @@
+"""Bytecode compiler and stack-based virtual machine for Lambdora.
+
+This is an alternative to the closure-compiling tree evaluator in
+``evaluator.py``.  Expressions are compiled into ``CodeObject``s holding a flat
+list of ``op, arg`` pairs plus a constant pool.  The VM runs them in a single
+loop with its own value and call stacks, so neither tail nor non-tail calls
+consume Python stack frames.
+
+Variables are resolved by ``resolver.py`` before compilation, so frames have
+the same ``[parent, slot1, ...]`` layout as in the tree evaluator: local
+variables are read by ``(depth, slot)`` address and everything else is looked
+up in the global environment dictionary at run time.  A closure's environment
+holds only the variables its body uses, ``[None, captured...]``, or is
+``None`` when it uses none; the globals are not reached through frames.
+"""
+
+from __future__ import annotations
+
+import sys
+from dataclasses import dataclass, field, replace
+from pathlib import Path
+from typing import Any, Optional, Union
+
+from .astmodule import Application, Expr, IfExpr, Literal, QuoteExpr
+from .errors import EvalError, LambError, RecursionInitError
+from .evaluator import (
+    _REC_PLACEHOLDER,
+    _UNBOUND,
+    _callBuiltin,
+    _storeGlobal,
+    expandQuasiquote,
+)
+from .parser import lambLower
+from .resolver import (
+    Fail,
+    GlobalRef,
+    LocalRef,
+    Ref,
+    ResolvedDefine,
+    ResolvedDefMacro,
+    ResolvedGlobalIs,
+    ResolvedLambda,
+    ResolvedLet,
+    ResolvedLetRec,
+    ResolvedQuasiquote,
+    SelfTailCall,
+    lambResolve,
+)
+from .values import Builtin, Closure, Frame, Macro, Value, nil
+
+# Opcodes
+CONST = 0  # push consts[arg]
+LOAD_LOCAL = 1  # push slot (arg & 0xFFFF) of the frame ``arg >> 16`` levels up
+LOAD_CHECKED = 2  # like LOAD_LOCAL via checks[arg], rejecting unset slots
+LOAD_GLOBAL = 3  # push env[names[arg]]
+STORE_LOCAL = 4  # pop into a frame slot (same encoding as LOAD_LOCAL)
+STORE_GLOBAL = 5  # pop into env[names[arg]]
+POP = 6  # discard the top of the stack
+JUMP = 7  # continue at offset arg
+BRANCH = 8  # pop a condition; jump to arg when false
+MAKE_CLOSURE = 9  # pop the captured variables, push a closure for consts[arg]
+CALL = 10  # call with arg arguments
+TAIL_CALL = 11  # call with arg arguments, replacing the current activation
+RETURN = 12  # return the top of the stack to the caller
+ENTER = 13  # push a scope: arg >> 16 letrec slots, arg & 0xFFFF slots in total
+LEAVE = 14  # pop the innermost scope
+QUASIQUOTE = 15  # pop holes, instantiate the template in consts[arg]
+DEFMACRO = 16  # bind the macro described by consts[arg]
+FAIL = 17  # raise the (error type, message) pair in consts[arg]
+SELF_TAIL_CALL = 18  # TAIL_CALL that restarts the current function if it is called
+LOAD_CELL = 19  # push the contents of the cell at checks[arg], rejecting unset ones
+STORE_CELL = 20  # pop into a cell (same encoding as LOAD_LOCAL)
+BOX = 21  # move slot arg of the current frame into a new cell
+GLOBAL_IS = 22  # push whether env[name] is value, for (name, value) in consts[arg]
+
+OPNAMES = [
+    "CONST",
+    "LOAD_LOCAL",
+    "LOAD_CHECKED",
+    "LOAD_GLOBAL",
+    "STORE_LOCAL",
+    "STORE_GLOBAL",
+    "POP",
+    "JUMP",
+    "BRANCH",
+    "MAKE_CLOSURE",
+    "CALL",
+    "TAIL_CALL",
+    "RETURN",
+    "ENTER",
+    "LEAVE",
+    "QUASIQUOTE",
+    "DEFMACRO",
+    "FAIL",
+    "SELF_TAIL_CALL",
+    "LOAD_CELL",
+    "STORE_CELL",
+    "BOX",
+    "GLOBAL_IS",
+]
+
+
+@dataclass
+class CodeObject:
+    """Compiled bytecode for a top-level expression or a lambda body."""
+
+    name: str
+    ops: list[int] = field(default_factory=list)
+    consts: list[Any] = field(default_factory=list)
+    names: list[str] = field(default_factory=list)
+    # (depth, slot, name) for LOAD_CHECKED and LOAD_CELL
+    checks: list[tuple[int, int, str]] = field(default_factory=list)
+    # Slots needed beyond the parameters (names bound by ``define``)
+    nlocals: int = 0
+    # Values MAKE_CLOSURE takes from the stack for the closure environment
+    ncaptures: int = 0
+    params: list[str] = field(default_factory=list)
+    body: Optional[Expr] = None
+
+
+class _Compiler:
+    def __init__(self, code: CodeObject) -> None:
+        self.code = code
+        self.ops = code.ops
+
+    def emit(self, op: int, arg: int = 0) -> int:
+        self.ops.extend((op, arg))
+        return len(self.ops) - 1
+
+    def const(self, value: Any) -> int:
+        consts = self.code.consts
+        for idx, existing in enumerate(consts):
+            if existing is value or (
+                type(existing) is type(value)
+                and isinstance(value, (int, str))
+                and existing == value
+            ):
+                return idx
+        consts.append(value)
+        return len(consts) - 1
+
+    def name(self, name: str) -> int:
+        names = self.code.names
+        if name not in names:
+            names.append(name)
+        return names.index(name)
+
+    def fail(self, error: type[LambError], message: str) -> None:
+        self.emit(FAIL, self.const((error, message)))
+
+    def ret(self, tail: bool) -> None:
+        if tail:
+            self.emit(RETURN)
+
+    # -- resolved expressions -----------------------------------------------
+
+    def expr(self, node: Expr, tail: bool) -> None:
+        if isinstance(node, LocalRef):
+            if node.cell or node.checked:
+                self.code.checks.append((node.depth, node.slot, node.name))
+                op = LOAD_CELL if node.cell else LOAD_CHECKED
+                self.emit(op, len(self.code.checks) - 1)
+            else:
+                self.emit(LOAD_LOCAL, node.depth << 16 | node.slot)
+        elif isinstance(node, GlobalRef):
+            self.emit(LOAD_GLOBAL, self.name(node.name))
+        elif isinstance(node, Application):
+            self.expr(node.func, False)
+            for arg in node.args:
+                self.expr(arg, False)
+            self.emit(TAIL_CALL if tail else CALL, len(node.args))
+            # A tail call to a builtin leaves its result on the stack
+        elif isinstance(node, SelfTailCall):
+            self.expr(node.func, False)
+            for arg in node.args:
+                self.expr(arg, False)
+            self.emit(SELF_TAIL_CALL, len(node.args))
+        elif isinstance(node, Literal):
+            self.emit(CONST, self.const(node.const))
+        elif isinstance(node, IfExpr):
+            self.branch(node, tail)
+            return
+        elif isinstance(node, ResolvedLambda):
+            # The first capture is the globals, which the VM does not need
+            for capture in node.captures[1:]:
+                self.expr(capture, False)
+            self.emit(MAKE_CLOSURE, self.const(vmCompileFunction(node)))
+        elif isinstance(node, ResolvedLet):
+            for value in node.values:
+                self.expr(value, False)
+            self.emit(ENTER, node.nslots)
+            for slot in range(len(node.values), 0, -1):
+                self.emit(STORE_LOCAL, slot)
+            self.box(node.cells)
+            self.body(node.body, tail)
+            return
+        elif isinstance(node, ResolvedLetRec):
+            self.emit(ENTER, node.nrec << 16 | node.nslots)
+            self.box(node.cells)
+            for slot, rhs in node.bindings:
+                self.expr(rhs, False)
+                self.emit(STORE_CELL if slot in node.cells else STORE_LOCAL, slot)
+            self.body(node.body, tail)
+            return
+        elif isinstance(node, ResolvedDefine):
+            self.expr(node.value, False)
+            self.store(node.target)
+            self.emit(CONST, self.const(f"<defined {node.name}>"))
+        elif isinstance(node, QuoteExpr):
+            self.emit(CONST, self.const(node.value))
+        elif isinstance(node, ResolvedQuasiquote):
+            for hole in node.holes:
+                self.expr(hole, False)
+            self.emit(QUASIQUOTE, self.const((node.template, len(node.holes))))
+        elif isinstance(node, ResolvedGlobalIs):
+            self.emit(GLOBAL_IS, self.const((node.name, node.value)))
+        elif isinstance(node, ResolvedDefMacro):
+            self.emit(DEFMACRO, self.const((node.name, node.params, node.body)))
+        elif isinstance(node, Fail):
+            self.fail(node.error, node.message)
+            return
+        else:
+            self.fail(EvalError, f"Unknown expression type: {node}")
+            return
+        self.ret(tail)
+
+    def store(self, ref: Ref) -> None:
+        if isinstance(ref, GlobalRef):
+            self.emit(STORE_GLOBAL, self.name(ref.name))
+        else:
+            op = STORE_CELL if ref.cell else STORE_LOCAL
+            self.emit(op, ref.depth << 16 | ref.slot)
+
+    def box(self, cells: list[int]) -> None:
+        for slot in cells:
+            self.emit(BOX, slot)
+
+    def branch(self, node: IfExpr, tail: bool) -> None:
+        self.expr(node.cond, False)
+        to_else = self.emit(BRANCH)
+        self.expr(node.then_branch, tail)
+        to_end = -1 if tail else self.emit(JUMP)
+        self.ops[to_else] = len(self.ops)
+        self.expr(node.else_branch, tail)
+        if to_end >= 0:
+            self.ops[to_end] = len(self.ops)
+
+    def body(self, bodies: list[Expr], tail: bool) -> None:
+        for idx, body in enumerate(bodies):
+            last = idx == len(bodies) - 1
+            self.expr(body, tail and last)
+            if not last:
+                self.emit(POP)
+        if not bodies:
+            self.emit(CONST, self.const(nil))
+            self.ret(tail)
+        if not tail:
+            self.emit(LEAVE)
+
+
+def vmCompile(expr: Expr) -> CodeObject:
+    """Compile a top-level expression into bytecode."""
+    code = CodeObject("<toplevel>")
+    _Compiler(code).expr(lambResolve(lambLower(expr)), True)
+    return code
+
+
+def vmCompileFunction(fn: ResolvedLambda) -> CodeObject:
+    """Compile the body of a resolved lambda."""
+    code = CodeObject(
+        f"<lambda {' '.join(fn.params)}>",
+        nlocals=fn.nlocals,
+        ncaptures=len(fn.captures) - 1,
+        params=fn.params,
+        body=fn.source,
+    )
+    compiler = _Compiler(code)
+    compiler.box(fn.cells)
+    compiler.expr(fn.body, True)
+    return code
+
+
+def vmRun(code: CodeObject, env: dict[str, Value]) -> Value:
+    """Execute top-level ``code`` against the global environment ``env``."""
+    stack: list[Value] = []
+    push = stack.append
+    pop = stack.pop
+    # Saved activations: (code, pc, frame, pending arguments)
+    calls: list[tuple[CodeObject, int, Optional[Frame], tuple[Value, ...]]] = []
+    frame: Optional[Frame] = None
+    pending: tuple[Value, ...] = ()
+    ops = code.ops
+    consts = code.consts
+    pc = 0
+
+    while True:
+        op = ops[pc]
+        arg = ops[pc + 1]
+        pc += 2
+
+        if op == LOAD_LOCAL:
+            if arg < 0x10000:
+                # Depth 0: the current frame
+                push(frame[arg])  # type: ignore[index]
+                continue
+            f = frame
+            depth = arg >> 16
+            while depth:
+                f = f[0]  # type: ignore[index]
+                depth -= 1
+            push(f[arg & 0xFFFF])  # type: ignore[index]
+            continue
+        if op == LOAD_GLOBAL:
+            name = code.names[arg]
+            try:
+                push(env[name])
+            except KeyError:
+                raise EvalError(f"unbound variable: {name}") from None
+            continue
+        if op == CONST:
+            push(consts[arg])
+            continue
+        if op == BRANCH:
+            cond = pop()
+            if cond is False:
+                pc = arg
+            elif cond is not True:
+                raise EvalError("if condition must be boolean")
+            continue
+        if op == CALL or op == TAIL_CALL:
+            if arg == 1:
+                args: list[Value] = [pop()]
+            elif arg:
+                args = stack[-arg:]
+                del stack[-arg:]
+            else:
+                args = []
+            func = pop()
+            if type(func) is Builtin and (
+                len(args) <= func.arity - len(func.args) or func.variadic
+            ):
+                push(_callBuiltin(func, args))
+                continue
+        elif op == RETURN:
+            value = pop()
+            if pending and isinstance(value, Closure) and len(pending) >= value.arity:
+                # Remaining arguments of the current call
+                func = value
+                args = list(pending)
+                pending = ()
+            else:
+                if pending and isinstance(value, Closure):
+                    # Too few left to run it: the result is a partial application
+                    value = replace(value, args=(*value.args, *pending))
+                if not calls:
+                    return value
+                code, pc, frame, pending = calls.pop()
+                ops = code.ops
+                consts = code.consts
+                push(value)
+                continue
+        elif op == SELF_TAIL_CALL:
+            args = stack[-arg:]
+            del stack[-arg:]
+            func = pop()
+            if (
+                type(func) is Closure
+                and func.code is code  # type: ignore[comparison-overlap]
+                and func.env is frame[0]  # type: ignore[index]
+                and not func.args
+            ):
+                # Rebind the parameters in place and restart the body
+                frame[1 : arg + 1] = args  # type: ignore[index]
+                if code.nlocals:
+                    frame[arg + 1 :] = [_UNBOUND] * code.nlocals  # type: ignore[index]
+                pc = 0
+                continue
+            op = TAIL_CALL
+        elif op == LOAD_CHECKED or op == LOAD_CELL:
+            depth, slot, name = code.checks[arg]
+            f = frame
+            while depth:
+                f = f[0]  # type: ignore[index]
+                depth -= 1
+            val = f[slot]  # type: ignore[index]
+            if op == LOAD_CELL:
+                val = val[0]
+            if val is _REC_PLACEHOLDER:
+                raise RecursionInitError(
+                    f"recursive binding '{name}' accessed before initialisation"
+                )
+            if val is _UNBOUND:
+                raise EvalError(f"unbound variable: {name}")
+            push(val)
+            continue
+        elif op == MAKE_CLOSURE:
+            fn = consts[arg]
+            params = fn.params
+            captured: Optional[Frame] = None
+            if fn.ncaptures:
+                captured = [None, *stack[-fn.ncaptures :]]
+                del stack[-fn.ncaptures :]
+            push(Closure(params[0], fn.body, captured, fn, params[1:]))  # type: ignore
+            continue
+        elif op == JUMP:
+            pc = arg
+            continue
+        elif op == POP:
+            pop()
+            continue
+        elif op == STORE_LOCAL:
+            f = frame
+            depth = arg >> 16
+            while depth:
+                f = f[0]  # type: ignore[index]
+                depth -= 1
+            f[arg & 0xFFFF] = pop()  # type: ignore[index]
+            continue
+        elif op == STORE_CELL:
+            f = frame
+            depth = arg >> 16
+            while depth:
+                f = f[0]  # type: ignore[index]
+                depth -= 1
+            f[arg & 0xFFFF][0] = pop()  # type: ignore[index]
+            continue
+        elif op == BOX:
+            frame[arg] = [frame[arg]]  # type: ignore[index]
+            continue
+        elif op == STORE_GLOBAL:
+            _storeGlobal(env, code.names[arg], pop())
+            continue
+        elif op == ENTER:
+            frame = [frame, *[_REC_PLACEHOLDER] * (arg >> 16)]
+            frame.extend([_UNBOUND] * ((arg & 0xFFFF) - len(frame) + 1))
+            continue
+        elif op == LEAVE:
+            frame = frame[0]  # type: ignore[index]
+            continue
+        elif op == QUASIQUOTE:
+            template, count = consts[arg]
+            holes = iter(stack[len(stack) - count :])
+            del stack[len(stack) - count :]
+            push(expandQuasiquote(template, lambda _: next(holes)))
+            continue
+        elif op == GLOBAL_IS:
+            name, value = consts[arg]
+            push(env.get(name) is value)
+            continue
+        elif op == DEFMACRO:
+            name, params, body = consts[arg]
+            _storeGlobal(env, name, Macro(params, body))
+            push("<macro defined>")
+            continue
+        elif op == FAIL:
+            error, message = consts[arg]
+            raise error(message)
+        else:  # pragma: no cover - the compiler only emits known opcodes
+            raise EvalError(f"vm: bad opcode {op}")
+
+        # Call sequence shared by CALL, TAIL_CALL and RETURN with pending args
+        if isinstance(func, Builtin):
+            need = func.arity - len(func.args)
+            if len(args) <= need or func.variadic:
+                push(_callBuiltin(func, args))
+                continue
+            # A closure result, such as a memoized function may return, takes
+            # the rest of the arguments
+            result = _callBuiltin(func, args[:need])
+            if not isinstance(result, Closure):
+                push(
+                    _callBuiltin(result, args[need:])
+                    if isinstance(result, Builtin)
+                    else result
+                )
+                continue
+            func = result
+            args = args[need:]
+        if isinstance(func, Closure):
+            need = func.arity
+            if len(args) < need:
+                # Partial application (or no arguments at all)
+                push(replace(func, args=(*func.args, *args)) if args else func)
+                continue
+            if op == CALL:
+                calls.append((code, pc, frame, pending))
+                pending = ()
+            code = func.code  # type: ignore[assignment]
+            ops = code.ops
+            consts = code.consts
+            pc = 0
+            # One frame binds every parameter: [env, *earlier args, *new args]
+            if len(args) == need and not func.args:
+                frame = [func.env, *args]
+            else:
+                frame = [func.env, *func.args, *args[:need]]
+                pending = (*args[need:], *pending)
+            if code.nlocals:
+                frame.extend([_UNBOUND] * code.nlocals)
+        elif isinstance(func, Macro):
+            raise EvalError(
+                "tried to apply a macro as a function - macro expansion failed"
+            )
+        else:
+            raise EvalError("tried to apply a non-function value")
+
+
+def vmEval(expr: Expr, env: dict[str, Value]) -> Value:
+    """Compile ``expr`` and run it on the VM."""
+    return vmRun(vmCompile(expr), env)
+
+
+def vmApply(func: Value, args: list[Value], env: dict[str, Value]) -> Value:
+    """Call ``func`` with ``args`` on the VM, from Python."""
+    code = CodeObject("<call>", consts=[func, *args])
+    for idx in range(len(args) + 1):
+        code.ops += (CONST, idx)
+    code.ops += (TAIL_CALL, len(args), RETURN, 0)
+    return vmRun(code, env)
+
+
+def disassemble(code: CodeObject) -> str:
+    """Return a human-readable listing of ``code`` and any nested functions."""
+    lines: list[str] = []
+    nested: list[CodeObject] = []
+    header = f"Disassembly of {code.name}"
+    if code.nlocals:
+        header += f" ({code.nlocals} local{'s' if code.nlocals != 1 else ''})"
+    lines.append(header + ":")
+    for pc in range(0, len(code.ops), 2):
+        op, arg = code.ops[pc], code.ops[pc + 1]
+        line = f"{pc:6d} {OPNAMES[op]:<15} {arg:<6} {_describe(code, op, arg)}"
+        lines.append(line.rstrip())
+        if op == MAKE_CLOSURE:
+            nested.append(code.consts[arg])
+    listing = "\n".join(lines).rstrip()
+    for fn in nested:
+        listing += "\n\n" + disassemble(fn)
+    return listing
+
+
+def _describe(code: CodeObject, op: int, arg: int) -> str:
+    if op == CONST:
+        value = code.consts[arg]
+        return f"({_show(value)})"
+    if op in (LOAD_LOCAL, STORE_LOCAL, STORE_CELL):
+        return f"(depth {arg >> 16}, slot {arg & 0xFFFF})"
+    if op == BOX:
+        return f"(slot {arg})"
+    if op in (LOAD_CHECKED, LOAD_CELL):
+        depth, slot, name = code.checks[arg]
+        return f"({name}: depth {depth}, slot {slot})"
+    if op in (LOAD_GLOBAL, STORE_GLOBAL):
+        return f"({code.names[arg]})"
+    if op == ENTER:
+        return f"({arg & 0xFFFF} slots)"
+    if op in (JUMP, BRANCH):
+        return f"(to {arg})"
+    if op == MAKE_CLOSURE:
+        return f"({code.consts[arg].name})"
+    if op == QUASIQUOTE:
+        template, count = code.consts[arg]
+        return f"(`{_show(template)}, {count} holes)"
+    if op in (DEFMACRO, GLOBAL_IS):
+        return f"({code.consts[arg][0]})"
+    if op == FAIL:
+        error, message = code.consts[arg]
+        return f"({error.__name__}: {message})"
+    return ""
+
+
+def _show(expr: Union[Expr, Value]) -> str:
+    from .printer import lambPrint
+
+    return lambPrint(expr) if isinstance(expr, Expr) else repr(expr)
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    """Print the bytecode of each top-level form in a .lamb file."""
+    from .builtinsmodule import lambMakeTopEnv
+    from .macro import lambMacroExpand
+    from .parser import lambParseAll
+    from .tokenizer import lambTokenize
+
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 1:
+        print("Usage: python -m lambdora.vm <file.lamb>", file=sys.stderr)
+        sys.exit(1)
+    env = lambMakeTopEnv()
+    tokens = lambTokenize(Path(argv[0]).read_text(encoding="utf-8"))
+    for expr in lambParseAll(tokens):
+        expanded = lambMacroExpand(expr, env)
+        if expanded is not None:
+            print(disassemble(vmCompile(expanded)))
+            print()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,11 @@
+import os
+
 import pytest
 
-from lambdora.repl import load_std
+# Tests that use the expansion cache turn it back on themselves
+os.environ["LAMBDORA_NO_CACHE"] = "1"
+
+from lambdora.repl import load_std  # noqa: E402
 
 
 @pytest.fixture(autouse=True, scope="session")
@@ -0,0 +1,64 @@
+"""Tests for compiling programs into Python modules."""
+
+import runpy
+
+import pytest
+
+from lambdora.build import lambBuild
+from lambdora.errors import ParseError
+
+
+def build_and_run(tmp_path, src, capsys, **options):
+    program = tmp_path / "prog.lamb"
+    program.write_text(src)
+    module = lambBuild(program, **options)
+    runpy.run_path(str(module), run_name="__main__")
+    return module, capsys.readouterr().out.splitlines()
+
+
+def test_built_module_runs_the_program(tmp_path, capsys):
+    src = (
+        '(define greet (lambda s. (++ "hi " s)))\n'
+        '(print (greet "123"))\n'
+        "(defmacro twice (x) `(+ ,x ,x))\n"
+        "(twice 21)\n"
+        "(quote (a 1))\n"
+        "(letrec ((f (lambda n. (if (= n 0) 0 (f (- n 1)))))) (f 3))"
+    )
+    module, out = build_and_run(tmp_path, src, capsys)
+    assert module == tmp_path / "prog_lamb.py"
+    assert out == ["hi 123", "42", "(a 1)", "0"]
+    text = module.read_text()
+    # Macros are expanded and the standard library is not parsed at run time
+    assert "twice" not in text and "defmacro" not in text
+
+
+def test_only_used_definitions_are_included(tmp_path, capsys):
+    src = "(print (length (map (lambda x. (* x x)) (range 4))))"
+    module, out = build_and_run(tmp_path, src, capsys)
+    assert out == ["4"]
+    text = module.read_text()
+    assert "DefineExpr('map'" in text and "DefineExpr('length'" in text
+    # Needed by range, not named by the program
+    assert "DefineExpr('rangeHelper'" in text
+    assert "DefineExpr('filter'" not in text
+
+
+def test_build_optimizes(tmp_path, capsys):
+    src = "(define + -)\n(print (+ 5 (* 2 3)))\n(print (+ 5 1))"
+    module, out = build_and_run(tmp_path, src, capsys, opt_level=1)
+    assert out == ["-1", "4"]
+    text = module.read_text()
+    # Folded before + was redefined, not after
+    assert "Literal('6', 6)" in text and "Literal('5', 5), Literal('1', 1)" in text
+
+
+def test_build_output_path_and_errors(tmp_path):
+    program = tmp_path / "prog.lamb"
+    program.write_text("(print 1)")
+    output = tmp_path / "out" / "custom.py"
+    output.parent.mkdir()
+    assert lambBuild(program, output) == output and output.exists()
+    program.write_text("(print 1")
+    with pytest.raises(ParseError):
+        lambBuild(program)
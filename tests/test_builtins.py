@@ -238,3 +238,35 @@ def test_builtin_recursive_functions():
     """
     result = runExpression(even_odd_code)
     assert result is True
+
+
+def test_builtin_arity_and_partial_application():
+    from lambdora.builtinsmodule import lambMakeTopEnv
+    from lambdora.errors import BuiltinError
+    from lambdora.evaluator import applyFunc
+    from lambdora.values import Builtin
+
+    env = lambMakeTopEnv()
+    assert env["+"].arity == 2 and env["head"].arity == 1
+    add1 = applyFunc(env["+"], [1])
+    assert isinstance(add1, Builtin) and add1.args == (1,)
+    assert applyFunc(add1, [2]) == 3
+    # The partial application is shared, not consumed
+    assert applyFunc(add1, [41]) == 42
+    assert runExpression("(map (* 3) (cons 1 (cons 2 nil)))") == Pair(3, Pair(6, nil))
+    assert runExpression("((cons 1) nil)") == Pair(1, nil)
+    # A bad argument is reported when it is passed, not when the call completes
+    with pytest.raises(BuiltinError, match="Expected integer"):
+        runExpression("(+ true)")
+    with pytest.raises(BuiltinError, match="Expected boolean"):
+        runExpression("(and 1)")
+
+
+def test_variadic_builtins():
+    assert runExpression("(+ 1 2 3 4)") == 10
+    assert runExpression("(- 10 1 2)") == 7
+    assert runExpression("(* 2 3 4)") == 24
+    assert runExpression('(++ "a" "b" "c")') == "abc"
+    assert runExpression("((+ 1) 2 3)") == 6
+    with pytest.raises(TypeError, match="Expected integer"):
+        runExpression("(+ 1 2 true)")
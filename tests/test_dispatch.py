@@ -0,0 +1,55 @@
+"""Tests for the type-indexed dispatch table."""
+
+from lambdora.astmodule import Expr, Literal, Variable
+from lambdora.dispatch import TypeDispatch
+
+
+class Base:
+    pass
+
+
+class Child(Base):
+    pass
+
+
+def test_register_and_call():
+    table = TypeDispatch(lambda node, *args: "default")
+
+    @table.register(Variable)
+    def on_variable(node, suffix):
+        return node.name + suffix
+
+    assert on_variable(Variable("x"), "!") == "x!"
+    assert table(Variable("x"), "?") == "x?"
+    assert table[Variable] is on_variable
+
+
+def test_register_several_types():
+    table = TypeDispatch(lambda node: "default")
+    table.register(int, str)(lambda node: "atom")
+    assert table(1) == "atom"
+    assert table("a") == "atom"
+    assert table(1.5) == "default"
+
+
+def test_subclasses_use_nearest_base():
+    table = TypeDispatch(lambda node: "default")
+    table.register(Base)(lambda node: "base")
+    table.register(Expr)(lambda node: "expr")
+    assert table(Child()) == "base"
+    assert table(Literal("1")) == "expr"
+    # The resolved handler is cached under the subclass
+    assert Child in table
+
+
+def test_bool_can_differ_from_int():
+    table = TypeDispatch(lambda node: "default")
+    table.register(int)(lambda node: "int")
+    table.register(bool)(lambda node: "bool")
+    assert table(1) == "int"
+    assert table(True) == "bool"
+
+
+def test_default_for_unregistered_types():
+    table = TypeDispatch(lambda node: f"no handler for {type(node).__name__}")
+    assert table(object()) == "no handler for object"
@@ -5,7 +5,7 @@ from lambdora.astmodule import Application, Literal, Variable, DefineExpr, IfExp
 from lambdora.builtinsmodule import lambMakeTopEnv
 from lambdora.evaluator import applyFunc, lambEval, trampoline
 from lambdora.repl import run_expr as runExpression
-from lambdora.values import Closure, Pair, Thunk
+from lambdora.values import Closure, Pair, TailCall, Thunk
 from lambdora.errors import EvalError
 
 # Basic evaluation and arithmetic
@@ -154,10 +154,14 @@ def test_recursive_evaluation():
 
 def test_tail_call_optimization():
     env = lambMakeTopEnv()
-    abs_expr = Application(Variable("lambda"), [Literal("x"), Variable("x")])
-    app = Application(abs_expr, [Literal("5")])
+    abs_expr = Application(Variable("lambda"), [Literal("x"), Literal("."), Variable("x")])
+    env["ident"] = lambEval(abs_expr, env)
+    app = Application(Variable("ident"), [Literal("5")])
     result = lambEval(app, env, is_tail=True)
-    assert isinstance(result, Thunk)
+    assert isinstance(result, TailCall)
+    assert result.args == [5]
+    # An immediately applied lambda binds its argument without a call
+    assert lambEval(Application(abs_expr, [Literal("5")]), env, is_tail=True) == 5
 
 def test_literal_parameter_evaluation():
     result = runExpression("((lambda 42 . 100) 5)")
@@ -290,4 +294,195 @@ def test_quasiquote_with_define():
 def test_quasiquote_with_defmacro():
     result = runExpression("(quasiquote (defmacro test (x) x))")
     from lambdora.astmodule import DefMacroExpr
-    assert isinstance(result, DefMacroExpr) 
\ No newline at end of file
+    assert isinstance(result, DefMacroExpr) 
+# Closure compilation
+
+def test_compile_returns_reusable_code():
+    from lambdora.evaluator import lambCompile
+    env = lambMakeTopEnv()
+    code = lambCompile(Application(Variable("+"), [Literal("1"), Literal("2")]))
+    assert code(env, False) == 3
+    assert code(env, False) == 3
+
+def test_closure_keeps_compiled_body():
+    result = runExpression("(lambda x. (+ x 1))")
+    assert isinstance(result, Closure)
+    assert callable(result.code)
+    assert applyFunc(result, [41]) == 42
+
+def test_compile_reports_syntax_errors_at_load_time():
+    from lambdora.evaluator import lambCompile
+    with pytest.raises(SyntaxError, match="if requires condition, then, else"):
+        lambCompile(Application(Variable("if"), [Literal("1")]))
+    # A malformed form inside a lambda body fails when it is defined
+    with pytest.raises(EvalError, match="quote requires exactly one argument"):
+        runExpression("(define broken (lambda x. (quote)))")
+
+def test_compiled_tail_call_returns_pending_call():
+    from lambdora.parser import lambParse
+    from lambdora.tokenizer import lambTokenize
+    env = lambMakeTopEnv()
+    lambEval(lambParse(lambTokenize("(define inc (lambda x. (+ x 1)))")), env)
+    app = Application(Variable("inc"), [Literal("2")])
+    result = lambEval(app, env, is_tail=True)
+    assert isinstance(result, TailCall)
+    assert trampoline(result) == 3
+    # A builtin cannot grow the stack, so a tail call to one runs at once
+    app = Application(Variable("+"), [Literal("1"), Literal("2")])
+    assert lambEval(app, env, is_tail=True) == 3
+
+def test_tail_loop_inside_non_tail_call():
+    import sys
+    runExpression("""
+    (define countUp (lambda n. (lambda acc.
+      (if (= n 0) acc (countUp (- n 1) (+ acc 1))))))
+    """)
+    # The loop is an argument, so it is not in tail position itself
+    depth = sys.getrecursionlimit() * 2
+    assert runExpression(f"(+ 1 (countUp {depth} 0))") == depth + 1
+    assert runExpression(f"(length (range {depth}))") == depth
+
+# Multi-parameter lambdas
+
+def test_multi_parameter_lambda_binds_one_frame():
+    add3 = runExpression("(lambda a b c. (+ a (+ b c)))")
+    assert isinstance(add3, Closure)
+    assert add3.params == ["a", "b", "c"]
+    assert applyFunc(add3, [1, 2, 3]) == 6
+    runExpression("(define frameOf (lambda x y. (lambda z. (+ z (+ x y)))))")
+    inner = runExpression("(frameOf 1 2)")
+    assert inner.env[1:] == [1, 2]
+
+def test_multi_parameter_partial_and_extra_arguments():
+    runExpression("(define sub3 (lambda a b c. (- a (+ b c))))")
+    assert runExpression("(sub3 10 2 3)") == 5
+    assert runExpression("(((sub3 10) 2) 3)") == 5
+    assert runExpression("((sub3 10 2) 3)") == 5
+    partial = runExpression("(sub3 10)")
+    assert isinstance(partial, Closure) and partial.args == (10,)
+    # A partial application can be reused
+    runExpression("(define from10 (sub3 10))")
+    assert runExpression("(from10 1 1)") == 8
+    assert runExpression("(from10 2 2)") == 6
+    # Arguments beyond the parameters go to the result
+    assert runExpression("((lambda x y. (lambda z. (+ x (+ y z)))) 1 2 3)") == 6
+
+def test_multi_parameter_lambda_in_let_and_stdlib():
+    assert runExpression("((lambda x y. (let s (+ x y) (* s s))) 2 3)") == 25
+    assert runExpression("(foldl (lambda acc x. (+ acc x)) 0 (range 5))") == 10
+
+# Environment frames
+
+def test_closure_env_is_small_frame():
+    inner = applyFunc(runExpression("(lambda x. (lambda y. (+ x y)))"), [1])
+    # [globals, x]: the closure keeps the variables its body uses
+    assert isinstance(inner.env, list)
+    assert inner.env[1:] == [1]
+    assert isinstance(inner.env[0], dict)
+    assert applyFunc(inner, [2]) == 3
+
+def test_closure_sees_later_global_definitions():
+    runExpression("(define callLater (lambda x. (laterDefined x)))")
+    runExpression("(define laterDefined (lambda x. (* x 10)))")
+    assert runExpression("(callLater 4)") == 40
+
+def test_closures_keep_only_the_variables_they_use():
+    add = runExpression("((lambda big n. (lambda x. (+ x n))) (range 1000) 1)")
+    # The unused list is not kept alive by the closure
+    assert add.env[1:] == [1]
+    assert isinstance(runExpression("(lambda x. 1)").env, dict)
+    # Variables that can still change are shared through a cell
+    src = "(letrec ((x 1) (g (lambda u. x))) (define x 9) (g 0))"
+    assert runExpression(src) == 9
+    src = """
+    (letrec ((ev (lambda n. (if (= n 0) true (od (- n 1)))))
+             (od (lambda n. (if (= n 0) false (ev (- n 1))))))
+      ev)
+    """
+    ev = runExpression(src)
+    assert len(ev.env) == 2 and isinstance(ev.env[1], list)
+    assert applyFunc(ev, [7]) is False
+
+# Literal constants
+
+def test_string_literal_of_digits_stays_string():
+    assert runExpression('"123"') == "123"
+    assert runExpression('(isString "123")') is True
+    assert runExpression("123") == 123
+
+def test_literal_converted_once():
+    lit = Literal("42")
+    assert lit.const == 42
+    assert Literal("hello").const == "hello"
+    assert Literal("42", const="42") != lit
+
+def test_constant_quasiquote_is_shared():
+    runExpression("(define mk (lambda x. (quasiquote (1 2 3))))")
+    a = runExpression("(mk 1)")
+    b = runExpression("(mk 2)")
+    assert a is b
+
+def test_global_call_cache_sees_redefinitions():
+    from lambdora.evaluator import lambCompile
+    from lambdora.parser import lambParse
+    from lambdora.tokenizer import lambTokenize
+
+    def run(src, env):
+        return trampoline(lambEval(lambParse(lambTokenize(src)), env))
+
+    env = lambMakeTopEnv()
+    run("(define h (lambda x. (g x)))", env)
+    run("(define g (lambda x. (+ x 1)))", env)
+    assert run("(h 1)", env) == 2
+    run("(define g (lambda x. (* x 10)))", env)
+    assert run("(h 1)", env) == 10
+    # A cached builtin is replaced by a closure, and back again
+    run("(define sq (lambda x. (+ x x)))", env)
+    assert run("(sq 3)", env) == 6
+    run("(define + (lambda a b. (* a b)))", env)
+    assert run("(sq 3)", env) == 9
+    run("(define + (head (cons * nil)))", env)
+    assert run("(sq 4)", env) == 16
+    # The same compiled code run against another global environment
+    code = lambCompile(lambParse(lambTokenize("(- 10 1)")))
+    other = lambMakeTopEnv()
+    other["-"] = other["+"]
+    assert code(env, False) == 9
+    assert code(other, False) == 11
+    with pytest.raises(EvalError, match="unbound variable: nope"):
+        run("(nope 1)", env)
+
+def test_global_call_cache_in_repl():
+    runExpression("(define cacheTarget (lambda x. x))")
+    runExpression("(define cacheUser (lambda x. (cacheTarget x)))")
+    assert runExpression("(cacheUser 5)") == 5
+    runExpression("(define cacheTarget (lambda x. (+ x 100)))")
+    assert runExpression("(cacheUser 5)") == 105
+
+def test_self_tail_calls_run_as_loops():
+    import sys
+
+    n = sys.getrecursionlimit() * 5
+    runExpression("(define countDown (lambda n acc. (if (= n 0) acc (countDown (- n 1) (+ acc 1)))))")
+    assert runExpression(f"(countDown {n} 0)") == n
+    assert runExpression(f"(letrec ((f (lambda n. (if (= n 0) 0 (f (- n 1)))))) (f {n}))") == 0
+    # Internal defines start out unbound on every iteration
+    src = "(define g (lambda n. (if (= n 0) 0 (if true (g (- n 1)) (define z n)))))"
+    runExpression(src)
+    assert runExpression("(g 5)") == 0
+    # Three parameters, and arguments that read the old values
+    runExpression("(define swap3 (lambda n a b. (if (= n 0) (- a b) (swap3 (- n 1) b a))))")
+    assert runExpression("(swap3 3 10 1)") == -9
+
+def test_self_tail_call_after_redefinition():
+    runExpression("(define spin (lambda n. (if (= n 0) 0 (spin (- n 1)))))")
+    runExpression("(define spinOrig spin)")
+    runExpression("(define spin (lambda n. 42))")
+    # The name no longer holds the running closure: an ordinary call
+    assert runExpression("(spinOrig 3)") == 42
+
+def test_trampoline_runs_tail_calls_and_thunks():
+    env = lambMakeTopEnv()
+    assert trampoline(TailCall(env["+"], [1, 2])) == 3
+    assert trampoline(Thunk(lambda: TailCall(env["-"], [5, 2]))) == 3
+    assert "TailCall" in repr(TailCall(env["+"], [1]))
@@ -0,0 +1,108 @@
+"""Tests for saving and loading environment images."""
+
+import os
+import pickle
+
+import pytest
+
+from lambdora.builtinsmodule import lambMakeTopEnv
+from lambdora.evaluator import lambEval, trampoline
+from lambdora.image import _MAGIC, ImageError, _header, lambLoadImage, lambSaveImage
+from lambdora.macro import lambMacroExpand
+from lambdora.parser import lambParseAll
+from lambdora.runner import run_file
+from lambdora.tokenizer import lambTokenize
+from lambdora.values import Builtin, Macro, valueToString
+from lambdora.vm import vmEval
+
+PROGRAM = """
+(define sq (lambda x. (* x x)))
+(define adder (lambda n. (lambda x. (+ x n))))
+(define add5 (adder 5))
+(define inc (+ 1))
+(define pending (letrec ((later (lambda x. (+ x early))) (early 1)) later))
+(define count (lambda n acc. (if (= n 0) acc (count (- n 1) (+ acc 1)))))
+(defmemo fib (lambda n. (if (< n 2) n (+ (fib (- n 1)) (fib (- n 2))))))
+(defmacro twice (x) `(+ ,x ,x))
+(define % (lambda a b. a))
+"""
+
+CHECKS = [
+    ("(sq 7)", "49"),
+    ("(add5 1)", "6"),
+    ("(inc 4)", "5"),
+    ("(pending 2)", "3"),
+    ("(count 5000 0)", "5000"),
+    ("(fib 40)", "102334155"),
+    ("(twice 4)", "8"),
+    ("(% 7 3)", "7"),
+]
+
+
+def tree_eval(expr, env):
+    return trampoline(lambEval(expr, env, is_tail=True))
+
+
+def run(src, env, evaluate=tree_eval):
+    result = None
+    for expr in lambParseAll(lambTokenize(src)):
+        expanded = lambMacroExpand(expr, env)
+        if expanded is not None:
+            result = evaluate(expanded, env)
+    return result
+
+
+@pytest.mark.parametrize("engine,evaluate", [("tree", tree_eval), ("vm", vmEval)])
+def test_image_round_trip(tmp_path, engine, evaluate):
+    env = lambMakeTopEnv()
+    run(PROGRAM, env, evaluate)
+    image = tmp_path / "env.img"
+    lambSaveImage(env, image, engine)
+    loaded = {"stale": 1}
+    lambLoadImage(image, loaded, engine)
+    assert "stale" not in loaded and isinstance(loaded["twice"], Macro)
+    for src, expected in CHECKS:
+        assert valueToString(run(src, loaded, evaluate)) == expected
+    # Builtins are those of the new environment, and closures use its globals
+    assert loaded["-"] is not env["-"] and loaded["-"].name == "-"
+    assert loaded["add5"].env[0] is (loaded if engine == "tree" else None)
+
+
+def test_images_are_checked(tmp_path):
+    image = tmp_path / "env.img"
+    lambSaveImage(lambMakeTopEnv(), image, "tree")
+    with pytest.raises(ImageError, match="saved by the tree engine, not vm"):
+        lambLoadImage(image, {}, "vm")
+    image.write_bytes(b"not an image")
+    with pytest.raises(ImageError, match="not a Lambdora image"):
+        lambLoadImage(image, {})
+    with pytest.raises(ImageError, match="cannot read image"):
+        lambLoadImage(tmp_path / "missing.img", {})
+    image.write_bytes(_MAGIC + pickle.dumps((1, "x", (0, 0), "tree")))
+    with pytest.raises(ImageError, match="another version"):
+        lambLoadImage(image, {})
+    # Only the interpreter's own types are constructed
+    image.write_bytes(_MAGIC + pickle.dumps(_header("tree")) + pickle.dumps(os.getpid))
+    with pytest.raises(ImageError, match="unexpected object"):
+        lambLoadImage(image, {})
+
+
+def test_unsavable_values(tmp_path):
+    env = lambMakeTopEnv()
+    env["f"] = Builtin(lambda x: x)
+    with pytest.raises(ImageError, match="cannot save image"):
+        lambSaveImage(env, tmp_path / "env.img")
+
+
+def test_run_file_with_images(tmp_path, capsys):
+    program = tmp_path / "prelude.lamb"
+    program.write_text('(define greeting "hello")')
+    image = tmp_path / "prelude.img"
+    run_file(program, save_image=image)
+    script = tmp_path / "script.lamb"
+    script.write_text("(print greeting)\n(print (length (range 3)))")
+    run_file(script, image=image)
+    assert capsys.readouterr().out.splitlines() == ["hello", "3"]
+    with pytest.raises(SystemExit):
+        run_file(script, image=tmp_path / "missing.img")
+    assert "cannot read image" in capsys.readouterr().err
@@ -0,0 +1,146 @@
+"""Tests for the translation of hot functions into Python."""
+
+import pytest
+
+from lambdora import jit
+from lambdora.builtinsmodule import lambMakeTopEnv
+from lambdora.errors import EvalError, RecursionInitError
+from lambdora.evaluator import lambEval, trampoline
+from lambdora.macro import lambMacroExpand
+from lambdora.parser import lambParseAll
+from lambdora.tokenizer import lambTokenize
+from lambdora.values import valueToString
+
+
+@pytest.fixture
+def jit_mode():
+    saved = jit.jitMode()
+    yield jit.setJitMode
+    jit.setJitMode(saved)
+
+
+def run(src, env):
+    result = None
+    for expr in lambParseAll(lambTokenize(src)):
+        expanded = lambMacroExpand(expr, env)
+        if expanded is not None:
+            result = trampoline(lambEval(expanded, env, is_tail=True))
+    return result
+
+
+PROGRAMS = [
+    (
+        "(define loop (lambda i acc. (if (= i 0) acc"
+        " (loop (- i 1) (+ acc (% (* i i) 7))))))",
+        "(loop 1000 0)",
+    ),
+    (
+        "(define fib (lambda n. (if (< n 2) n (+ (fib (- n 1)) (fib (- n 2))))))",
+        "(fib 15)",
+    ),
+    (
+        "(define f (lambda x y. (let a (* x 2) (let b (+ a y) (cons a b)))))",
+        "(f 3 4)",
+    ),
+    (
+        "(define sumTo (lambda n. (letrec ((go (lambda i acc. (if (> i n) acc"
+        " (go (+ i 1) (+ acc i)))))) (go 0 0))))",
+        "(sumTo 100)",
+    ),
+    (
+        "(define count (lambda xs n. (if (isNil xs) n (count (tail xs) (+ n 1)))))",
+        "(count (cons 1 (cons 2 (cons 3 nil))) 0)",
+    ),
+    ('(define greet (lambda s. (++ "hi " s)))', '(greet "you")'),
+]
+
+
+@pytest.mark.parametrize("definition,call", PROGRAMS)
+def test_translated_functions_give_the_same_results(jit_mode, definition, call):
+    results = []
+    for mode in ("off", "on"):
+        jit_mode(mode)
+        env = lambMakeTopEnv()
+        run(definition, env)
+        results.append(valueToString(run(call, env)))
+    assert results[0] == results[1]
+
+
+def test_translation_source(jit_mode):
+    jit_mode("on")
+    env = lambMakeTopEnv()
+    run(PROGRAMS[0][0] + PROGRAMS[0][1], env)
+    source = jit.jitSource(env["loop"])
+    # A self tail call loops; integer builtins become operators
+    assert "continue" in source
+    assert " * " in source and " % " in source
+    # Functions making closures are not translated
+    run("(define adder (lambda n. (lambda x. (+ x n))))", env)
+    assert run("((adder 1) 2)", env) == 3
+    assert jit.jitSource(env["adder"]) is None
+    assert jit.jitSource(env["+"]) is None
+
+
+def test_deeply_nested_bodies_are_not_translated(jit_mode):
+    jit_mode("on")
+    env = lambMakeTopEnv()
+    for name, depth in (("shallow", jit.JIT_MAX_DEPTH), ("deep", 150)):
+        body = "x"
+        for _ in range(depth):
+            body = f"(+ 1 {body})"
+        run(f"(define {name} (lambda x. {body}))", env)
+        assert run(f"({name} 0)", env) == depth
+    # Its source would nest more brackets than Python compiles
+    assert jit.jitSource(env["shallow"]) is not None
+    assert jit.jitSource(env["deep"]) is None
+
+
+def test_auto_mode_waits_for_hot_functions(jit_mode):
+    jit_mode("auto")
+    env = lambMakeTopEnv()
+    run("(define inc (lambda x. (+ x 1)))", env)
+    for n in range(jit.JIT_THRESHOLD - 1):
+        assert run(f"(inc {n})", env) == n + 1
+    assert jit.jitSource(env["inc"]) is None
+    run("(inc 0)", env)
+    assert jit.jitSource(env["inc"]) is not None
+    jit_mode("off")
+    run("(define dec (lambda x. (- x 1)))", env)
+    for n in range(jit.JIT_THRESHOLD):
+        run(f"(dec {n})", env)
+    assert jit.jitSource(env["dec"]) is None
+    with pytest.raises(ValueError):
+        jit.setJitMode("always")
+
+
+def test_redefined_builtins_are_followed(jit_mode):
+    jit_mode("on")
+    env = lambMakeTopEnv()
+    run("(define double (lambda x. (+ x x)))", env)
+    assert run("(double 4)", env) == 8
+    run("(define + (lambda a b. (* a b)))", env)
+    assert run("(double 4)", env) == 16
+    # Later calls keep following the new binding
+    run("(define double2 double)(define double2 double)", env)
+    assert run("(double 5)", env) == 25
+
+
+def test_errors_are_unchanged(jit_mode):
+    jit_mode("on")
+    env = lambMakeTopEnv()
+    run("(define check (lambda x. (if x 1 2)))", env)
+    with pytest.raises(EvalError, match="if condition must be boolean"):
+        run("(check 0)", env)
+    run("(define g (lambda x. (+ x missing)))", env)
+    with pytest.raises(EvalError, match="unbound variable: missing"):
+        run("(g 1)", env)
+    run("(define h (lambda x. (+ x 1)))", env)
+    with pytest.raises(TypeError, match="Expected integer"):
+        run('(h "a")', env)
+
+
+def test_recursive_binding_checked(jit_mode):
+    jit_mode("on")
+    env = lambMakeTopEnv()
+    with pytest.raises(RecursionInitError):
+        run("(letrec ((f (lambda x. (+ x (g 0)))) (g (f 1))) g)", env)
@@ -0,0 +1,86 @@
+"""Tests for the cache of macro-expanded programs."""
+
+from unittest.mock import patch
+
+import pytest
+
+from lambdora.builtinsmodule import lambMakeTopEnv
+from lambdora.evaluator import lambEval, trampoline
+from lambdora.lambcache import cachePath, lambCachedForms
+from lambdora.runner import run_file
+from lambdora.values import Macro
+
+SOURCE = """
+(defmacro twice (x) `(+ ,x ,x))
+(define four (twice 2))
+(letrec ((f (lambda n. (if (= n 0) '(done nil) (f (- n 1)))))) (f 2))
+"""
+
+
+@pytest.fixture(autouse=True)
+def cache_on(monkeypatch):
+    monkeypatch.delenv("LAMBDORA_NO_CACHE", raising=False)
+
+
+def load(path, env=None):
+    env = lambMakeTopEnv() if env is None else env
+    results = [
+        trampoline(lambEval(form, env, is_tail=True))
+        for form in lambCachedForms(path, path.read_text(), env)
+    ]
+    return results, env
+
+
+def test_second_load_uses_the_cache(tmp_path):
+    path = tmp_path / "prog.lamb"
+    path.write_text(SOURCE)
+    first, _ = load(path)
+    assert cachePath(path) == tmp_path / "__lambcache__" / "prog.lambc"
+    assert cachePath(path).exists()
+    with patch("lambdora.lambcache.lambTokenize", side_effect=AssertionError):
+        second, env = load(path)
+    assert first == second
+    assert env["four"] == 4 and isinstance(env["twice"], Macro)
+
+
+def test_changes_invalidate_the_cache(tmp_path):
+    path = tmp_path / "prog.lamb"
+    path.write_text("(define y (double 3))")
+    doubling = "(defmacro double (x) `(* 2 ,x))"
+    adding = "(defmacro double (x) `(+ ,x 1))"
+    macros = tmp_path / "macros.lamb"
+    # The same macros hit the cache; others expand afresh
+    for src, expected in [(doubling, 6), (doubling, 6), (adding, 4)]:
+        macros.write_text(src)
+        _, env = load(macros)
+        assert load(path, env)[1]["y"] == expected
+    # Another source
+    path.write_text("(define y 2)")
+    assert load(path)[1]["y"] == 2
+    # An unreadable cache file is replaced
+    cachePath(path).write_bytes(b"garbage")
+    assert load(path)[1]["y"] == 2
+    with patch("lambdora.lambcache.lambTokenize", side_effect=AssertionError):
+        assert load(path)[1]["y"] == 2
+
+
+def test_uncached_files(tmp_path, monkeypatch):
+    path = tmp_path / "nested.lamb"
+    # The macro is defined while the define is expanded
+    path.write_text("(define f (lambda x. (defmacro m (y) y)))\n(m 5)")
+    assert load(path)[0][-1] == 5
+    assert not cachePath(path).exists()
+    path = tmp_path / "plain.lamb"
+    path.write_text("(+ 1 2)")
+    monkeypatch.setenv("LAMBDORA_NO_CACHE", "1")
+    assert load(path)[0] == [3]
+    assert not cachePath(path).exists()
+
+
+def test_run_file_caches(tmp_path, capsys):
+    path = tmp_path / "prog.lamb"
+    path.write_text(SOURCE + "(print four)")
+    run_file(path)
+    run_file(path)
+    assert capsys.readouterr().out.splitlines() == ["(done nil)", "4"] * 2
+    assert cachePath(path).exists()
@@ -0,0 +1,123 @@
+"""Tests for library definitions evaluated on first lookup."""
+
+from pathlib import Path
+
+import pytest
+
+from lambdora.builtinsmodule import lambMakeTopEnv
+from lambdora.evaluator import lambEval, trampoline
+from lambdora.image import lambLoadImage, lambSaveImage
+from lambdora.jit import setJitMode
+from lambdora.lazydefs import lambLoadLazily
+from lambdora.macro import lambMacroExpand
+from lambdora.optimize import lambOptimize
+from lambdora.parser import lambParseAll
+from lambdora.runner import run_file
+from lambdora.tokenizer import lambTokenize
+from lambdora.values import Closure, Macro, valueToString
+from lambdora.vm import vmEval
+
+STD = Path(__file__).parents[1] / "src" / "lambdora" / "stdlib" / "std.lamb"
+
+
+def tree_eval(expr, env):
+    return trampoline(lambEval(expr, env, is_tail=True))
+
+
+def forms(src, env):
+    for expr in lambParseAll(lambTokenize(src)):
+        expanded = lambMacroExpand(expr, env)
+        if expanded is not None:
+            yield expanded
+
+
+def load(src, evaluate=tree_eval, level=0):
+    env = lambMakeTopEnv()
+    loaded = []
+
+    def evaluate_form(form):
+        loaded.append(getattr(form, "name", None))
+        return evaluate(lambOptimize(form, env, level), env)
+
+    lambLoadLazily(forms(src, env), env, evaluate_form)
+    return env, loaded
+
+
+def run(src, env, evaluate=tree_eval):
+    result = None
+    for form in forms(src, env):
+        result = evaluate(form, env)
+    return result
+
+
+@pytest.mark.parametrize("evaluate", [tree_eval, vmEval])
+def test_definitions_load_on_first_lookup(evaluate):
+    env, loaded = load(STD.read_text(), evaluate)
+    # Macros are defined at once; functions only when used
+    assert loaded == [] and isinstance(env["when"], Macro)
+    assert "map" not in env and "map" in env.pending
+    assert valueToString(run("(length (range 3))", env, evaluate)) == "3"
+    assert sorted(loaded) == ["foldl", "foldlHelper", "length", "range", "rangeHelper"]
+    assert isinstance(env["fact"], Closure) and "map" in env.pending
+    assert valueToString(run("(fact 5)", env, evaluate)) == "120"
+
+
+def test_only_closures_are_deferred():
+    env, loaded = load(
+        "(define f (lambda x. (g x)))\n"
+        "(define g (lambda x. (+ x 1)))\n"
+        "(define three (f 2))\n"
+        "(define g (lambda x. x))\n"
+        "(define + (lambda a b. a))"
+    )
+    # ``three`` needs f and g; the second g then rebinds the first
+    assert loaded == ["three", "f", "g", "g", "+"]
+    assert env["three"] == 3 and run("(f 2)", env) == 2
+    # A later definition replaces a pending one
+    env, loaded = load("(define h (lambda x. 1))\n(define h (lambda x. 2))")
+    assert run("(h 0)", env) == 2 and loaded == ["h"]
+    # Plain dicts load everything in order
+    env = dict(lambMakeTopEnv())
+    lambLoadLazily(forms("(define k (lambda x. x))", env), env, lambda form: None)
+    assert "k" not in env and not hasattr(env, "pending")
+
+
+def test_programs_can_replace_pending_definitions(tmp_path):
+    env, loaded = load("(define sq (lambda x. (* x x)))\n(define f (lambda x. (sq 3)))")
+    run("(define sq (lambda x. x))", env)
+    assert run("(f 0)", env) == 3 and loaded == ["f"]
+    # Saving an image loads what is still pending, but not replaced names
+    lambSaveImage(env, tmp_path / "env.img")
+    assert loaded == ["f"] and not env.pending
+    lambLoadImage(tmp_path / "env.img", env)
+    assert run("(f 0)", env) == 3 and not env.pending
+
+
+def test_optimizing_and_translating_pending_definitions():
+    chain = "\n".join(
+        f"(define f{i} (lambda x. (+ 1 (f{i - 1} x))))" for i in range(1, 50)
+    )
+    env, loaded = load("(define f0 (lambda x. x))\n" + chain, level=2)
+    # The optimizer loads what a program uses and the code it inlines uses,
+    # but not what each definition it loads uses in turn
+    expr = lambOptimize(next(forms("(f49 1)", env)), env, 2)
+    assert loaded[0] == "f49" and len(loaded) < 10
+    assert tree_eval(expr, env) == 50
+    setJitMode("on")
+    try:
+        assert (
+            run("((lambda x. (double (triple x))) 2)", load(STD.read_text())[0]) == 12
+        )
+    finally:
+        setJitMode("auto")
+
+
+def test_run_file_loads_the_stdlib_lazily(tmp_path, capsys):
+    std = tmp_path / "std.lamb"
+    std.write_text(
+        '(define greet (lambda x. (++ "hi " x)))\n(define unused (lambda x. (bad x)))'
+    )
+    program = tmp_path / "prog.lamb"
+    program.write_text('(print (greet "there"))')
+    run_file(program, stdlib_path=std)
+    assert capsys.readouterr().out == "hi there\n"
@@ -1,6 +1,7 @@
 """Tests for the main CLI module."""
 
 import pytest
+import subprocess
 import sys
 from pathlib import Path
 from unittest.mock import patch, MagicMock
@@ -54,12 +55,16 @@ def test_main_repl_command():
             mock_args = MagicMock()
             mock_args.command = "repl"
             mock_args.stdlib_path = None
+            mock_args.opt_level = 0
+            mock_args.image = mock_args.save_image = None
             mock_parser.parse_args.return_value = mock_args
             
             with patch('lambdora.__main__.create_parser', return_value=mock_parser):
                 result = main()
                 assert result == 0
-                mock_repl.assert_called_once_with(stdlib_path=None)
+                mock_repl.assert_called_once_with(
+                    stdlib_path=None, opt_level=0, image=None, save_image=None
+                )
 
 
 def test_main_run_command_success():
@@ -158,12 +163,16 @@ def test_main_with_custom_args():
         mock_args = MagicMock()
         mock_args.command = "repl"
         mock_args.stdlib_path = None
+        mock_args.opt_level = 0
+        mock_args.image = mock_args.save_image = None
         mock_parser.parse_args.return_value = mock_args
         
         with patch('lambdora.__main__.create_parser', return_value=mock_parser):
             result = main(['lambdora', 'repl'])
             assert result == 0
-            mock_repl.assert_called_once_with(stdlib_path=None)
+            mock_repl.assert_called_once_with(
+                    stdlib_path=None, opt_level=0, image=None, save_image=None
+                )
 
 
 def test_main_repl_with_stdlib_path():
@@ -174,12 +183,19 @@ def test_main_repl_with_stdlib_path():
             mock_args = MagicMock()
             mock_args.command = "repl"
             mock_args.stdlib_path = Path("/custom/std.lamb")
+            mock_args.opt_level = 0
+            mock_args.image = mock_args.save_image = None
             mock_parser.parse_args.return_value = mock_args
             
             with patch('lambdora.__main__.create_parser', return_value=mock_parser):
                 result = main()
                 assert result == 0
-                mock_repl.assert_called_once_with(stdlib_path=Path("/custom/std.lamb"))
+                mock_repl.assert_called_once_with(
+                    stdlib_path=Path("/custom/std.lamb"),
+                    opt_level=0,
+                    image=None,
+                    save_image=None,
+                )
 
 
 def test_main_run_with_stdlib_path():
@@ -197,4 +213,124 @@ def test_main_run_with_stdlib_path():
                 with patch('lambdora.__main__.create_parser', return_value=mock_parser):
                     result = main()
                     assert result == 0
-                    mock_run_file.assert_called_once_with(Path("test.lamb"), stdlib_path=Path("/custom/std.lamb")) 
\ No newline at end of file
+                    mock_run_file.assert_called_once_with(
+                        Path("test.lamb"),
+                        stdlib_path=Path("/custom/std.lamb"),
+                        engine=mock_args.engine,
+                        opt_level=mock_args.opt_level,
+                        opt_report=mock_args.opt_report,
+                        jit=mock_args.jit,
+                        image=mock_args.image,
+                        save_image=mock_args.save_image,
+                    ) 
+
+def test_main_run_with_engine():
+    """Test that --engine is parsed and forwarded to run_file."""
+    args = create_parser().parse_args(["run", "test.lamb", "--engine=vm"])
+    assert args.engine == "vm"
+    assert create_parser().parse_args(["run", "test.lamb"]).engine == "tree"
+    with patch('lambdora.__main__.run_file') as mock_run_file:
+        with patch('pathlib.Path.exists', return_value=True):
+            assert main(["run", "test.lamb", "--engine", "vm"]) == 0
+            mock_run_file.assert_called_once_with(
+                Path("test.lamb"),
+                stdlib_path=None,
+                engine="vm",
+                opt_level=0,
+                opt_report=False,
+                jit="auto",
+                image=None,
+                save_image=None,
+            )
+
+def test_main_run_with_opt_level():
+    """Test that -O and --opt-report are parsed and forwarded to run_file."""
+    args = create_parser().parse_args(["run", "test.lamb", "-O2", "--opt-report"])
+    assert args.opt_level == 2 and args.opt_report
+    with patch('lambdora.__main__.run_file') as mock_run_file:
+        with patch('pathlib.Path.exists', return_value=True):
+            assert main(["run", "test.lamb", "-O1"]) == 0
+            mock_run_file.assert_called_once_with(
+                Path("test.lamb"),
+                stdlib_path=None,
+                engine="tree",
+                opt_level=1,
+                opt_report=False,
+                jit="auto",
+                image=None,
+                save_image=None,
+            )
+    with pytest.raises(SystemExit):
+        create_parser().parse_args(["run", "test.lamb", "-O3"])
+
+
+def test_main_run_with_jit():
+    """Test that --jit is parsed and forwarded to run_file."""
+    assert create_parser().parse_args(["run", "test.lamb", "--jit=off"]).jit == "off"
+    with patch('lambdora.__main__.run_file') as mock_run_file:
+        with patch('pathlib.Path.exists', return_value=True):
+            assert main(["run", "test.lamb", "--jit", "on"]) == 0
+            assert mock_run_file.call_args.kwargs["jit"] == "on"
+    with pytest.raises(SystemExit):
+        create_parser().parse_args(["run", "test.lamb", "--jit=always"])
+
+
+def test_main_build(tmp_path, capsys):
+    """Test that build writes a module, and reports missing files and errors."""
+    program = tmp_path / "prog.lamb"
+    program.write_text("(print 1)")
+    output = tmp_path / "out.py"
+    assert main(["build", str(program), "-o", str(output), "-O1"]) == 0
+    assert output.exists()
+    assert main(["build", str(tmp_path / "missing.lamb")]) == 1
+    program.write_text("(print 1")
+    assert main(["build", str(program)]) == 1
+    assert "not found" in capsys.readouterr().err
+
+
+def test_commands_import_only_what_they_use(tmp_path):
+    """Test that run loads neither the REPL nor the builder, nor colorama."""
+    program = tmp_path / "prog.lamb"
+    program.write_text("(print 1)")
+    code = (
+        "import atexit, sys\n"
+        "atexit.register(lambda: print(*sys.modules, file=sys.stderr))\n"
+        "from lambdora.__main__ import main\n"
+        "sys.exit(main(sys.argv[1:]))\n"
+    )
+
+    def loaded(*args):
+        result = subprocess.run(
+            [sys.executable, "-c", code, *args], capture_output=True, text=True
+        )
+        assert result.returncode == 0
+        return set(result.stderr.split()), result.stdout
+
+    modules, out = loaded("run", str(program))
+    assert out == "1\n"
+    unused = {"lambdora.repl", "lambdora.build", "lambdora.image", "readline"}
+    unused |= {"lambdora.vm"}
+    assert not modules & (unused | {"colorama", "importlib.metadata"})
+    modules, out = loaded("--version")
+    assert out.startswith("Lambdora ")
+    assert "importlib.metadata" in modules and "lambdora.evaluator" not in modules
+    # The REPL loads images, and the runner the VM, only when asked to
+    for module, unused in [
+        ("lambdora.repl", {"lambdora.image", "pickle"}),
+        ("lambdora.runner", {"lambdora.vm"}),
+    ]:
+        result = subprocess.run(
+            [sys.executable, "-c", f"import sys, {module}; print(*sys.modules)"],
+            capture_output=True,
+            text=True,
+        )
+        assert not set(result.stdout.split()) & unused
+
+
+def test_version_is_read_on_first_use():
+    """Test the package's lazy __version__ attribute."""
+    import lambdora
+
+    assert lambdora.__version__ == vars(lambdora)["__version__"]
+    with pytest.raises(AttributeError):
+        lambdora.missing
@@ -0,0 +1,113 @@
+"""Tests for memoized functions."""
+
+import pytest
+
+from lambdora.builtinsmodule import lambMakeTopEnv
+from lambdora.errors import BuiltinError, EvalError
+from lambdora.evaluator import lambEval, trampoline
+from lambdora.macro import lambMacroExpand
+from lambdora.memo import DEFAULT_MAXSIZE, MemoCache
+from lambdora.parser import lambParseAll
+from lambdora.tokenizer import lambTokenize
+from lambdora.values import Builtin, valueToString
+from lambdora.vm import vmEval
+
+
+def tree_eval(expr, env):
+    return trampoline(lambEval(expr, env, is_tail=True))
+
+
+def run(src, env, evaluate=tree_eval):
+    result = None
+    for expr in lambParseAll(lambTokenize(src)):
+        expanded = lambMacroExpand(expr, env)
+        if expanded is not None:
+            result = evaluate(expanded, env)
+    return result
+
+
+FIB = "(defmemo fib (lambda n. (if (< n 2) n (+ (fib (- n 1)) (fib (- n 2))))))"
+
+
+@pytest.mark.parametrize("evaluate", [tree_eval, vmEval])
+def test_defmemo_caches_recursive_calls(evaluate):
+    env = lambMakeTopEnv()
+    run(FIB, env, evaluate)
+    assert run("(fib 80)", env, evaluate) == 23416728348467685
+    # Each n from 0 to 80 is computed once
+    stats = valueToString(run("(memoStats fib)", env, evaluate))
+    assert stats == f"(78 81 81 {DEFAULT_MAXSIZE})"
+    assert run("(fib 80)", env, evaluate) == 23416728348467685
+    assert valueToString(run("(memoStats fib)", env, evaluate)).startswith("(79 81")
+
+
+def test_lru_eviction():
+    env = lambMakeTopEnv()
+    run("(define sq (memoizeWith 2 (lambda x. (* x x))))", env)
+    for n in [3, 3, 4, 5, 3]:
+        assert run(f"(sq {n})", env) == n * n
+    # 3 was evicted by 5, then computed again
+    assert valueToString(run("(memoStats sq)", env)) == "(1 4 2 2)"
+    cache = env["sq"].func
+    assert isinstance(cache, MemoCache) and list(cache.results) == [5, 3]
+
+
+def test_keys_are_structural():
+    env = lambMakeTopEnv()
+    run("(define f (memoize (lambda x. (isList x))))", env)
+    run("(f (cons 1 (cons 2 nil))) (f (cons 1 (cons 2 nil))) (f nil) (f nil)", env)
+    assert valueToString(run("(memoStats f)", env)) == f"(2 2 2 {DEFAULT_MAXSIZE})"
+    # true is not 1, "1" is not 1
+    run("(define g (memoize (lambda x. x)))", env)
+    assert [run(f"(g {x})", env) for x in ["1", "true", '"1"']] == [1, True, "1"]
+    # Functions are not cached at all
+    run("(g g) (g g)", env)
+    assert valueToString(run("(memoStats g)", env)) == f"(0 5 3 {DEFAULT_MAXSIZE})"
+
+
+def test_memoized_functions_take_several_arguments():
+    env = lambMakeTopEnv()
+    run("(define add (memoize (lambda a b. (+ a b))))", env)
+    assert isinstance(env["add"], Builtin)
+    assert run("((add 1) 2)", env) == 3
+    assert run("(add 1 2)", env) == 3
+    assert run("(add 2 1)", env) == 3
+    assert valueToString(run("(memoStats add)", env)).startswith("(1 2 2")
+    run("(define plus (memoize +))", env)
+    assert run("(plus 1 2)", env) == 3
+
+
+@pytest.mark.parametrize("evaluate", [tree_eval, vmEval])
+def test_extra_arguments_go_to_the_result(evaluate):
+    env = lambMakeTopEnv()
+    run("(define f (memoize (lambda x. (lambda y. (+ x y)))))", env, evaluate)
+    assert run("(f 1 2)", env, evaluate) == 3
+    run("(define g (memoize (lambda x. (lambda y z. (- y z)))))", env, evaluate)
+    assert run("(g 0 5 1)", env, evaluate) == 4
+    assert valueToString(run("(g 0 5)", env, evaluate)).startswith("<closure")
+    # In tail position, and passing a closure's partial application on
+    run("(define h (lambda n. (f n 10)))", env, evaluate)
+    assert run("(h 5)", env, evaluate) == 15
+    assert run("((lambda k. (g 0 k 2)) 7)", env, evaluate) == 5
+
+
+def test_caches_are_per_environment():
+    first, second = lambMakeTopEnv(), lambMakeTopEnv()
+    for env in (first, second):
+        run(FIB, env)
+    run("(fib 10)", first)
+    assert valueToString(run("(memoStats fib)", second)) == f"(0 0 0 {DEFAULT_MAXSIZE})"
+
+
+def test_memoize_errors():
+    env = lambMakeTopEnv()
+    with pytest.raises(BuiltinError, match="memoize expects a function"):
+        run("(memoize 1)", env)
+    with pytest.raises(BuiltinError, match="memoize size must be positive"):
+        run("(memoizeWith 0 (lambda x. x))", env)
+    with pytest.raises(BuiltinError, match="Expected integer"):
+        run('(memoizeWith "a")', env)
+    with pytest.raises(BuiltinError, match="memoStats expects a memoized function"):
+        run("(memoStats +)", env)
+    with pytest.raises(EvalError, match="defmemo requires name and value"):
+        run("(defmemo f)", env)
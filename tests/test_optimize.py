@@ -0,0 +1,252 @@
+"""Tests for the AST optimizer."""
+
+from collections import Counter
+
+import pytest
+
+from lambdora import runner
+from lambdora.astmodule import (
+    Abstraction,
+    GlobalIs,
+    IfExpr,
+    LetExpr,
+    Literal,
+    Variable,
+)
+from lambdora.builtinsmodule import lambMakeTopEnv
+from lambdora.evaluator import lambEval, trampoline
+from lambdora.macro import lambMacroExpand
+from lambdora.optimize import (
+    CONSTANT_FOLD,
+    DEAD_BRANCH,
+    ETA_REDUCTION,
+    INLINE_BUDGET,
+    INLINED,
+    formatOptStats,
+    lambOptimize,
+)
+from lambdora.parser import lambParseAll
+from lambdora.printer import lambPrint
+from lambdora.runner import load_std
+from lambdora.tokenizer import lambTokenize
+from lambdora.values import valueToString
+from lambdora.vm import vmEval
+
+
+@pytest.fixture
+def env():
+    env = lambMakeTopEnv()
+    for src in [
+        "(defmacro when (cond body) `(if ,cond ,body nil))",
+        "(define helper (lambda f acc lst. (+ acc lst)))",
+    ]:
+        run(src, env, 0)
+    return env
+
+
+def optimize(src, env, level=1, stats=None):
+    expr = lambMacroExpand(lambParseAll(lambTokenize(src))[0], env)
+    return lambOptimize(expr, env, level, stats)
+
+
+def run(src, env, level):
+    result = None
+    for expr in lambParseAll(lambTokenize(src)):
+        expanded = lambMacroExpand(expr, env)
+        if expanded is not None:
+            optimized = lambOptimize(expanded, env, level)
+            result = trampoline(lambEval(optimized, env, is_tail=True))
+    return result
+
+
+def test_constant_folding(env):
+    stats = Counter()
+    assert optimize("(+ 1 (* 2 3) 4)", env, stats=stats) == Literal("11")
+    assert stats[CONSTANT_FOLD] == 2
+    assert optimize('(++ "a" "b")', env) == Literal("ab", const="ab")
+    assert optimize("(not (< 1 2))", env) == Literal("false", const=False)
+    assert optimize("(str 12)", env).const == "12"
+    # Partial applications, errors and impure builtins are left to run time
+    assert lambPrint(optimize("(+ 1)", env)) == "(+ 1)"
+    assert lambPrint(optimize("(/ 1 0)", env)) == "(/ 1 0)"
+    assert lambPrint(optimize('(+ 1 "a")', env)) == "(+ 1 a)"
+    assert lambPrint(optimize("(head (cons 1 nil))", env)) == "(head (cons 1 nil))"
+
+
+def test_folding_respects_local_bindings(env):
+    src = "(lambda + . (+ 1 2))"
+    assert lambPrint(optimize(src, env)) == "(lambda +. (+ 1 2))"
+    src = "(lambda x. (letrec ((not (lambda y. y))) (not true)))"
+    assert "(not true)" in lambPrint(optimize(src, env))
+    # A name the form defines may change before its use runs
+    src = "(let q (define + -) (+ 5 1))"
+    assert "(+ 5 1)" in lambPrint(optimize(src, env))
+    run("(define minus -)", env, 0)
+    assert optimize("(minus 5 1)", env) == Literal("4")
+
+
+def test_dead_branches(env):
+    stats = Counter()
+    assert optimize("(if (< 1 2) 10 (fail))", env, stats=stats) == Literal("10")
+    assert lambPrint(optimize("(when false (print 1))", env, stats=stats)) == "nil"
+    assert stats[DEAD_BRANCH] == 2 and stats[CONSTANT_FOLD] == 1
+    # Not a boolean: the error is still raised when the if runs
+    assert lambPrint(optimize("(if 1 2 3)", env)) == "(if 1 2 3)"
+    assert lambPrint(optimize("(lambda true. (if true 1 2))", env)).endswith("2))")
+
+
+def test_eta_reduction(env):
+    stats = Counter()
+    src = (
+        "(letrec ((go (lambda f acc lst. (helper f acc lst))))"
+        " (lambda f acc lst. (go f acc lst)))"
+    )
+    letrec = optimize(src, env, 2, stats)
+    assert letrec.body == [Variable("go")] and stats[ETA_REDUCTION] == 1
+    # Only at level 2
+    assert isinstance(optimize(src, env, 1).body[0], Abstraction)
+    stats = Counter()
+    for src in [
+        # Arguments not passed straight through, or not all of them
+        "(letrec ((go (lambda a b. a))) (lambda a b. (go b a)))",
+        "(letrec ((go (lambda a b. a))) (lambda a. (go a)))",
+        # Global, unknown, builtin, parameter or shadowed
+        "(define wrap (lambda f acc lst. (helper f acc lst)))",
+        "(lambda x. (later x))",
+        "(lambda x. (not x))",
+        "(lambda go. (lambda x. (go x)))",
+        "(letrec ((go (lambda x. x))) (lambda go. (lambda x. (go x))))",
+        # Rebound, or not bound yet while the bindings are made
+        "(letrec ((go (lambda x. x))) (define go 1) (lambda x. (go x)))",
+        "(letrec ((go (lambda x. x)) (w (lambda x. (go x)))) w)",
+    ]:
+        optimize(src, env, 2, stats)
+    assert stats[ETA_REDUCTION] == 0
+    assert (
+        run(
+            "((letrec ((go (lambda a b. (- a b)))) (lambda a b. (go a b))) 5 2)", env, 2
+        )
+        == 3
+    )
+
+
+def test_wrappers_follow_redefinition():
+    for evaluate in (lambda e, env: trampoline(lambEval(e, env, is_tail=True)), vmEval):
+        env = lambMakeTopEnv()
+        for src in [
+            "(define sq (lambda x. (* x x)))",
+            "(define useSq (lambda x. (sq x)))",
+            "(define sq (lambda x. (* x 2)))",
+            "(useSq 5)",
+        ]:
+            expr = lambMacroExpand(lambParseAll(lambTokenize(src))[0], env)
+            result = evaluate(lambOptimize(expr, env, 2), env)
+        assert result == 10
+
+
+def test_inlining(env):
+    run("(define double (lambda x. (+ x x)))", env, 0)
+    run("(define compose (lambda f g. (lambda x. (f (g x)))))", env, 0)
+    stats = Counter()
+    assert lambPrint(optimize("(double 3)", env, 2, stats)) == (
+        "(if <double unchanged> 6 (double 3))"
+    )
+    assert stats[INLINED] == 1 and stats[CONSTANT_FOLD] == 1
+    # Other arguments are evaluated once, before the guard
+    let = optimize("(lambda y. (double (- y 1)))", env, 2).body
+    assert isinstance(let, LetExpr) and lambPrint(let.value) == "(- y 1)"
+    assert isinstance(let.body[0], IfExpr)
+    assert let.body[0].cond == GlobalIs("double", env["double"])
+    assert run("((compose double (lambda x. (+ x 1))) 4)", env, 2) == 10
+    assert run("(let n 5 (double (double n)))", env, 2) == 20
+    # Only at level 2
+    assert lambPrint(optimize("(double 3)", env, 1)) == "(double 3)"
+
+
+def test_inlined_calls_follow_redefinition():
+    for evaluate in (lambda e, env: trampoline(lambEval(e, env, is_tail=True)), vmEval):
+        env = lambMakeTopEnv()
+        for src in [
+            "(define double (lambda x. (+ x x)))",
+            "(define quad (lambda x. (double (double x))))",
+            "(quad 3)",
+            "(define double (lambda x. (* x 10)))",
+            "(quad 3)",
+        ]:
+            expr = lambMacroExpand(lambParseAll(lambTokenize(src))[0], env)
+            result = evaluate(lambOptimize(expr, env, 2), env)
+        assert result == 300
+
+
+def test_inlining_limits(env):
+    for src in [
+        "(define down (lambda n. (if (= n 0) 0 (down (- n 1)))))",
+        "(define big (lambda x. (+ x (+ x (+ x (+ x (+ x (+ x (+ x x)))))))))",
+        "(define uses (lambda x. (+ x helper)))",
+        "(define sets (lambda x. (define y x)))",
+    ]:
+        run(src, env, 0)
+    stats = Counter()
+    for src in [
+        # Recursive, too big or defining a name
+        "(down 3)",
+        "(big 1)",
+        "(sets 1)",
+        # A local hides a global the body uses
+        "(lambda helper. (uses 1))",
+        # Partial applications and locals
+        "(down)",
+        "(lambda down. (down 1))",
+    ]:
+        optimize(src, env, 2, stats)
+    assert stats[INLINED] == 0
+    # Code growth is bounded by a budget per top-level expression
+    run("(define inc (lambda x. (+ x 1)))", env, 0)
+    calls = " ".join(["(inc y)"] * INLINE_BUDGET)
+    optimize(f"(lambda y. (cons {calls}))", env, 2, stats)
+    assert 0 < stats[INLINED] < INLINE_BUDGET
+
+
+def test_levels_give_the_same_results():
+    sources = [
+        "(define sq (lambda x. (* x x)))",
+        "(sq (+ 2 3))",
+        "(foldl (lambda a b. (+ a b)) 0 (range 10))",
+        "(cond false 1 (= 1 2) 2 (< 1 2) 3 false 4 5)",
+        "(if (isZero 0) (map double (cons 1 (cons 2 nil))) nil)",
+        "(length (reverse (range 20)))",
+    ]
+    results = []
+    saved = dict(runner.ENV)
+    try:
+        for level in (0, 1, 2):
+            runner.ENV.clear()
+            runner.ENV.update(lambMakeTopEnv())
+            load_std(opt_level=level)
+            results.append(
+                [valueToString(run(src, runner.ENV, level)) for src in sources]
+            )
+    finally:
+        runner.ENV.clear()
+        runner.ENV.update(saved)
+    assert results[0] == results[1] == results[2]
+
+
+def test_format_opt_stats():
+    text = formatOptStats(Counter({CONSTANT_FOLD: 3, ETA_REDUCTION: 1, INLINED: 2}))
+    assert "constant folds: 3" in text
+    assert "dead branches: 0" in text
+    assert "eta reductions: 1" in text
+    assert "inlined calls: 2" in text
+
+
+def test_run_file_with_opt_report(tmp_path, capsys):
+    from lambdora.runner import run_file
+
+    src = tmp_path / "prog.lamb"
+    src.write_text("(print (+ 1 2))\n(when (< 1 2) (foldl + 0 (range 4)))")
+    run_file(src, opt_level=2, opt_report=True)
+    captured = capsys.readouterr()
+    assert captured.out.splitlines() == ["3", "6"]
+    assert "Optimizer rewrites:" in captured.err
+    assert "eta reductions: 0" in captured.err
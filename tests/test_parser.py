@@ -407,3 +407,71 @@ def test_parse_expression_abstraction_no_close_paren():
     """Test parseExpression with abstraction no close paren."""
     with pytest.raises(SyntaxError):
         parseExpression(["(", "lambda", "x", ".", "x"], 0)
+
+# Lowering of special forms
+
+def lower(src):
+    from lambdora.parser import lambLower
+    return lambLower(lambParse(lambTokenize(src)))
+
+def test_lower_special_forms():
+    expr = lower("(if true (let x 1 (+ x 1)) (quote (a b)))")
+    assert isinstance(expr, IfExpr)
+    assert expr.then_branch == LetExpr(
+        "x", Literal("1"), [Application(Variable("+"), [Variable("x"), Literal("1")])]
+    )
+    assert isinstance(expr.else_branch, QuoteExpr)
+    assert lower("(define y 2)") == DefineExpr("y", Literal("2"))
+    macro = lower("(defmacro twice (x) (+ x x))")
+    assert isinstance(macro, DefMacroExpr) and macro.params == ["x"]
+
+def test_lower_forms_from_quasiquote_templates():
+    # Forms built by a template are applications until they are lowered
+    template = lambParse(lambTokenize("`(lambda x . (if x 1 2))"))
+    assert isinstance(template.expr, Application)
+    from lambdora.parser import lambLower
+    from lambdora.evaluator import expandQuasiquote
+    code = expandQuasiquote(template.expr, lambda e: e)
+    lowered = lambLower(code)
+    assert lowered == Abstraction("x", IfExpr(Variable("x"), Literal("1"), Literal("2")))
+
+def test_parse_multi_parameter_lambda():
+    expr = lambParse(lambTokenize("(lambda f acc lst. (f acc lst))"))
+    assert isinstance(expr, Abstraction)
+    assert expr.param == "f"
+    assert expr.params == ["f", "acc", "lst"]
+    assert lambParse(lambTokenize("(lambda x . x)")).params == ["x"]
+    with pytest.raises(SyntaxError, match="Expected '.' after lambda param"):
+        lambParse(lambTokenize("(lambda x y)"))
+    # Code built by a template lowers to the same node
+    from lambdora.parser import lambLower
+    from lambdora.evaluator import expandQuasiquote
+    template = lambParse(lambTokenize("`(lambda a b . a)"))
+    code = expandQuasiquote(template.expr, lambda e: e)
+    assert lambLower(code) == Abstraction("a", Variable("a"), ["b"])
+
+def test_lower_leaves_quoted_data_alone():
+    assert lower("'(if 1)") == QuoteExpr(Application(Variable("if"), [Literal("1")]))
+    qq = lower("`(f ,(if true 1 2))")
+    hole = qq.expr.args[0]
+    assert isinstance(hole, UnquoteExpr) and isinstance(hole.expr, IfExpr)
+
+def test_lower_reports_malformed_forms():
+    from lambdora.errors import EvalError
+    with pytest.raises(SyntaxError, match="if requires condition, then, else"):
+        lower("(f (if 1 2))")
+    with pytest.raises(EvalError, match="let syntax"):
+        lower("(let x 1)")
+    from lambdora.parser import lambLower
+    dynamic = Application(Variable("define"), [Application(Variable("f"), []), Literal("2")])
+    with pytest.raises(EvalError, match="define name must be string identifier"):
+        lambLower(dynamic)
+    with pytest.raises(EvalError, match="unquote can only be used inside quasiquote"):
+        lower("(unquote x)")
+    with pytest.raises(EvalError, match="if requires condition, then, else"):
+        lower("`(if 1 2)")
+
+def test_literal_constants():
+    assert lambParse(lambTokenize("42")).const == 42
+    text = lambParse(lambTokenize('"42"'))
+    assert text.value == "42" and text.const == "42"
@@ -29,6 +29,7 @@ def test_basic_printing():
     assert result == "(lambda x. x)"
     assert "lambda" in result
     assert "x" in result
+    assert lambPrint(Abstraction("x", Variable("y"), ["y"])) == "(lambda x y. y)"
 
 
 def test_complex_printing():
@@ -183,9 +183,9 @@ def test_load_std_with_custom_path_exists():
     """Test load_std with custom stdlib path that exists."""
     with patch('pathlib.Path.exists', return_value=True):
         with patch('pathlib.Path.read_text', return_value="(define test 42)"):
-            with patch('lambdora.repl.lambTokenize') as mock_tokenize:
-                with patch('lambdora.repl.lambParseAll') as mock_parse:
-                    with patch('lambdora.repl.lambMacroExpand') as mock_macro:
+            with patch('lambdora.lambcache.lambTokenize') as mock_tokenize:
+                with patch('lambdora.lambcache.lambParseAll') as mock_parse:
+                    with patch('lambdora.lambcache.lambMacroExpand') as mock_macro:
                         with patch('lambdora.repl.trampoline') as mock_trampoline:
                             mock_parse.return_value = [MagicMock()]
                             mock_macro.return_value = MagicMock()
@@ -425,3 +425,12 @@ def test_main_function():
                     main()
                     mock_print.assert_called_once()
                     mock_system.assert_called_once()
+
+
+def test_run_expr_with_opt_level():
+    """Test run_expr optimizing its input and following redefinitions."""
+    runExpression("(define inc (lambda x. (+ x 1)))")
+    runExpression("(define twice (lambda x. (inc (inc x))))", opt_level=2)
+    assert runExpression("(twice 1)", opt_level=2) == 3
+    runExpression("(define inc (lambda x. (- x 1)))")
+    assert runExpression("(twice 1)", opt_level=2) == -1
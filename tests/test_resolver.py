@@ -0,0 +1,136 @@
+"""Tests for the lexical addressing pass."""
+
+import pytest
+
+from lambdora.astmodule import Application, IfExpr, Literal, Variable
+from lambdora.errors import EvalError, RecursionInitError
+from lambdora.parser import lambLower, lambParseAll
+from lambdora.repl import run_expr as runExpression
+from lambdora.resolver import (
+    Fail,
+    GlobalRef,
+    LocalRef,
+    ResolvedDefine,
+    ResolvedLambda,
+    ResolvedLet,
+    ResolvedLetRec,
+    ResolvedQuasiquote,
+    SelfTailCall,
+    lambResolve,
+    lambResolveFunction,
+)
+from lambdora.tokenizer import lambTokenize
+
+
+def resolve(src):
+    return lambResolve(lambLower(lambParseAll(lambTokenize(src))[0]))
+
+
+def test_globals_and_locals():
+    assert resolve("x") == GlobalRef("x", 0)
+    fn = resolve("(lambda x. (lambda y. (+ x y)))")
+    assert isinstance(fn, ResolvedLambda) and fn.nlocals == 0
+    inner = fn.body
+    assert isinstance(inner, ResolvedLambda)
+    call = inner.body
+    assert call.func == GlobalRef("+", 2)
+    assert call.args == [LocalRef("x", 1, 1), LocalRef("y", 0, 1)]
+
+
+def test_shadowing_uses_innermost_binding():
+    fn = resolve("(lambda x. (lambda x. x))")
+    assert fn.body.body == LocalRef("x", 0, 1)
+
+
+def test_let_and_internal_defines_get_slots():
+    let = resolve("(let x 1 (define y 2) (+ x y))")
+    assert isinstance(let, ResolvedLet) and let.nslots == 2
+    assert let.values == [Literal("1")]
+    define, call = let.body
+    assert isinstance(define, ResolvedDefine)
+    assert define.target == LocalRef("y", 0, 2, checked=True)
+    # y may be read before its define has run, x may not
+    assert call.args == [LocalRef("x", 0, 1), LocalRef("y", 0, 2, checked=True)]
+
+    fn = resolve("(lambda n. (define sq (* n n)))")
+    assert fn.nlocals == 1
+
+
+def test_immediately_applied_lambdas_become_lets():
+    let = resolve("((lambda x y. (+ x y)) 1 (+ 2 3))")
+    assert isinstance(let, ResolvedLet) and let.nslots == 2
+    assert let.values[0] == Literal("1")
+    assert let.values[1].args == [Literal("2"), Literal("3")]
+    assert resolve("((lambda x. (define z x)) 1)").nslots == 2
+    # Partial applications, extra arguments and repeated names are calls
+    for src in ["((lambda x y. x) 1)", "((lambda x. x) 1 2)", "((lambda x x. x) 1 2)"]:
+        assert isinstance(resolve(src), Application)
+    assert runExpression("(let a 2 (let b 3 (* a b)))") == 6
+
+
+def test_letrec_checks_only_inside_bindings():
+    node = resolve("(letrec ((f (lambda n. (g n))) (g (lambda n. n))) (f 1))")
+    assert isinstance(node, ResolvedLetRec)
+    assert node.nslots == node.nrec == 2
+    assert [slot for slot, _ in node.bindings] == [1, 2]
+    f_rhs = node.bindings[0][1]
+    # f reaches g through a cell it shares with the letrec frame
+    assert f_rhs.body.func == LocalRef("g", 1, 1, checked=True, cell=True)
+    assert f_rhs.captures[1] == LocalRef("g", 0, 2)
+    assert node.cells == [2]
+    # Once the body runs every binding has been initialised
+    assert node.body[0].func == LocalRef("f", 0, 1)
+
+
+def test_lowered_forms_are_resolved():
+    node = resolve("(lambda x. (if x (quasiquote (+ 1 (unquote x))) nil))")
+    assert isinstance(node.body, IfExpr)
+    assert node.body.cond == LocalRef("x", 0, 1)
+    qq = node.body.then_branch
+    assert isinstance(qq, ResolvedQuasiquote)
+    assert qq.holes == [LocalRef("x", 0, 1)]
+
+
+def test_unknown_nodes_resolve_to_fail():
+    from lambdora.astmodule import UnquoteExpr
+
+    fail = lambResolve(UnquoteExpr(Literal("1")))
+    assert isinstance(fail, Fail) and fail.error is EvalError
+
+
+def test_resolve_function():
+    fn = lambResolveFunction(["x"], Variable("x"))
+    assert fn.body == LocalRef("x", 0, 1)
+    assert fn.source == Variable("x")
+    fn = lambResolveFunction(["x", "y"], Variable("y"))
+    assert fn.body == LocalRef("y", 0, 2)
+
+
+def test_runtime_checks():
+    with pytest.raises(RecursionInitError):
+        runExpression("(letrec ((x x)) x)")
+    with pytest.raises(EvalError, match="unbound variable: y"):
+        runExpression("(letrec ((x 1)) (if false (define y 2) nil) y)")
+    assert runExpression("(letrec ((x 1)) (define y (+ x 1)) (* y 10))") == 20
+
+
+def test_self_tail_calls_are_marked():
+    define = resolve("(define loop (lambda n acc. (if (= n 0) acc (loop (- n 1) acc))))")
+    fn = define.value
+    assert fn.loops
+    assert fn.body.else_branch == SelfTailCall(
+        GlobalRef("loop", 1), fn.body.else_branch.args
+    )
+    letrec = resolve("(letrec ((f (lambda n. (if (= n 0) 0 (f (- n 1)))))) f)")
+    fn = letrec.bindings[0][1]
+    assert fn.loops
+    assert fn.body.else_branch.func == LocalRef("f", 1, 1, True, cell=True)
+    # Not in tail position, a different arity, or a body creating closures
+    for src in [
+        "(define f (lambda n. (+ 1 (f n))))",
+        "(define f (lambda n m. (f n)))",
+        "(define f (lambda n. (let x n (f x))))",
+        "(define f (lambda n. (if (= n 0) (lambda y. n) (f (- n 1)))))",
+        "(define f (lambda f. (f 1)))",
+    ]:
+        assert not resolve(src).value.loops, src
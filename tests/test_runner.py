@@ -165,7 +165,7 @@ def test_run_file_with_unexpected_exception():
         f.flush()
         try:
             # Mock lambTokenize to raise an unexpected exception
-            with patch('lambdora.runner.lambTokenize', side_effect=RuntimeError("Unexpected")):
+            with patch('lambdora.lambcache.lambTokenize', side_effect=RuntimeError("Unexpected")):
                 with pytest.raises(SystemExit):
                     run_file(Path(f.name))
         finally:
@@ -181,7 +181,7 @@ def test_run_file_with_macro_expansion_none():
         f.flush()
         try:
             # Mock lambMacroExpand to return None
-            with patch('lambdora.runner.lambMacroExpand', return_value=None):
+            with patch('lambdora.lambcache.lambMacroExpand', return_value=None):
                 result = run_file(Path(f.name))
                 assert result is None
         finally:
@@ -252,7 +252,7 @@ def test_runner_main_function_too_many_args():
 def test_load_std_with_lamb_error():
     """Test load_std with LambError during loading."""
     # Mock lambTokenize to raise a LambError
-    with patch('lambdora.runner.lambTokenize', side_effect=TokenizeError("Test error")):
+    with patch('lambdora.lambcache.lambTokenize', side_effect=TokenizeError("Test error")):
         with pytest.raises(SystemExit):
             load_std()
 
@@ -2,7 +2,8 @@
 
 import pytest
 
-from lambdora.errors import TokenizeError
+from lambdora.errors import ParseError, TokenizeError
+from lambdora.parser import lambParse, lambParseAll
 from lambdora.tokenizer import lambTokenize
 
 
@@ -133,3 +134,47 @@ def test_tokenizer_with_complex_expressions():
     assert "define" in tokens
     assert "message" in tokens
     assert '"hello"' in tokens
+
+
+def test_token_offsets():
+    """Each token records where it starts, comments and all."""
+    src = '; note\n(define s "a ; b")  ; trailing\n  (++ s\n\t"c")'
+    tokens = lambTokenize(src, filename="f.lamb")
+    assert tokens == ["(", "define", "s", '"a ; b"', ")", "(", "++", "s", '"c"', ")"]
+    assert len(tokens.offsets) == len(tokens)
+    for token, offset in zip(tokens, tokens.offsets):
+        assert src[offset : offset + len(token)] == token
+    assert tokens.location(3) == (2, 11, '(define s "a ; b")  ; trailing')
+    assert tokens.location(8) == (4, 2, '\t"c")')
+    # Past the last token is the end of the source
+    assert tokens.location(len(tokens)) == (4, 6, '\t"c")')
+
+
+def test_non_ascii_tokens():
+    """Tokens the scanner leaves aside are still split and located."""
+    tokens = lambTokenize("(été 1٣ x)")
+    assert tokens == ["(", "été", "1٣", "x", ")"]
+    assert list(tokens.offsets) == [0, 1, 5, 8, 9]
+    with pytest.raises(TokenizeError, match="Unexpected character: #") as exc:
+        lambTokenize("(été\n  #)")
+    assert (exc.value.line, exc.value.column) == (2, 3)
+    with pytest.raises(TokenizeError, match="Unterminated string literal") as exc:
+        lambTokenize('é "ab')
+    assert (exc.value.line, exc.value.column) == (1, 4)
+
+
+def test_parse_errors_are_located():
+    """The parser reports where in the source a mistake is."""
+    with pytest.raises(ParseError) as exc:
+        lambParseAll(lambTokenize("(define x 1)\n(lambda x y)", filename="f.lamb"))
+    err = exc.value
+    assert (err.file, err.line, err.column) == ("f.lamb", 2, 12)
+    assert err.snippet == "(lambda x y)"
+    assert str(err) == "f.lamb:2:12: Expected '.' after lambda param"
+    with pytest.raises(ParseError, match=r"^<unknown>:1:7: Unexpected EOF"):
+        lambParseAll(lambTokenize("(+ 1 2"))
+    with pytest.raises(ParseError, match=r"^<unknown>:1:3: Unexpected extra"):
+        lambParse(lambTokenize("1 2"))
+    # Plain lists of tokens have no locations
+    with pytest.raises(ParseError, match=r"^Unexpected EOF"):
+        lambParseAll(["(", "+"])
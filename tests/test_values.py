@@ -9,6 +9,9 @@ def test_value_to_string_nested_pair():
 def test_closure_repr():
     c = Closure("x", None, {})  # type: ignore[arg-type]
     assert valueToString(c).startswith("<closure lambda x.")
+    c = Closure("x", None, {}, rest_params=["y", "z"], args=(1,))  # type: ignore[arg-type]
+    assert valueToString(c).startswith("<closure lambda y z.")
+    assert c.arity == 2
 
 
 def test_builtin_repr():
@@ -0,0 +1,241 @@
+"""Tests for the bytecode compiler and virtual machine."""
+
+import pytest
+
+from lambdora.astmodule import Application, Literal, Variable
+from lambdora.builtinsmodule import lambMakeTopEnv
+from lambdora.errors import EvalError, ParseError, RecursionInitError
+from lambdora.macro import lambMacroExpand
+from lambdora.parser import lambParseAll
+from lambdora.tokenizer import lambTokenize
+from lambdora.values import Closure, Pair, nil, valueToString
+from lambdora.vm import (
+    CALL,
+    RETURN,
+    SELF_TAIL_CALL,
+    TAIL_CALL,
+    disassemble,
+    main,
+    vmCompile,
+    vmEval,
+)
+
+
+@pytest.fixture(scope="module")
+def vm_env():
+    """A global environment with the standard library loaded on the VM."""
+    from pathlib import Path
+
+    env = lambMakeTopEnv()
+    std = Path(__file__).parent.parent / "src" / "lambdora" / "stdlib" / "std.lamb"
+    for expr in lambParseAll(lambTokenize(std.read_text(encoding="utf-8"))):
+        expanded = lambMacroExpand(expr, env)
+        if expanded is not None:
+            vmEval(expanded, env)
+    return env
+
+
+def run(src, env):
+    result = nil
+    for expr in lambParseAll(lambTokenize(src)):
+        expanded = lambMacroExpand(expr, env)
+        if expanded is not None:
+            result = vmEval(expanded, env)
+    return result
+
+
+def test_arithmetic():
+    env = lambMakeTopEnv()
+    assert vmEval(Application(Variable("+"), [Literal("1"), Literal("2")]), env) == 3
+    assert run("(* (+ 1 2) (- 10 4))", env) == 18
+
+
+def test_lambda_and_currying():
+    env = lambMakeTopEnv()
+    assert run("((lambda x. (lambda y. (- x y))) 10 3)", env) == 7
+    assert isinstance(run("((lambda x. (lambda y. x)) 1)", env), Closure)
+    # Extra arguments after a non-closure result are dropped, as in the tree engine
+    assert run("((lambda x. 5) 1 2 3)", env) == 5
+
+
+def test_multi_parameter_lambdas():
+    env = lambMakeTopEnv()
+    run("(define sub3 (lambda a b c. (- a (+ b c))))", env)
+    assert run("(sub3 10 2 3)", env) == 5
+    assert run("((sub3 10 2) 3)", env) == 5
+    assert run("(((sub3 10) 2) 3)", env) == 5
+    partial = run("(sub3 10)", env)
+    assert isinstance(partial, Closure) and partial.args == (10,)
+    assert run("((lambda x y. (lambda z. (+ x (+ y z)))) 1 2 3)", env) == 6
+    # A call returning a function consumes the remaining arguments
+    assert run("((lambda x. (lambda y z. (+ x (+ y z)))) 1 2 3)", env) == 6
+    partial = run("((lambda x. (lambda y z. (+ x (+ y z)))) 1 2)", env)
+    assert isinstance(partial, Closure) and partial.args == (2,)
+
+
+def test_if_and_define():
+    env = lambMakeTopEnv()
+    assert run("(define x 5)", env) == "<defined x>"
+    assert run("(if (< x 10) 1 2)", env) == 1
+    assert run("(define y (* x 2)) y", env) == 10
+
+
+def test_let_and_letrec():
+    env = lambMakeTopEnv()
+    assert run("(let x 2 (define y 3) (* x y))", env) == 6
+    src = """
+    (letrec ((even (lambda n. (if (= n 0) true (odd (- n 1)))))
+             (odd  (lambda n. (if (= n 0) false (even (- n 1))))))
+      (even 10))
+    """
+    assert run(src, env) is True
+
+
+def test_stdlib_on_vm(vm_env):
+    assert run("(sum (range 5))", vm_env) == 10
+    assert run("(fib 10)", vm_env) == 55
+    assert valueToString(run("(map double (range 4))", vm_env)) == "(0 2 4 6)"
+    assert valueToString(run("(reverse (range 4))", vm_env)) == "(3 2 1 0)"
+    assert run("(let x 10 (+ x 2))", vm_env) == 12
+    assert run("(when false 1)", vm_env) is nil
+
+
+def test_deep_non_tail_recursion(vm_env):
+    # map and foldr are not tail recursive; the VM keeps its own call stack
+    result = run("(length (map (lambda x. (+ x 1)) (range 5000)))", vm_env)
+    assert result == 5000
+
+
+def test_non_tail_recursion_beyond_python_limit(vm_env):
+    import sys
+
+    n = sys.getrecursionlimit() * 3
+    assert run(f"(length (append (range {n}) (range 3)))", vm_env) == n + 3
+    src = f"(foldr + 0 (filter (lambda x. (= (mod x 2) 0)) (range {n})))"
+    assert run(src, vm_env) == sum(range(0, n, 2))
+    assert run(f"(> (fact {n}) 0)", vm_env) is True
+
+
+def test_deep_tail_recursion(vm_env):
+    src = """
+    (define loop (lambda n. (lambda acc.
+      (if (= n 0) acc (loop (- n 1) (+ acc 1))))))
+    (loop 20000 0)
+    """
+    assert run(src, vm_env) == 20000
+
+
+def test_quote_and_quasiquote():
+    env = lambMakeTopEnv()
+    quoted = run("'(+ 1 2)", env)
+    assert isinstance(quoted, Application)
+    run("(define x 99)", env)
+    result = run("(quasiquote (+ 1 (unquote x)))", env)
+    assert isinstance(result, Application)
+    assert result.args[1] == 99
+
+
+def test_errors_match_tree_engine():
+    env = lambMakeTopEnv()
+    with pytest.raises(EvalError, match="unbound variable: nope"):
+        run("nope", env)
+    with pytest.raises(EvalError, match="if condition must be boolean"):
+        run("(if 1 2 3)", env)
+    with pytest.raises(ParseError, match="if requires condition, then, else"):
+        vmEval(Application(Variable("if"), [Literal("1")]), env)
+    with pytest.raises(EvalError, match="tried to apply a non-function value"):
+        run("(42 1)", env)
+    with pytest.raises(EvalError, match="quote requires exactly one argument"):
+        vmEval(Application(Variable("quote"), []), env)
+    with pytest.raises(RecursionInitError):
+        run("(letrec ((x x)) x)", env)
+    with pytest.raises(EvalError, match="unbound variable: y"):
+        run("(let x 1 (if false (define y 2) nil) y)", env)
+
+
+def test_builtin_application():
+    env = lambMakeTopEnv()
+    assert isinstance(run("(+ 1)", env), type(env["+"]))
+    assert isinstance(run("(cons 1 nil)", env), Pair)
+
+
+def test_tail_calls_are_compiled_as_jumps():
+    code = vmCompile(lambParseAll(lambTokenize("(lambda x. (f (g x)))"))[0])
+    body = code.consts[code.ops[1]]
+    assert CALL in body.ops[0::2]
+    assert TAIL_CALL in body.ops[0::2]
+    assert body.ops[-2] == RETURN
+
+
+def test_disassemble():
+    code = vmCompile(lambParseAll(lambTokenize("(define f (lambda x. (+ x 1)))"))[0])
+    listing = disassemble(code)
+    assert "Disassembly of <toplevel>" in listing
+    assert "MAKE_CLOSURE" in listing
+    assert "Disassembly of <lambda x>" in listing
+    code = vmCompile(lambParseAll(lambTokenize("(lambda x y. y)"))[0])
+    assert "Disassembly of <lambda x y>" in disassemble(code)
+    assert "(depth 0, slot 2)" in disassemble(code)
+    assert "LOAD_LOCAL" in listing and "(depth 0, slot 1)" in listing
+    assert "LOAD_GLOBAL" in listing and "(+)" in listing
+
+
+def test_vm_main(tmp_path, capsys):
+    src = tmp_path / "prog.lamb"
+    src.write_text("(+ 1 2)")
+    main([str(src)])
+    assert "TAIL_CALL" in capsys.readouterr().out
+    with pytest.raises(SystemExit):
+        main([])
+
+
+def test_run_file_with_vm_engine(tmp_path, capsys):
+    from lambdora.runner import run_file
+
+    src = tmp_path / "prog.lamb"
+    src.write_text("(define sq (lambda x. (* x x)))\n(print (sq 7))\n(sum (range 4))")
+    run_file(src, engine="vm")
+    assert capsys.readouterr().out.splitlines() == ["49", "6"]
+
+
+def test_builtin_arity_on_vm():
+    env = lambMakeTopEnv()
+    assert run("(+ 1 2 3 4)", env) == 10
+    assert run("(- 10 1 2)", env) == 7
+    assert run("((+ 1) 2)", env) == 3
+    assert valueToString(run("((cons 1) nil)", env)) == "(1)"
+    assert run("(< 1 2)", env) is True
+
+
+def test_self_tail_calls_on_vm():
+    env = lambMakeTopEnv()
+    src = "(define loop (lambda n acc. (if (= n 0) acc (loop (- n 1) (+ acc 2)))))"
+    code = vmCompile(lambParseAll(lambTokenize(src))[0])
+    assert SELF_TAIL_CALL in code.consts[code.ops[1]].ops[0::2]
+    assert "SELF_TAIL_CALL" in disassemble(code)
+    run(src, env)
+    assert run("(loop 50000 0)", env) == 100000
+    run("(define orig loop) (define loop (lambda n acc. acc))", env)
+    assert run("(orig 5 0)", env) == 2
+    run("(define add (lambda n acc. (if (= n 0) acc (add (- n 1) acc))))", env)
+    run("(define addOrig add) (define add +)", env)
+    # The self call now reaches a builtin: (+ (- 3 1) 4)
+    assert run("(addOrig 3 4)", env) == 6
+
+
+def test_closures_capture_only_used_variables_on_vm():
+    env = lambMakeTopEnv()
+    add = run("((lambda big n. (lambda x. (+ x n))) 99 1)", env)
+    assert add.env == [None, 1]
+    assert run("(let x 1 (define g (lambda u. x)) (define x 9) (g 0))", env) == 9
+    code = vmCompile(lambParseAll(lambTokenize("(letrec ((f (lambda n. f))) f)"))[0])
+    assert "BOX" in disassemble(code) and "LOAD_CELL" in disassemble(code)
+    assert run("(letrec ((f (lambda n. f))) (f 1))", env).env[1][0] is not None
+
+
+def test_immediately_applied_lambdas_on_vm():
+    env = lambMakeTopEnv()
+    code = vmCompile(lambParseAll(lambTokenize("((lambda x y. (- x y)) 10 3)"))[0])
+    assert "MAKE_CLOSURE" not in disassemble(code)
+    assert run("((lambda x y. (- x y)) 10 3)", env) == 7
+    assert run("(define x 1) ((lambda x y. (+ x y)) 5 x)", env) == 6